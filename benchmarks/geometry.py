@@ -0,0 +1,59 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Benchmark of the reprojection of STAC Items geometries with cached transformers, against a new transformer per
+geometry. Run it with::
+
+    python benchmarks/geometry.py --geometries 1000
+"""
+
+import os
+import sys
+import timeit
+
+import click
+import pyproj
+from shapely.ops import transform
+
+# the benchmarks run from a checkout of the repository, without installing stac2odc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stac2odc.geometry import StacItemGeometry  # noqa: E402
+
+NATIVE_CRS = "+proj=aea +lat_0=-12 +lon_0=-54 +lat_1=-2 +lat_2=-22 +x_0=5000000 +y_0=10000000 +ellps=GRS80 " \
+             "+units=m +no_defs"
+
+STAC_ITEM_GEOMETRY = {
+    "type": "Polygon",
+    "coordinates": [[[-46.0, -13.0], [-45.0, -13.0], [-45.0, -12.0], [-46.0, -12.0], [-46.0, -13.0]]]
+}
+
+
+@click.command()
+@click.option('--geometries', default=1000, show_default=True, help='Number of reprojected geometries in each measure')
+@click.option('--repeat', default=5, show_default=True, help='Number of measures (the best is reported)')
+def main(geometries, repeat):
+    geometry = StacItemGeometry.from_stacitem({"geometry": STAC_ITEM_GEOMETRY})
+
+    def _new_transformer_per_geometry():
+        for _ in range(geometries):
+            transform(pyproj.Transformer.from_crs(pyproj.CRS("EPSG:4326"), pyproj.CRS(NATIVE_CRS)).transform,
+                      geometry._basegeom)
+
+    def _cached_transformer():
+        for _ in range(geometries):
+            geometry.to_crs(NATIVE_CRS)
+
+    uncached = min(timeit.repeat(_new_transformer_per_geometry, number=1, repeat=repeat))
+    cached = min(timeit.repeat(_cached_transformer, number=1, repeat=repeat))
+    click.echo(f"to_crs: {geometries / cached:10.1f} geometries/s (new transformer per geometry: "
+               f"{geometries / uncached:10.1f} geometries/s, {uncached / cached:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Benchmark of the per-item mapping cost of StacMapperEngine with the example engines.
+
+The compiled mapping plan is measured next to the baseline per-item path, which interprets the engine definition
+in each item (as StacMapperEngine did before the rules were compiled). The ``grids`` rule of the example engines
+reads raster headers through the network, so it is removed from the engines before the benchmark. Run it with::
+
+    python benchmarks/mapper.py --items 2000 --bands 12
+"""
+
+import json
+import os
+import sys
+import tempfile
+import timeit
+from collections import OrderedDict
+
+import click
+
+# the benchmarks run from a checkout of the repository, without installing stac2odc
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_ROOT)
+
+import stac2odc.tree as tree  # noqa: E402
+from stac2odc.mapper import StacMapperEngine, _apply_custom_mapping  # noqa: E402
+from stac2odc.operation import apply_custom_map_function  # noqa: E402
+from stac2odc.toolbox import load_custom_configuration_file  # noqa: E402
+
+EXAMPLE_ENGINES = OrderedDict([
+    ('bdc', os.path.join(REPOSITORY_ROOT, 'examples/brazil-data-cube/engines/bdc_mapper_v09_online.json')),
+    ('astraea', os.path.join(REPOSITORY_ROOT, 'examples/astraea/engines/stac_mapper_astraea.json'))
+])
+
+
+def synthetic_stac_item(item_id: str, bands: int) -> dict:
+    """Create a STAC Item with the fields used by the example engines
+
+    Args:
+        item_id (str): Item id
+        bands (int): Number of assets (bands) in the item
+    Returns:
+        dict: STAC Item definition
+    """
+    assets = OrderedDict(
+        (f"B{band}", {"href": f"https://example.com/{item_id}/B{band}.tif", "type": "image/tiff"})
+        for band in range(1, bands + 1)
+    )
+    assets["thumbnail"] = {"href": f"https://example.com/{item_id}/thumbnail.png", "type": "image/png"}
+
+    return {
+        "type": "Feature",
+        "id": item_id,
+        "bbox": [-46.0, -13.0, -45.0, -12.0],
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[-46.0, -13.0], [-45.0, -13.0], [-45.0, -12.0], [-46.0, -12.0], [-46.0, -13.0]]]
+        },
+        "properties": {
+            "datetime": "2020-01-01T00:00:00",
+            "start_datetime": "2020-01-01T00:00:00",
+            "end_datetime": "2020-01-16T00:00:00",
+            "created": "2020-02-01T00:00:00",
+            "bdc:tiles": ["089098"],
+            "platform": "CBERS-4",
+            "instruments": ["AWFI"]
+        },
+        "assets": assets
+    }
+
+
+def _files_from_repository_root(definition: object) -> object:
+    # files of the example engines (user defined functions and fromFile) are relative to the repository root
+    if isinstance(definition, dict):
+        return {
+            key: os.path.join(REPOSITORY_ROOT, value)
+            if key in ('functionFile', 'file') and isinstance(value, str) and not os.path.isabs(value)
+            else _files_from_repository_root(value)
+            for key, value in definition.items()
+        }
+    if isinstance(definition, list):
+        return [_files_from_repository_root(value) for value in definition]
+    return definition
+
+
+def engine_without_grids(engine_file: str, outdir: str) -> str:
+    """Copy an engine definition removing the `grids` rule, which needs network access. Relative files of the
+    engine are resolved from the repository root, so the benchmarks run from any directory
+
+    Args:
+        engine_file (str): Engine definition file
+        outdir (str): Directory where the new engine is saved
+    Returns:
+        str: Path of the new engine definition
+    """
+    with open(engine_file) as f:
+        engine_definition = _files_from_repository_root(json.load(f))
+    engine_definition["dataset"]["fromSTAC"].pop("grids", None)
+
+    engine_out = os.path.join(outdir, os.path.basename(engine_file))
+    with open(engine_out, "w") as f:
+        json.dump(engine_definition, f)
+    return engine_out
+
+
+def baseline_map_item_to_dataset(engine_definition: dict, stac_item: dict) -> OrderedDict:
+    """Map a STAC Item interpreting the engine definition, as StacMapperEngine did before the rules were compiled:
+    rules are dispatched, tree paths are split, lists are scanned and files are read in each item. Constants are
+    added path by path, so constants of list members are not added to each member
+
+    Args:
+        engine_definition (dict): StacMapperEngine definition
+        stac_item (dict): STAC Item definition
+    Returns:
+        OrderedDict: ODC Dataset
+    """
+    odc_element = OrderedDict()
+    element_mapper = engine_definition.get("dataset")
+    product_definition = element_mapper.get("fromSTAC")
+
+    for product_property in product_definition:
+        property_definition = product_definition.get(product_property)
+
+        if "customMapping" in property_definition:
+            stac_value = tree.get_value_by_tree_path(stac_item, property_definition.get("from"))
+            stac_value = _apply_custom_mapping(stac_value, property_definition.get("customMapping"))
+        elif "customMapFunction" in property_definition:
+            property_is_from = property_definition.get("from")
+
+            stac_value = tree.get_value_by_tree_path(stac_item, property_is_from)
+            stac_value = apply_custom_map_function(property_is_from, stac_value,
+                                                   property_definition.get("customMapFunction"))
+        else:
+            stac_value = tree.get_value_by_tree_path(stac_item, property_definition)
+        _legacy_add_value_by_tree_path(odc_element, product_property, stac_value)
+
+    for constant_property, value in (element_mapper.get("fromConstant") or {}).items():
+        _legacy_add_value_by_tree_path(odc_element, constant_property, value)
+    for file_property, file_definition in (element_mapper.get("fromFile") or {}).items():
+        _legacy_add_value_by_tree_path(odc_element, file_property,
+                                       load_custom_configuration_file(file_definition.get("file")))
+    return odc_element
+
+
+def _legacy_add_value_by_tree_path(element: OrderedDict, tree_path: str, value: object) -> None:
+    # insertion that scans the list nodes in each call (before the list indexes of tree.TreeBuilder)
+    tree_path = tree_path.split(".")
+
+    _pelement = element
+    _element_index = -1
+    for tree_node in tree_path:
+        if tree_node not in _pelement:
+            if isinstance(_pelement, list):
+                for index in range(0, len(_pelement)):
+                    for key in _pelement[index]:
+                        if _pelement[index][key] == tree_node:
+                            _element_index = index
+                            break
+                if _element_index == -1:
+                    _pelement.append(OrderedDict())
+            else:
+                _pelement[tree_node] = OrderedDict()
+
+            if tree_node == tree_path[-1]:
+                if isinstance(_pelement, list):
+                    _pelement[_element_index] = value
+                else:
+                    _pelement[tree_node] = value
+        if isinstance(_pelement, list):
+            _pelement = _pelement[_element_index]
+        else:
+            _pelement = _pelement[tree_node]
+
+
+@click.command()
+@click.option('--items', default=2000, show_default=True, help='Number of mapped items in each measure')
+@click.option('--bands', default=12, show_default=True, help='Number of assets in each item')
+@click.option('--repeat', default=5, show_default=True, help='Number of measures (the best is reported)')
+def main(items, bands, repeat):
+    stac_items = [synthetic_stac_item(f"item-{i}", bands) for i in range(items)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for engine_name, engine_file in EXAMPLE_ENGINES.items():
+            engine_file = engine_without_grids(engine_file, tmpdir)
+            engine = StacMapperEngine(engine_file)
+            engine_definition = load_custom_configuration_file(engine_file)
+
+            baseline = min(timeit.repeat(
+                lambda: [baseline_map_item_to_dataset(engine_definition, i) for i in stac_items], number=1,
+                repeat=repeat
+            ))
+            best = min(timeit.repeat(lambda: [engine.map_item_to_dataset(i) for i in stac_items],
+                                     number=1, repeat=repeat))
+            click.echo(f"{engine_name:>10}: baseline {baseline / items * 1e6:8.2f} us/item, compiled "
+                       f"{best / items * 1e6:8.2f} us/item ({items / best:10.1f} items/s, {baseline / best:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Benchmark of the throughput scaling of item2dataset mapping with a process pool (--workers).
+
+Pages of synthetic STAC Items are mapped with the BDC example engine. Run it with::
+
+    python benchmarks/parallel_mapping.py --items 20000 --workers 1,2,4,8
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import click
+
+# the benchmarks run from a checkout of the repository, without installing stac2odc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stac2odc.item  # noqa: E402
+from mapper import EXAMPLE_ENGINES, engine_without_grids, synthetic_stac_item  # noqa: E402
+from stac2odc.pipeline import Page  # noqa: E402
+
+
+@click.command()
+@click.option('--items', default=20000, show_default=True, help='Number of mapped items')
+@click.option('--bands', default=12, show_default=True, help='Number of assets in each item')
+@click.option('--page-size', default=120, show_default=True, help='Number of items in each page')
+@click.option('--workers', default='1,2,4', show_default=True, help='Comma separated numbers of processes')
+def main(items, bands, page_size, workers):
+    pages = [
+        Page(page_number, [synthetic_stac_item(f"item-{i}", bands)
+                           for i in range((page_number - 1) * page_size, min(page_number * page_size, items))])
+        for page_number in range(1, (items + page_size - 1) // page_size + 1)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine_file = engine_without_grids(EXAMPLE_ENGINES['bdc'], tmpdir)
+
+        baseline = None
+        for number_of_workers in [int(w) for w in workers.split(',')]:
+            start = time.perf_counter()
+            for _ in stac2odc.item.item2dataset_stream(engine_file, 'benchmark', pages, workers=number_of_workers):
+                pass
+            throughput = items / (time.perf_counter() - start)
+
+            baseline = baseline or throughput
+            click.echo(f"{number_of_workers:>3} workers: {throughput:10.1f} items/s ({throughput / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
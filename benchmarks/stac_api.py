@@ -0,0 +1,193 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Local stand-in of a STAC API, serving synthetic STAC Collections and Items, used by the benchmarks.
+
+The API answers the requests used by stac2odc (``/collections/<name>`` and ``/search`` with ``page`` and ``limit``),
+with a configurable latency per request. Responses have an ETag, so conditional requests are answered with 304.
+Run it from the repository root to use it with the stac2odc CLI::
+
+    python benchmarks/stac_api.py --items 10000 --bands 12 --latency 0.05
+"""
+
+import hashlib
+import http.server
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import click
+
+from mapper import synthetic_stac_item
+
+
+def synthetic_stac_collection(collection_id: str, bands: int) -> dict:
+    """Create a STAC Collection with the fields used by the example engines
+
+    Args:
+        collection_id (str): Collection id
+        bands (int): Number of bands in the collection
+    Returns:
+        dict: STAC Collection definition
+    """
+    return {
+        "stac_version": "0.9.0",
+        "id": collection_id,
+        "description": f"Synthetic collection {collection_id}",
+        "license": "MIT",
+        "extent": {
+            "spatial": {"bbox": [[-46.0, -13.0, -45.0, -12.0]]},
+            "temporal": {"interval": [["2020-01-01T00:00:00Z", "2020-12-31T00:00:00Z"]]}
+        },
+        "bdc:crs": "+proj=aea +lat_0=-12 +lon_0=-54 +lat_1=-2 +lat_2=-22 +x_0=5000000 +y_0=10000000 +ellps=GRS80 "
+                   "+units=m +no_defs",
+        "properties": {
+            "eo:bands": [
+                {"name": f"B{band}", "common_name": f"band{band}", "data_type": "int16", "nodata": -9999}
+                for band in range(1, bands + 1)
+            ]
+        },
+        "links": []
+    }
+
+
+class FakeStacApi:
+    def __init__(self, collection_id: str = "synthetic", items: int = 1000, bands: int = 12, latency: float = 0.0):
+        """STAC API served in a local HTTP server (in a background thread), with one synthetic collection.
+        Items are created on demand, so the API memory does not count in the benchmarks
+
+        Args:
+            collection_id (str): Collection id
+            items (int): Number of items in the collection
+            bands (int): Number of bands (assets) of the collection items
+            latency (float): Time (in seconds) waited before answering each request
+        """
+        self.collection = synthetic_stac_collection(collection_id, bands)
+        self.items = items
+        self.bands = bands
+        self.latency = latency
+        self.requests = 0
+
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def search(self, parameters: dict) -> dict:
+        """Answer a STAC search
+
+        Args:
+            parameters (dict): Search parameters (`page` and `limit`, other parameters are ignored)
+        Returns:
+            dict: STAC ItemCollection
+        """
+        limit = int(parameters.get("limit", 10))
+        page = int(parameters.get("page", 1))
+
+        first_item = (page - 1) * limit
+        features = [
+            {**synthetic_stac_item(f"{self.collection['id']}-{i:08d}", self.bands), "collection": self.collection['id']}
+            for i in range(first_item, min(first_item + limit, self.items))
+        ]
+        return {
+            "type": "FeatureCollection",
+            "features": features,
+            "context": {"page": page, "limit": limit, "matched": self.items, "returned": len(features)}
+        }
+
+    def _route(self, path: str, parameters: dict):
+        if path in ("", "/"):
+            return {"stac_version": "0.9.0", "id": "fake-stac-api", "description": "Fake STAC API", "links": []}
+        if path == "/collections":
+            return {"collections": [self.collection]}
+        if path == f"/collections/{self.collection['id']}":
+            return self.collection
+        if path == "/search" or path == f"/collections/{self.collection['id']}/items":
+            return self.search(parameters)
+        return None
+
+    def _handler(self):
+        fake_api = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _answer(self, parameters: dict):
+                fake_api.requests += 1
+                if fake_api.latency:
+                    time.sleep(fake_api.latency)
+
+                document = fake_api._route(urlparse(self.path).path.rstrip("/"), parameters)
+                content = json.dumps(document).encode("utf-8")
+                etag = f'"{hashlib.sha1(content).hexdigest()}"'
+
+                if document is not None and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200 if document is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                parameters = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                self._answer(parameters)
+
+            def do_POST(self):
+                content_length = int(self.headers.get("Content-Length", 0))
+                self._answer(json.loads(self.rfile.read(content_length) or b"{}"))
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+    def start(self) -> 'FakeStacApi':
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+@click.command()
+@click.option('--collection', default='synthetic', show_default=True, help='Collection id')
+@click.option('--items', default=10000, show_default=True, help='Number of items in the collection')
+@click.option('--bands', default=12, show_default=True, help='Number of assets in each item')
+@click.option('--latency', default=0.0, show_default=True, help='Latency (in seconds) of each request')
+def main(collection, items, bands, latency):
+    with FakeStacApi(collection, items, bands, latency) as fake_api:
+        click.echo(f"STAC API running in {fake_api.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
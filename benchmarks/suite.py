@@ -0,0 +1,274 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Benchmark suite of stac2odc. Measures the throughput (elements/s) and the peak memory of each stage.
+
+STAC Collections and Items are synthetic, served by a local stand-in STAC API (see stac_api.py) with a configurable
+latency. Results are saved in a JSON file, which can be compared with the results of another release. Run it with::
+
+    python benchmarks/suite.py --items 5000 --output results.json
+    python benchmarks/suite.py --items 5000 --compare results.json
+
+The comparison exits with error when the throughput of a benchmark drops more than ``--threshold``.
+"""
+
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Callable
+
+import click
+
+# the benchmarks run from a checkout of the repository, without installing stac2odc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stac2odc.tree as tree  # noqa: E402
+from mapper import EXAMPLE_ENGINES, engine_without_grids, synthetic_stac_item  # noqa: E402
+from stac_api import FakeStacApi, synthetic_stac_collection  # noqa: E402
+from stac2odc.version import __version__  # noqa: E402
+
+# min number of bands of the products of the many-bands benchmark (hyperspectral products)
+MANY_BANDS = 240
+
+# benchmark workload: function that processes the elements and returns how many elements were processed
+Workload = Callable[[], int]
+
+
+def tree_workload(options: dict, tmpdir: str) -> Workload:
+    """Get, check and add values by tree path, as made by the mapping rules"""
+    stac_items = [synthetic_stac_item(f"item-{i}", options['bands']) for i in range(options['items'])]
+    band_paths = [["measurements", f"B{band}", "path"] for band in range(1, options['bands'] + 1)]
+
+    def workload() -> int:
+        for stac_item in stac_items:
+            odc_element = OrderedDict()
+
+            if tree.is_path_valid_in_tree(stac_item, "properties.datetime"):
+                tree.add_value_by_tree_path(odc_element, "properties.datetime",
+                                            tree.get_value_by_tree_path(stac_item, "properties.datetime"))
+            for band_path in band_paths:
+                tree.add_value_by_tree_path(odc_element, band_path,
+                                            tree.get_value_by_tree_path(stac_item, ["assets", band_path[1], "href"]))
+        return len(stac_items)
+    return workload
+
+
+def geometry_workload(options: dict, tmpdir: str) -> Workload:
+    """Reproject the STAC Items geometries to the collection CRS"""
+    from stac2odc.geometry import StacItemGeometry
+
+    native_crs = synthetic_stac_collection("synthetic", options['bands'])['bdc:crs']
+    stac_items = [synthetic_stac_item(f"item-{i}", options['bands']) for i in range(options['items'])]
+
+    def workload() -> int:
+        geometries = [StacItemGeometry.from_stacitem(stac_item) for stac_item in stac_items]
+        return len(StacItemGeometry.batch_to_crs(geometries, native_crs))
+    return workload
+
+
+def mapper_workload(options: dict, tmpdir: str) -> Workload:
+    """Map STAC Items to ODC Datasets with StacMapperEngine (BDC example engine)"""
+    from stac2odc.mapper import StacMapperEngine
+
+    engine = StacMapperEngine(engine_without_grids(EXAMPLE_ENGINES['bdc'], tmpdir))
+    stac_items = [synthetic_stac_item(f"item-{i}", options['bands']) for i in range(options['items'])]
+
+    def workload() -> int:
+        return len([engine.map_item_to_dataset(stac_item) for stac_item in stac_items])
+    return workload
+
+
+def collection2product_workload(options: dict, tmpdir: str) -> Workload:
+    """Recover STAC Collections from the STAC API and map them to ODC Products"""
+    import stac
+    from stac2odc.collection import collection2product
+
+    engine_file = engine_without_grids(EXAMPLE_ENGINES['bdc'], tmpdir)
+    stac_service = stac.STAC(options['url'], False)
+    collections = max(options['items'] // 100, 1)
+
+    def workload() -> int:
+        for _ in range(collections):
+            collection2product(engine_file, stac_service.collection(options['collection']))
+        return collections
+    return workload
+
+
+def many_bands_product_workload(options: dict, tmpdir: str) -> Workload:
+    """Map STAC Collections with many bands (hyperspectral) to ODC Products. Constants are added to each measurement,
+    so it measures the insertion in list nodes with hundreds of members"""
+    from stac2odc.mapper import StacMapperEngine
+
+    engine = StacMapperEngine(engine_without_grids(EXAMPLE_ENGINES['bdc'], tmpdir))
+    stac_collection = synthetic_stac_collection(options['collection'], max(options['bands'], MANY_BANDS))
+    collections = max(options['items'] // 100, 1)
+
+    def workload() -> int:
+        for _ in range(collections):
+            engine.map_collection_to_product(stac_collection)
+        return collections
+    return workload
+
+
+def item2dataset_workload(options: dict, tmpdir: str) -> Workload:
+    """Recover pages of STAC Items from the STAC API, map them to ODC Datasets and write the datasets (ndjson),
+    as made by the item2dataset command"""
+    import stac
+    from stac2odc.item import item2dataset_stream
+    from stac2odc.toolbox import iterate_stac_pages
+    from stac2odc.writer import create_document_writer
+
+    engine_file = engine_without_grids(EXAMPLE_ENGINES['bdc'], tmpdir)
+    stac_service = stac.STAC(options['url'], False)
+
+    def workload() -> int:
+        datasets = 0
+        pages = iterate_stac_pages(stac_service, options['items'], {"collections": [options['collection']]},
+                                   options['page_size'], options['fetch_workers'])
+
+        with tempfile.TemporaryDirectory(dir=tmpdir) as outdir:
+            with create_document_writer('ndjson', outdir) as document_writer:
+                for odc_page in item2dataset_stream(engine_file, options['collection'], pages):
+                    datasets += len(document_writer.write(odc_page.items))
+        return datasets
+    return workload
+
+
+BENCHMARKS = OrderedDict([
+    ('tree', tree_workload),
+    ('geometry', geometry_workload),
+    ('mapper', mapper_workload),
+    ('collection2product', collection2product_workload),
+    ('many_bands_product', many_bands_product_workload),
+    ('item2dataset', item2dataset_workload)
+])
+
+
+def measure(workload: Workload, repeat: int) -> dict:
+    """Measure the throughput (best of `repeat` runs) and the peak memory (a separate run, with tracemalloc) of a
+    workload
+
+    Args:
+        workload (function): Benchmark workload
+        repeat (int): Number of runs used to measure the throughput
+    Returns:
+        dict: Measures
+    """
+    best_seconds, elements = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        elements = workload()
+        seconds = time.perf_counter() - start
+
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+
+    tracemalloc.start()
+    try:
+        workload()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "elements": elements,
+        "seconds": best_seconds,
+        "elements_per_second": elements / best_seconds if best_seconds else 0.0,
+        "peak_memory_mb": peak_memory / 1024 ** 2
+    }
+
+
+def compare_results(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print the comparison of two benchmark results
+
+    Args:
+        results (dict): Results of the current run
+        baseline (dict): Results used as reference
+        threshold (float): Max accepted drop of throughput (e.g. 0.1 for 10%)
+    Returns:
+        bool: True if no benchmark throughput dropped more than `threshold`
+    """
+    has_regression = False
+
+    click.echo(f"\nComparison with stac2odc {baseline['metadata']['version']} ({baseline['metadata']['date']})")
+    for name, measures in results['results'].items():
+        baseline_measures = baseline['results'].get(name)
+        if not baseline_measures:
+            continue
+
+        throughput_ratio = measures['elements_per_second'] / baseline_measures['elements_per_second']
+        memory_ratio = measures['peak_memory_mb'] / baseline_measures['peak_memory_mb'] \
+            if baseline_measures['peak_memory_mb'] else 1.0
+
+        is_regression = throughput_ratio < 1 - threshold
+        has_regression = has_regression or is_regression
+
+        click.echo(f"{name:>20}: {throughput_ratio:6.2f}x throughput, {memory_ratio:6.2f}x peak memory"
+                   f"{'  <- REGRESSION' if is_regression else ''}")
+    return not has_regression
+
+
+@click.command()
+@click.option('--items', default=2000, show_default=True, help='Number of STAC Items used in each benchmark')
+@click.option('--bands', default=12, show_default=True, help='Number of assets in each item')
+@click.option('--page-size', default=120, show_default=True, help='Number of items in each STAC page')
+@click.option('--latency', default=0.0, show_default=True, help='Latency (in seconds) of each STAC API request')
+@click.option('--fetch-workers', default=1, show_default=True, help='Number of STAC pages requested concurrently')
+@click.option('--repeat', default=3, show_default=True, help='Number of measures (the best is reported)')
+@click.option('--only', default=None, help=f"Comma separated benchmarks to run ({', '.join(BENCHMARKS)})")
+@click.option('--output', default=None, help='JSON file where the results are saved')
+@click.option('--compare', default=None, help='JSON file with results used as reference')
+@click.option('--threshold', default=0.1, show_default=True, help='Max accepted drop of throughput in comparison')
+def main(items, bands, page_size, latency, fetch_workers, repeat, only, output, compare, threshold):
+    benchmarks = only.split(',') if only else list(BENCHMARKS)
+
+    results = {
+        "metadata": {
+            "version": __version__,
+            "date": datetime.datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": {"items": items, "bands": bands, "page_size": page_size, "latency": latency,
+                        "fetch_workers": fetch_workers, "repeat": repeat}
+        },
+        "results": OrderedDict()
+    }
+
+    with FakeStacApi("synthetic", items, bands, latency) as fake_api, tempfile.TemporaryDirectory() as tmpdir:
+        options = {**results['metadata']['options'], "url": fake_api.url, "collection": "synthetic"}
+
+        for name in benchmarks:
+            measures = measure(BENCHMARKS[name](options, tmpdir), repeat)
+            results['results'][name] = measures
+
+            click.echo(f"{name:>20}: {measures['elements_per_second']:12.1f} elements/s, "
+                       f"{measures['peak_memory_mb']:8.2f} MB peak memory")
+
+    if output:
+        output_dir = os.path.dirname(output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        with open(output, 'w') as ofile:
+            json.dump(results, ofile, indent=2)
+
+    if compare:
+        with open(compare) as cfile:
+            baseline = json.load(cfile)
+
+        if not compare_results(results, baseline, threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
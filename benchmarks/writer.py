@@ -0,0 +1,77 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Benchmark of the ODC Datasets writers (output formats of item2dataset).
+
+Datasets are mapped from synthetic STAC Items with the BDC example engine. Run it with::
+
+    python benchmarks/writer.py --datasets 5000
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import click
+import yaml
+
+# the benchmarks run from a checkout of the repository, without installing stac2odc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stac2odc.writer  # noqa: E402
+from mapper import EXAMPLE_ENGINES, engine_without_grids, synthetic_stac_item  # noqa: E402
+from stac2odc.mapper import StacMapperEngine  # noqa: E402
+from stac2odc.writer import OUTPUT_FORMATS, create_document_writer  # noqa: E402
+
+
+def measure_writer(output_format: str, documents: list, shard_size: int, fanout_depth: int) -> float:
+    """Measure the time to write documents in an output format
+
+    Args:
+        output_format (str): One of stac2odc.writer.OUTPUT_FORMATS
+        documents (list): ODC Datasets documents
+        shard_size (int): Max number of documents in each file
+        fanout_depth (int): Number of hashed subdirectory levels
+    Returns:
+        float: Elapsed time in seconds
+    """
+    with tempfile.TemporaryDirectory() as outdir:
+        start = time.perf_counter()
+        with create_document_writer(output_format, outdir, fanout_depth, shard_size) as document_writer:
+            document_writer.write(documents)
+        return time.perf_counter() - start
+
+
+@click.command()
+@click.option('--datasets', default=5000, show_default=True, help='Number of written datasets')
+@click.option('--shard-size', default=1000, show_default=True, help='Datasets per file (yaml-multi and ndjson)')
+@click.option('--fanout-depth', default=0, show_default=True, help='Number of hashed subdirectory levels')
+def main(datasets, shard_size, fanout_depth):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = StacMapperEngine(engine_without_grids(EXAMPLE_ENGINES['bdc'], tmpdir))
+        documents = []
+        for i in range(datasets):
+            document = engine.map_item_to_dataset(synthetic_stac_item(f"item-{i}", 12))
+            document['id'] = engine.create_dataset_id({"id": f"item-{i}"}, "benchmark")
+            documents.append(document)
+
+    measures = [(output_format, stac2odc.writer.YAML_DUMPER) for output_format in OUTPUT_FORMATS]
+    if stac2odc.writer.YAML_DUMPER is not yaml.Dumper:
+        measures.insert(0, ('yaml', yaml.Dumper))
+
+    for output_format, yaml_dumper in measures:
+        stac2odc.writer.YAML_DUMPER = yaml_dumper
+        elapsed = measure_writer(output_format, documents, shard_size, fanout_depth)
+
+        label = f"{output_format} ({yaml_dumper.__name__})" if output_format != 'ndjson' else output_format
+        click.echo(f"{label:>24}: {elapsed:7.3f}s ({datasets / elapsed:10.1f} datasets/s)")
+
+
+if __name__ == '__main__':
+    main()
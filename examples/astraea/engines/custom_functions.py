@@ -57,11 +57,10 @@ def get_grid(collection_element: object) -> Union[List[OrderedDict], OrderedDict
 
     if not asset_reference:
         raise UserDefinedFunctionError("`ASTRAEA_GRID_REFERENCE_BAND` not found!")
-    datasource = rio.open(asset_reference["href"])
-
-    return OrderedDict({
-        "default": {
-            "shape": list(datasource.shape),
-            "transform": list(datasource.transform)
-        }
-    })
+    with rio.open(asset_reference["href"]) as datasource:
+        return OrderedDict({
+            "default": {
+                "shape": list(datasource.shape),
+                "transform": list(datasource.transform)
+            }
+        })
@@ -13,12 +13,18 @@ from urllib.parse import urlparse
 
 import rasterio as rio
 
+from stac2odc.download import AssetDownloader
 from stac2odc.exception import UserDefinedFunctionError
 
 # definitions
 BDC_EXCLUDED_BANDS = ["thumbnail"]
 BDC_REPOSITORY_PATH = ""
 BDC_GRID_REFERENCE_BAND = "NDVI"
+BDC_DOWNLOAD_WORKERS = 4
+BDC_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# connections are shared by the downloads of all items
+bdc_downloader = AssetDownloader(workers=BDC_DOWNLOAD_WORKERS, chunk_size=BDC_DOWNLOAD_CHUNK_SIZE)
 
 
 def remove_invalid_keys(dict_in: Dict, invalid_keys: list) -> Dict:
@@ -39,29 +45,6 @@ def remove_invalid_keys(dict_in: Dict, invalid_keys: list) -> Dict:
     return _dict
 
 
-def __download_file(url: str, out: str) -> None:
-    """Download files
-    Args:
-        url (str): File URL
-        out (str): output file
-    Returns:
-        None
-    """
-    import tqdm
-    import requests
-
-    with requests.get(url, stream=True) as r:
-        r.raise_for_status()
-
-        with open(out, "wb") as f:
-            pbar = tqdm.tqdm(ncols=100, unit_scale=True, unit="B",
-                             leave=None, total=(int(r.headers['Content-Length'])))
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    pbar.update(len(chunk))
-                    f.write(chunk)
-
-
 def __download_stac_tree(stac_item, download_out):
     """Download STAC item
 
@@ -76,6 +59,7 @@ def __download_stac_tree(stac_item, download_out):
         return os.path.normpath(basepath + urlparse(href).path)
 
     downloaded_files_path = {}
+    files_to_download = []
 
     # Generate stac tree in basepath
     _keys = list(stac_item.keys())
@@ -89,8 +73,10 @@ def __download_stac_tree(stac_item, download_out):
         out_path = os.path.join(basepath_repository, os.path.basename(assetpath))
 
         downloaded_files_path[key] = {"path": out_path}
-        __download_file(asset['href'], out_path)
+        files_to_download.append((asset['href'], out_path))
 
+    # assets are downloaded concurrently. Files already downloaded are skipped and partial files are resumed
+    bdc_downloader.download_many(files_to_download)
     return OrderedDict(downloaded_files_path)
 
 
@@ -137,14 +123,13 @@ def get_grids_for_one_asset(collection_element: object) -> Union[List[OrderedDic
 
     if not asset_reference:
         raise UserDefinedFunctionError("`BDC_GRID_REFERENCE_BAND` not found!")
-    datasource = rio.open(asset_reference["href"])
-
-    return OrderedDict({
-        "default": {
-            "shape": list(datasource.shape),
-            "transform": list(datasource.transform)
-        }
-    })
+    with rio.open(asset_reference["href"]) as datasource:
+        return OrderedDict({
+            "default": {
+                "shape": list(datasource.shape),
+                "transform": list(datasource.transform)
+            }
+        })
 
 
 def transform_id(collection_element: object):
@@ -26,6 +26,9 @@ tests_require = [
 ]
 
 extras_require = {
+    'geoparquet': [
+        'pyarrow'
+    ]
 }
 extras_require['all'] = [req for exts, reqs in extras_require.items() for req in reqs]
 
@@ -42,7 +45,8 @@ install_requires = [
     'pyyaml>=5.3.1',
     'stac.py',
     'click>=7.1.0',
-    'datacube==1.8.3'
+    'datacube==1.8.3',
+    'rasterio>=1.1'
 ]
 
 packages = find_packages()
@@ -21,5 +21,9 @@ def setup_ordered_yaml_representation():
         'tag:yaml.org,2002:map', data.items())
     yaml.add_representer(OrderedDict, represent_dict_order)
 
+    # libyaml based dumper (when PyYAML is built with it) is used to write documents faster
+    if hasattr(yaml, 'CDumper'):
+        yaml.add_representer(OrderedDict, represent_dict_order, Dumper=yaml.CDumper)
+
 
 setup_ordered_yaml_representation()
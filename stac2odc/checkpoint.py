@@ -0,0 +1,115 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import json
+import os
+from typing import Iterable, Iterator
+
+from stac2odc.exception import CheckpointMismatchError
+from stac2odc.pipeline import Page
+
+
+class RunCheckpoint:
+    def __init__(self, checkpoint_file: str, search_definition: dict):
+        """Progress of an item2dataset run. The progress is saved in a JSON file, so an interrupted run can be
+        resumed from where it stopped.
+
+        The checkpoint records the last page completely processed and the ids of the STAC Items already indexed
+        in the page after it (the page in progress). Pages are processed in order, so this is enough to skip
+        everything done before.
+
+        Args:
+            checkpoint_file (str): JSON file where the progress is saved
+            search_definition (dict): Definition of the STAC search (filter, page size). A run can only be resumed
+            with the same search definition
+        """
+        self._checkpoint_file = checkpoint_file
+        self._search_definition = search_definition
+
+        self.last_completed_page = 0
+        self.indexed_items = set()
+
+    @property
+    def next_page(self) -> int:
+        """First page not completely processed"""
+        return self.last_completed_page + 1
+
+    def load(self) -> bool:
+        """Load the progress saved in the checkpoint file
+
+        Returns:
+            bool: True if there was a saved progress, False otherwise
+        Raises:
+            CheckpointMismatchError: If the checkpoint was created with another search definition
+        """
+        if not os.path.isfile(self._checkpoint_file):
+            return False
+
+        with open(self._checkpoint_file, 'r') as cfile:
+            checkpoint = json.load(cfile)
+
+        if checkpoint.get('search') != json.loads(json.dumps(self._search_definition)):
+            raise CheckpointMismatchError(
+                f"Checkpoint {self._checkpoint_file} was created with another search definition and can't be resumed"
+            )
+
+        self.last_completed_page = checkpoint.get('last_completed_page', 0)
+        self.indexed_items = set(checkpoint.get('indexed_items', []))
+        return True
+
+    def save(self) -> None:
+        """Save the progress in the checkpoint file. The file is replaced atomically, so it is never left
+        half written if the run is interrupted"""
+        checkpoint_dir = os.path.dirname(self._checkpoint_file)
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+        checkpoint_tmp_file = self._checkpoint_file + '.tmp'
+        with open(checkpoint_tmp_file, 'w') as cfile:
+            json.dump({
+                'search': self._search_definition,
+                'last_completed_page': self.last_completed_page,
+                'indexed_items': sorted(self.indexed_items)
+            }, cfile)
+        os.replace(checkpoint_tmp_file, self._checkpoint_file)
+
+    def items_indexed(self, item_ids: Iterable[str]) -> None:
+        """Record STAC Items of the page in progress as indexed. The checkpoint is saved once for all items (e.g.
+        once per batch of datasets indexed)
+
+        Args:
+            item_ids (Iterable[str]): STAC Items ids
+        """
+        self.indexed_items.update(item_ids)
+        self.save()
+
+    def page_completed(self, page_number: int) -> None:
+        """Record a page as completely processed
+
+        Args:
+            page_number (int): Page number
+        """
+        self.last_completed_page = page_number
+        self.indexed_items = set()
+        self.save()
+
+    def skip_indexed_items(self, pages: Iterable[Page]) -> Iterator[Page]:
+        """Remove from the pages the STAC Items already indexed in a previous run
+
+        Args:
+            pages (Iterable[Page]): Pages of STAC Items
+        Returns:
+            Iterator[Page]: Pages of STAC Items with items not indexed yet
+        """
+        for page in pages:
+            if page.number <= self.last_completed_page:
+                continue
+
+            if self.indexed_items:
+                page = Page(page.number, [item for item in page.items if item['id'] not in self.indexed_items])
+            yield page
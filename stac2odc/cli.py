@@ -9,20 +9,124 @@
 import os
 
 import click
-import stac
-from datacube.index import MissingRecordError
-from datacube.index.hl import Doc2Dataset
-from datacube.scripts.dataset import remap_uri_from_doc, dataset_stream
-from datacube.ui.common import ui_path_doc_stream
-from datacube.utils import InvalidDocException
-from datacube.utils.documents import read_documents
 from loguru import logger
 
-import stac2odc.collection
-import stac2odc.item
+# datacube, stac.py, pyproj and shapely (and the stac2odc modules that use them) are imported in the commands that
+# need them, so the CLI starts fast (e.g. --help or many short runs)
+from stac2odc.checkpoint import RunCheckpoint
 from stac2odc.logger import logger_message
+from stac2odc.metrics import METRICS_FORMATS, metrics_summary, timed_stage, write_metrics
+from stac2odc.operation import user_defined_modules_cache_info
+from stac2odc.partition import PARTITION_TYPES, bbox_partitions, collection_time_partitions, \
+    iterate_partitioned_stac_pages, tile_partitions
+from stac2odc.pipeline import bounded_stage
+from stac2odc.source import INPUT_SOURCES, iterate_source_pages, parse_input_split
+from stac2odc.sync import SyncState, WatermarkTracker, merge_search_filters, watermark_filter
 from stac2odc.toolbox import write_odc_element_in_yaml_file, datacube_index, prepare_advanced_filter, \
-    create_feature_collection_from_stac_elements
+    iterate_stac_pages
+from stac2odc.writer import OUTPUT_FORMATS, create_document_writer, file_uri, odc_dataset_file_path
+
+# page size of STAC searches. It must not change between a run and its resume
+STAC_PAGE_LIMIT = 120
+
+
+def stac_page_size(max_items: int) -> int:
+    """Get the page size of a run. Searches limited to less than `STAC_PAGE_LIMIT` items use a single page, so the
+    page size (and the page numbers saved in checkpoints) depends on `max_items`
+
+    Args:
+        max_items (int): Max items recovered in the run
+    Returns:
+        int: Number of items in each page
+    """
+    return min(STAC_PAGE_LIMIT, max_items) if max_items > 0 else STAC_PAGE_LIMIT
+
+
+def _log_run_summary(verbose: bool, metrics_file: str = None, metrics_format: str = 'json'):
+    """Log the summary of a CLI run: metrics of each stage and user defined modules cache statistics
+
+    Args:
+        verbose (bool): Flag indicates if stac2odc library is in a verbose mode
+        metrics_file (str): File where the metrics are written. If not defined, metrics are only logged
+        metrics_format (str): Format of `metrics_file` (json or prometheus)
+    """
+    udf_cache = user_defined_modules_cache_info()
+    logger_message(f"User defined modules: {udf_cache['loads']} loads, {udf_cache['hits']} cache hits",
+                   logger.info, verbose)
+    logger_message(f"Stages metrics:\n{metrics_summary()}", logger.info, verbose)
+
+    if metrics_file:
+        write_metrics(metrics_file, metrics_format, counters={
+            "user_defined_modules_loads": udf_cache['loads'],
+            "user_defined_modules_hits": udf_cache['hits']
+        })
+
+
+def _create_stac_service(url: str, access_token: str, http_cache_dir: str = None, http_cache_ttl: float = 3600,
+                         http_cache_max_size: int = 1024):
+    """Create the client of the STAC service. With `http_cache_dir`, the responses are cached on disk
+
+    Args:
+        url (str): STAC service URL
+        access_token (str): Personal Access Token of the BDC Auth
+        http_cache_dir (str): Directory of the HTTP responses cache. If not defined, responses are not cached
+        http_cache_ttl (float): Time (in seconds) a cached response is used without revalidation
+        http_cache_max_size (int): Max size (in MB) of the HTTP responses cache
+    Returns:
+        tuple: STAC service (stac.STAC or CachedStacService) and the HTTP cache (None if not used)
+    """
+    if not http_cache_dir:
+        import stac
+
+        return stac.STAC(url, False, access_token=access_token), None
+
+    from stac2odc.http_cache import CachedStacService, HttpResponseCache
+
+    http_cache = HttpResponseCache(http_cache_dir, http_cache_ttl, http_cache_max_size * 1024 ** 2)
+    return CachedStacService(url, access_token, http_cache), http_cache
+
+
+def _create_search_partitions(stac_service, stac_collection: str, search_filter: dict, partition_by: str,
+                              partitions: int, partition_tiles: str = None, tile_property: str = 'bdc:tiles'):
+    """Create the partitions of a STAC search. Time and bbox partitions split the interval and bbox of the search
+    or, when they are not defined, the extent of the collection
+
+    Args:
+        stac_service (stac.STAC): STAC Service instance
+        stac_collection (str): Collection name
+        search_filter (dict): STAC search parameters
+        partition_by (str): One of `PARTITION_TYPES`
+        partitions (int): Number of time or bbox partitions
+        partition_tiles (str): Comma separated tiles (tile partitions)
+        tile_property (str): STAC Item property with the tiles
+    Returns:
+        List[SearchPartition]: Partitions of the search
+    """
+    if partition_by == 'tile':
+        return tile_partitions([tile.strip() for tile in partition_tiles.split(',') if tile.strip()], tile_property)
+
+    collection_definition = None
+    if partition_by == 'time' and not search_filter.get('datetime') or \
+            partition_by == 'bbox' and not search_filter.get('bbox'):
+        with timed_stage('stac_collection'):
+            collection_definition = stac_service.collection(stac_collection)
+
+    if partition_by == 'time':
+        return collection_time_partitions(collection_definition, search_filter, partitions)
+    bbox = search_filter.get('bbox') or collection_definition['extent']['spatial']['bbox'][0]
+    return bbox_partitions([float(value) for value in bbox], partitions)
+
+
+def _http_cache_options(command):
+    """Add the HTTP responses cache options to a command"""
+    command = click.option('--http-cache-max-size', default=1024, type=click.IntRange(min=1), show_default=True,
+                           help='Max size (in MB) of the HTTP responses cache')(command)
+    command = click.option('--http-cache-ttl', default=3600, type=click.FloatRange(min=0), show_default=True,
+                           help='Time (in seconds) a cached response is used before revalidating it with the '
+                                'server (ETag/Last-Modified)')(command)
+    command = click.option('--http-cache-dir', default=None,
+                           help='Directory where STAC responses (collections and searches) are cached')(command)
+    return command
 
 
 @click.group()
@@ -42,9 +146,22 @@ def cli():
 @click.option('--datacube-config', '-dconfig', default=None, required=False)
 @click.option('--access-token', default=None, is_flag=False, help='Personal Access Token of the BDC Auth')
 @click.option('--verbose', default=False, is_flag=True, help='Enable verbose mode')
+@click.option('--metrics-file', default=None, help='File where the metrics of each stage are written')
+@click.option('--metrics-format', default='json', type=click.Choice(METRICS_FORMATS), show_default=True,
+              help='Format of --metrics-file (prometheus writes a node exporter textfile)')
+@_http_cache_options
 def collection2product_cli(collection: str, url: str, outdir: str, engine_file: str, datacube_config: str,
-                           access_token, verbose: bool):
-    collection_definition = stac.STAC(url, False, access_token=access_token).collection(collection)
+                           access_token, verbose: bool, metrics_file: str, metrics_format: str, http_cache_dir: str,
+                           http_cache_ttl: float, http_cache_max_size: int):
+    from datacube.utils import InvalidDocException
+    from datacube.utils.documents import read_documents
+
+    import stac2odc.collection
+
+    stac_service, http_cache = _create_stac_service(url, access_token, http_cache_dir, http_cache_ttl,
+                                                    http_cache_max_size)
+    with timed_stage('stac_collection'):
+        collection_definition = stac_service.collection(collection)
     odc_element = stac2odc.collection.collection2product(engine_file, collection_definition, verbose=verbose)
     product_definition_file = write_odc_element_in_yaml_file(odc_element, os.path.join(outdir, f'{collection}.yaml'))
 
@@ -59,6 +176,10 @@ def collection2product_cli(collection: str, url: str, outdir: str, engine_file:
         except InvalidDocException as e:
             logger_message(f'Error to add product: {str(e)}', logger.warning, True)
 
+    if http_cache:
+        logger_message(http_cache.summary(), logger.info, verbose)
+    _log_run_summary(verbose, metrics_file, metrics_format)
+
 
 @cli.command(name="item2dataset", help="Function to convert a STAC Collection JSON to ODC Dataset YAML")
 @click.option('-sc', '--stac-collection', required=True, help='Collection name (e.g. CB4MOSBR_64_3M_STK).')
@@ -72,30 +193,234 @@ def collection2product_cli(collection: str, url: str, outdir: str, engine_file:
 @click.option('--verbose', default=False, is_flag=True, help='Enable verbose mode')
 @click.option('--access-token', default=None, is_flag=False, help='Personal Access Token of the BDC Auth')
 @click.option('--advanced-filter', default=None, help='Search STAC Items with specific parameters')
+@click.option('--queue-size', default=4, type=click.IntRange(min=1), show_default=True,
+              help='Max pages waiting between pipeline stages (fetch, map and write/index)')
+@click.option('--fetch-workers', default=1, type=click.IntRange(min=1), show_default=True,
+              help='Number of STAC pages requested concurrently')
+@click.option('--checkpoint-file', default=None, help='JSON file where the run progress is saved')
+@click.option('--resume', default=False, is_flag=True,
+              help='Resume the run from the progress saved in --checkpoint-file')
+@click.option('--incremental', default=False, is_flag=True,
+              help='Only search STAC Items after the watermark saved by the last run of the collection')
+@click.option('--sync-state-file', default='stac2odc-sync-state.json', show_default=True,
+              help='JSON file where the watermark of each collection is saved (used with --incremental)')
+@click.option('--watermark-field', default='properties.datetime', show_default=True,
+              help='STAC Item datetime property used as watermark (e.g. properties.updated). Properties other than '
+                   'properties.datetime require the STAC query extension')
+@click.option('--skip-indexed/--no-skip-indexed', default=True, show_default=True,
+              help='Skip STAC Items whose dataset is already indexed, before mapping them')
+@click.option('--index-batch-size', default=1, type=click.IntRange(min=1), show_default=True,
+              help='Number of datasets added to the index in each transaction')
+@click.option('--no-write', default=False, is_flag=True,
+              help='Add datasets to the index without writing their YAML files')
+@click.option('--write-only', default=False, is_flag=True,
+              help='Write the datasets YAML files without adding them to the index')
+@click.option('--output-format', default='yaml', type=click.Choice(OUTPUT_FORMATS), show_default=True,
+              help='Format of datasets files: one YAML per dataset, multi-document YAML or NDJSON files (NDJSON files '
+                   'can not be added with datacube dataset add)')
+@click.option('--shard-size', default=1000, type=click.IntRange(min=1), show_default=True,
+              help='Number of datasets in each file (yaml-multi and ndjson formats)')
+@click.option('--fanout-depth', default=0, type=click.IntRange(min=0), show_default=True,
+              help='Number of hashed subdirectory levels used to spread the datasets files in the output directory')
+@click.option('--workers', default=1, type=click.IntRange(min=1), show_default=True,
+              help='Number of processes used to map STAC Items to ODC Datasets')
+@click.option('--metrics-file', default=None, help='File where the metrics of each stage are written')
+@click.option('--metrics-format', default='json', type=click.Choice(METRICS_FORMATS), show_default=True,
+              help='Format of --metrics-file (prometheus writes a node exporter textfile)')
+@click.option('--source', default='stac', type=click.Choice(INPUT_SOURCES), show_default=True,
+              help='Source of STAC Items: STAC API (--url) or local files (--input): static catalog, NDJSON or '
+                   'stac-geoparquet')
+@click.option('--input', 'input_path', default=None,
+              help='Input file of local sources (root catalog JSON, NDJSON or stac-geoparquet file)')
+@click.option('--input-split', default=None,
+              help='Part of the NDJSON file read by this run, as index/count (e.g. 0/4 for the first quarter)')
+@click.option('--mmap', 'use_mmap', default=False, is_flag=True, help='Read the NDJSON file with a memory map')
+@click.option('--partition-by', default=None, type=click.Choice(PARTITION_TYPES),
+              help='Split the STAC search in partitions searched in parallel: datetime windows of the search (or of '
+                   'the collection temporal extent), bbox strips of the search (or of the collection spatial extent) '
+                   'or tiles (--partition-tiles)')
+@click.option('--partitions', default=4, type=click.IntRange(min=1), show_default=True,
+              help='Number of time or bbox partitions')
+@click.option('--partition-tiles', default=None,
+              help='Comma separated tiles of the tile partitions (e.g. 044048,044049)')
+@click.option('--partition-tile-property', default='bdc:tiles', show_default=True,
+              help='STAC Item property with the tiles (searched with the query extension)')
+@click.option('--partition-workers', default=4, type=click.IntRange(min=1), show_default=True,
+              help='Number of partitions searched in parallel')
+@_http_cache_options
 def item2dataset_cli(stac_collection, dc_product, url, outdir, max_items, engine_file, datacube_config, verbose,
-                     access_token, advanced_filter):
+                     access_token, advanced_filter, queue_size, fetch_workers, checkpoint_file, resume, incremental,
+                     sync_state_file, watermark_field, skip_indexed, index_batch_size, no_write, write_only,
+                     output_format, shard_size, fanout_depth, workers, metrics_file, metrics_format, http_cache_dir,
+                     http_cache_ttl, http_cache_max_size, source, input_path, input_split, use_mmap, partition_by,
+                     partitions, partition_tiles, partition_tile_property, partition_workers):
+    is_offline = source != 'stac'
+    if is_offline and not input_path:
+        raise click.UsageError(f"--source {source} requires --input")
+    if is_offline and (advanced_filter or incremental):
+        raise click.UsageError("--advanced-filter and --incremental are only available with --source stac")
+    if input_split and source != 'ndjson':
+        raise click.UsageError("--input-split is only available with --source ndjson")
+    if partition_by and is_offline:
+        raise click.UsageError("--partition-by is only available with --source stac")
+    if partition_by and checkpoint_file:
+        raise click.UsageError("--partition-by can't be used with --checkpoint-file (pages order changes between runs)")
+    if partition_by == 'tile' and not partition_tiles:
+        raise click.UsageError("--partition-by tile requires --partition-tiles")
+    try:
+        split = parse_input_split(input_split) if input_split else None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--input-split')
+
+    if resume and not checkpoint_file:
+        raise click.UsageError("--resume requires --checkpoint-file")
+    if no_write and write_only:
+        raise click.UsageError("--no-write and --write-only can't be used together")
+
     _filter = {"collections": [stac_collection]}
     if advanced_filter:
         _filter = {
             **_filter, **prepare_advanced_filter(advanced_filter)
         }
 
-    stac_service = stac.STAC(url, False, access_token=access_token)
+    sync_state = None
+    watermark_tracker = None
+    if incremental:
+        sync_state = SyncState(sync_state_file)
+        watermark_tracker = WatermarkTracker(watermark_field)
+
+        watermark = sync_state.get_watermark(stac_collection, watermark_field)
+        if watermark:
+            logger_message(f"Searching items with {watermark_field} after {watermark}", logger.info, True)
+            _filter = merge_search_filters(_filter, watermark_filter(watermark_field, watermark))
+
+    page_size = stac_page_size(int(max_items))
+
+    checkpoint = None
+    if checkpoint_file:
+        search_definition = {"url": url, "filter": _filter, "limit": page_size}
+        if is_offline:
+            search_definition = {"source": source, "input": os.path.abspath(input_path), "split": split,
+                                 "collection": stac_collection, "limit": page_size}
+        checkpoint = RunCheckpoint(checkpoint_file, search_definition)
+
+        if resume and checkpoint.load():
+            logger_message(f"Resuming from page {checkpoint.next_page}", logger.info, True)
+
+    start_page = checkpoint.next_page if checkpoint else 1
+
+    from datacube.index.hl import Doc2Dataset
+    from datacube.scripts.dataset import remap_uri_from_doc, dataset_stream
+
+    import stac2odc.item
+    from stac2odc.indexer import DatasetBatchIndexer
+
     dc_index = datacube_index(datacube_config)
 
-    features = create_feature_collection_from_stac_elements(stac_service, int(max_items), _filter)
-    odc_datasets = stac2odc.item.item2dataset(engine_file, dc_product, features, dc_index, verbose=verbose)
-    odc_datasets_definition_files = write_odc_element_in_yaml_file(odc_datasets, outdir)
+    # fetch -> map -> write/index stages. Each stage runs as soon as a page is available in the previous one
+    http_cache = None
+    if is_offline:
+        stac_pages = iterate_source_pages(source, input_path, stac_collection, int(max_items), page_size,
+                                          start_page, use_mmap, split)
+    else:
+        stac_service, http_cache = _create_stac_service(url, access_token, http_cache_dir, http_cache_ttl,
+                                                        http_cache_max_size)
+        if partition_by:
+            search_partitions = _create_search_partitions(stac_service, stac_collection, _filter, partition_by,
+                                                          partitions, partition_tiles, partition_tile_property)
+            logger_message(f"Searching {len(search_partitions)} partitions ({partition_by})", logger.info, True)
+
+            stac_pages = iterate_partitioned_stac_pages(stac_service, int(max_items), _filter, search_partitions,
+                                                        limit=page_size, fetch_workers=fetch_workers,
+                                                        partition_workers=partition_workers, queue_size=queue_size,
+                                                        is_verbose=verbose)
+        else:
+            stac_pages = iterate_stac_pages(stac_service, int(max_items), _filter, limit=page_size,
+                                            fetch_workers=fetch_workers,
+                                            start_page=start_page)
+
+    # the watermark tracker counts all recovered items (including the ones indexed before a resume)
+    if watermark_tracker:
+        stac_pages = watermark_tracker.observe(stac_pages)
+    if checkpoint:
+        stac_pages = checkpoint.skip_indexed_items(stac_pages)
+
+    stac_pages = bounded_stage(stac_pages, queue_size)
+    odc_pages = bounded_stage(
+        stac2odc.item.item2dataset_stream(engine_file, dc_product, stac_pages, dc_index, verbose=verbose,
+                                          skip_indexed=skip_indexed, workers=workers), queue_size
+    )
 
     # add datasets definitions on datacube index
     # code adapted from: https://github.com/opendatacube/datacube-core/blob/develop/datacube/scripts/dataset.py
     ds_resolve = Doc2Dataset(dc_index, [dc_product])
-    doc_stream = remap_uri_from_doc(ui_path_doc_stream(odc_datasets_definition_files, uri=True))
-    datasets_on_stream = dataset_stream(doc_stream, ds_resolve)
 
-    logger_message(f"Adding datasets", logger.info, True)
-    for dataset in datasets_on_stream:
-        try:
-            dc_index.datasets.add(dataset, with_lineage=True)
-        except (ValueError, MissingRecordError):
-            logger_message(f"Error to add dataset ({dataset.local_uri})", logger.warning, True)
+    # STAC Item id of each dataset of the page in progress (only used with checkpoints)
+    stac_item_ids = {}
+
+    def _on_indexed(datasets):
+        checkpoint.items_indexed(stac_item_ids[str(dataset.id)] for dataset in datasets)
+
+    dataset_indexer = DatasetBatchIndexer(dc_index, index_batch_size, on_indexed=_on_indexed if checkpoint else None,
+                                          is_verbose=verbose)
+
+    document_writer = create_document_writer(output_format, outdir, fanout_depth, shard_size)
+    datasets_unresolved = 0
+
+    for odc_page in odc_pages:
+        if no_write:
+            odc_datasets_uris = [
+                file_uri(odc_dataset_file_path(odc_dataset, outdir, fanout_depth)) for odc_dataset in odc_page.items
+            ]
+        else:
+            with timed_stage('write', items=len(odc_page.items)) as timer:
+                bytes_written = document_writer.bytes_written
+                odc_datasets_uris = document_writer.write(odc_page.items)
+                timer.bytes = document_writer.bytes_written - bytes_written
+
+        if write_only:
+            if checkpoint:
+                checkpoint.page_completed(odc_page.number)
+            continue
+
+        if checkpoint:
+            stac_item_ids = {
+                odc_dataset['id']: stac_item_id for odc_dataset, stac_item_id in zip(odc_page.items, odc_page.ids)
+            }
+
+        # datasets are resolved from the mapped documents, without reading the files back. The URI is the
+        # file URI (even if it is not written), as it would be when adding the files with datacube CLI
+        doc_stream = remap_uri_from_doc(zip(odc_datasets_uris, odc_page.items))
+        with timed_stage('resolve', items=len(odc_page.items)):
+            datasets_of_page = list(dataset_stream(doc_stream, ds_resolve))
+        datasets_unresolved += len(odc_page.items) - len(datasets_of_page)
+
+        logger_message(f"Adding datasets of page {odc_page.number}", logger.info, True)
+        for dataset in datasets_of_page:
+            dataset_indexer.add(dataset)
+
+        if checkpoint:
+            # batches do not span pages with checkpoints, so the page is completed only when all its datasets are in
+            dataset_indexer.flush()
+            checkpoint.page_completed(odc_page.number)
+    document_writer.close()
+    dataset_indexer.flush()
+    logger_message(dataset_indexer.summary(), logger.info, True)
+
+    # the watermark is only saved when the search ran to the end and all datasets were indexed, since items are not
+    # ordered by it
+    if watermark_tracker:
+        watermark = watermark_tracker.safe_watermark(int(max_items), datasets_unresolved +
+                                                     dataset_indexer.datasets_failed,
+                                                     (start_page - 1) * page_size)
+        if watermark:
+            sync_state.set_watermark(stac_collection, watermark_field, watermark)
+            logger_message(f"Watermark of {stac_collection}: {watermark}", logger.info, True)
+        elif watermark_tracker.watermark:
+            logger_message(f"Watermark of {stac_collection} not saved: the search stopped at --max-items or some "
+                           f"datasets were not indexed", logger.warning, True)
+
+    if http_cache:
+        logger_message(http_cache.summary(), logger.info, True)
+
+    _log_run_summary(True, metrics_file, metrics_format)
@@ -0,0 +1,159 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from stac2odc.logger import logger_message
+from stac2odc.metrics import record_stage
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _read_validator(validator_file: str) -> Optional[str]:
+    try:
+        with open(validator_file) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _write_validator(validator_file: str, validator: Optional[str]) -> None:
+    if validator:
+        with open(validator_file, 'w') as f:
+            f.write(validator)
+    elif os.path.isfile(validator_file):
+        os.remove(validator_file)
+
+
+class AssetDownloader:
+    def __init__(self, workers: int = 4, chunk_size: int = DOWNLOAD_CHUNK_SIZE, session: requests.Session = None,
+                 is_verbose: bool = False):
+        """Downloader of STAC assets. Files are downloaded concurrently using a shared pool of connections.
+        Files already downloaded (with the same size of the remote file) are skipped and partial downloads are
+        resumed with HTTP Range requests. The validator (`ETag` or `Last-Modified`) of each partial download is kept
+        in `<out>.part.validator` and sent in `If-Range`, so a partial file of a remote file that changed is discarded.
+
+        Args:
+            workers (int): Number of concurrent transfers
+            chunk_size (int): Size (in bytes) of the chunks read from the responses and written in the files
+            session (requests.Session): Session used in the requests. If not defined, a new session is created
+            is_verbose (bool): Flag indicates if stac2odc library is in a verbose mode
+        """
+        self._workers = max(workers, 1)
+        self._chunk_size = chunk_size
+        self._is_verbose = is_verbose
+
+        self._session = session
+        if self._session is None:
+            self._session = requests.Session()
+
+            # connections are reused by all transfers
+            adapter = HTTPAdapter(pool_connections=self._workers, pool_maxsize=self._workers)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self.files_downloaded = 0
+        self.files_skipped = 0
+        self.files_resumed = 0
+        self.bytes_downloaded = 0
+
+    def _remote_size(self, url: str) -> Optional[int]:
+        with self._session.head(url, allow_redirects=True) as response:
+            response.raise_for_status()
+            content_length = response.headers.get('Content-Length')
+        return int(content_length) if content_length is not None else None
+
+    def download(self, url: str, out: str) -> str:
+        """Download a file. The data is written in `<out>.part`, which is renamed to `out` when the download ends
+
+        Args:
+            url (str): File URL
+            out (str): Output file
+        Returns:
+            str: Output file
+        """
+        if os.path.isfile(out) and os.path.getsize(out) == self._remote_size(url):
+            logger_message(f"File {out} already downloaded", logger.info, self._is_verbose)
+            with self._lock:
+                self.files_skipped += 1
+            return out
+
+        out_dir = os.path.dirname(out)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+        start = time.perf_counter()
+        part_file = out + '.part'
+        validator_file = part_file + '.validator'
+        part_size = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+        validator = _read_validator(validator_file) if part_size else None
+
+        # the partial file is only resumed if the remote file is the same (`If-Range`), otherwise the server
+        # sends the full file. Partial files without a validator can not be checked, so they are downloaded again
+        headers = {'Range': f'bytes={part_size}-', 'If-Range': validator} if validator else {}
+
+        with self._session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 416:
+                # the partial file is not valid for the remote file anymore
+                os.remove(part_file)
+                return self.download(url, out)
+            response.raise_for_status()
+
+            # the remote file changed (or the server does not support Range requests), so the download restarts
+            is_resumed = bool(headers) and response.status_code == 206
+            if not is_resumed:
+                _write_validator(validator_file, response.headers.get('ETag') or response.headers.get('Last-Modified'))
+
+            bytes_downloaded = 0
+            with open(part_file, 'ab' if is_resumed else 'wb') as ofile:
+                for chunk in response.iter_content(chunk_size=self._chunk_size):
+                    if chunk:
+                        ofile.write(chunk)
+                        bytes_downloaded += len(chunk)
+
+        os.replace(part_file, out)
+        _write_validator(validator_file, None)
+        record_stage('download', time.perf_counter() - start, nbytes=bytes_downloaded)
+        with self._lock:
+            self.files_downloaded += 1
+            self.files_resumed += int(is_resumed)
+            self.bytes_downloaded += bytes_downloaded
+        logger_message(f"File {out} downloaded", logger.info, self._is_verbose)
+        return out
+
+    def download_many(self, files: List[Tuple[str, str]]) -> List[str]:
+        """Download many files concurrently
+
+        Args:
+            files (List[tuple]): URL and output file of each file
+        Returns:
+            List[str]: Output files, in the same order
+        """
+        if not files:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self._workers, len(files))) as executor:
+            return list(executor.map(lambda file: self.download(*file), files))
+
+    def summary(self) -> str:
+        """Summary of the downloads
+
+        Returns:
+            str: Counts of the files and bytes downloaded
+        """
+        return f"Files downloaded: {self.files_downloaded} ({self.files_resumed} resumed, {self.files_skipped} " \
+               f"already downloaded), {self.bytes_downloaded} bytes"
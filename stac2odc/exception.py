@@ -24,3 +24,11 @@ class InvalidReturnedTypeFromUserDefinedFunction(TypeError):
 
 class UserDefinedFunctionError(TypeError):
     ...
+
+
+class CheckpointMismatchError(RuntimeError):
+    ...
+
+
+class GridProbeError(RuntimeError):
+    ...
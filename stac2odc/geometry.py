@@ -6,11 +6,66 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 
+import functools
+from collections import defaultdict
+from typing import List, Optional, Sequence
+
+import numpy
 import pyproj
+import shapely
 import shapely.geometry
 from shapely.geometry.base import BaseGeometry
 from shapely.ops import transform
 
+# max number of (source, destiny) CRS pairs with a transformer kept in memory
+TRANSFORMER_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=TRANSFORMER_CACHE_SIZE)
+def _get_transformer(crs_src: str, crs_dest: str) -> Optional[pyproj.Transformer]:
+    """Get a transformer between two CRS. Transformers are cached, since creating them is much more
+    expensive than reprojecting a geometry
+
+    Args:
+        crs_src (str): Actual geometry CRS
+        crs_dest (str): Destiny geometry CRS
+    Returns:
+        pyproj.Transformer: Transformer from `crs_src` to `crs_dest` or None if both CRS are equivalent
+    """
+    crs_src = pyproj.CRS(crs_src)
+    crs_dest = pyproj.CRS(crs_dest)
+
+    if crs_src == crs_dest:
+        return None
+    return pyproj.Transformer.from_crs(crs_src, crs_dest)
+
+
+def _transform_crs_batch(crs_src: str, crs_dest: str, geoms: Sequence[BaseGeometry]) -> List[BaseGeometry]:
+    """Reproject many geometries at once. With shapely 2, the coordinates of all geometries are reprojected
+    in a single call to the transformer, using NumPy arrays
+
+    Args:
+        crs_src (str): Actual geometries CRS
+        crs_dest (str): Destiny geometries CRS
+        geoms (Sequence[shapely.geometry.base.BaseGeometry]): Shapely Geometries
+    Returns:
+        List[shapely.geometry.base.BaseGeometry]: Shapely Geometries reprojected, in the same order
+    """
+    transformer = _get_transformer(crs_src, crs_dest)
+
+    if transformer is None:
+        return list(geoms)
+
+    if not hasattr(shapely, 'transform'):  # shapely < 2 has no vectorized API
+        return [transform(transformer.transform, geom) for geom in geoms]
+
+    def _transform_coordinates(coordinates: numpy.ndarray) -> numpy.ndarray:
+        return numpy.column_stack(transformer.transform(*coordinates.T))
+
+    geoms = numpy.asarray(geoms, dtype=object)
+    include_z = bool(shapely.has_z(geoms).all())
+    return list(shapely.transform(geoms, _transform_coordinates, include_z=include_z))
+
 
 def _transform_crs(crs_src: str, crs_dest: str, geom: BaseGeometry) -> BaseGeometry:
     """Reproject geometry
@@ -22,11 +77,7 @@ def _transform_crs(crs_src: str, crs_dest: str, geom: BaseGeometry) -> BaseGeome
     Returns:
         shapely.geometry.base.BaseGeometry: Shapely Geometry reprojected
     """
-    crs_src = pyproj.CRS(crs_src)
-    crs_dest = pyproj.CRS(crs_dest)
-
-    transform_fnc = pyproj.Transformer.from_crs(crs_src, crs_dest).transform
-    return transform(transform_fnc, geom)
+    return _transform_crs_batch(crs_src, crs_dest, [geom])[0]
 
 
 class StacItemGeometry:
@@ -84,6 +135,30 @@ class StacItemGeometry:
         _basegeom_tmp = _transform_crs(self._crsgeom, crs_dest, self._basegeom)
         return StacItemGeometry(_basegeom_tmp, crs_dest)
 
+    @staticmethod
+    def batch_to_crs(geometries: Sequence['StacItemGeometry'], crs_dest: str) -> List['StacItemGeometry']:
+        """Function to change the CRS of many geometries at once. Geometries with the same CRS are reprojected
+        together, so the cost scales with the number of coordinates rather than the number of geometries
+
+        Args:
+            geometries (Sequence[StacItemGeometry]): Geometries to reproject
+            crs_dest (str): Destiny CRS definition
+        Returns:
+            List[StacItemGeometry]: Instances of StacItemGeometry with the new defined CRS, in the same order
+        """
+
+        geometries_by_crs = defaultdict(list)
+        for index, geometry in enumerate(geometries):
+            geometries_by_crs[geometry._crsgeom].append(index)
+
+        reprojected_geometries = [None] * len(geometries)
+        for crs_src, indexes in geometries_by_crs.items():
+            _basegeoms_tmp = _transform_crs_batch(crs_src, crs_dest, [geometries[i]._basegeom for i in indexes])
+
+            for index, _basegeom_tmp in zip(indexes, _basegeoms_tmp):
+                reprojected_geometries[index] = StacItemGeometry(_basegeom_tmp, crs_dest)
+        return reprojected_geometries
+
     def to_geojson(self) -> dict:
         """Transform geometry to GeoJSON
 
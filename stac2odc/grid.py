@@ -0,0 +1,132 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Tuple
+
+from stac2odc.exception import GridProbeError
+from stac2odc.metrics import timed_stage
+
+
+def read_raster_grid(href: str) -> dict:
+    """Read the grid (shape and affine transform) from the header of a raster file
+
+    Args:
+        href (str): Raster path or URL (anything rasterio is able to open)
+    Returns:
+        dict: Grid with keys shape and transform
+    Raises:
+        GridProbeError: if the raster can not be opened
+    """
+    import rasterio
+
+    try:
+        with timed_stage('grid_probe'), rasterio.open(href) as datasource:
+            return {
+                "shape": list(datasource.shape),
+                "transform": list(datasource.transform)
+            }
+    except rasterio.errors.RasterioIOError as e:
+        raise GridProbeError(f"Error to read the grid of {href} ({str(e)})")
+
+
+class GridProbe:
+    def __init__(self, cache_file: str = None, workers: int = 8):
+        """Probe of raster grids. Raster headers are read concurrently and the grids are cached in memory and,
+        optionally, on disk. Grids can also be cached by a key shared by many rasters (e.g. the tile), so a grid is
+        read only once per tile.
+
+        Args:
+            cache_file (str): JSON file where the grids are cached between runs. If not defined, grids are only
+            cached in memory
+            workers (int): Number of raster headers read concurrently
+        """
+        self._cache_file = cache_file
+        self._workers = max(workers, 1)
+        self._lock = threading.Lock()
+
+        self._grids = {}
+        if cache_file and os.path.isfile(cache_file):
+            with open(cache_file, 'r') as cfile:
+                self._grids = json.load(cfile)
+
+    def _cached_grid(self, href: str, grid_key: Optional[str]) -> Optional[dict]:
+        with self._lock:
+            if grid_key and grid_key in self._grids:
+                return self._grids[grid_key]
+            return self._grids.get(href)
+
+    def _cache_grid(self, href: str, grid_key: Optional[str], grid: dict) -> None:
+        with self._lock:
+            self._grids[href] = grid
+
+            if grid_key:
+                self._grids[grid_key] = grid
+
+    def probe(self, rasters: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """Read the grids of many rasters concurrently. Grids already cached are not read again
+
+        Args:
+            rasters (Iterable[tuple]): href and grid key (or None) of each raster
+        """
+        rasters_to_read = OrderedDict()
+        for href, grid_key in rasters:
+            # rasters with the same key have the same grid, so only the first one is read
+            if self._cached_grid(href, grid_key) is None and (grid_key or href) not in rasters_to_read:
+                rasters_to_read[grid_key or href] = (href, grid_key)
+
+        if not rasters_to_read:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self._workers, len(rasters_to_read))) as executor:
+            hrefs = [href for href, _ in rasters_to_read.values()]
+
+            for (href, grid_key), grid in zip(rasters_to_read.values(), executor.map(read_raster_grid, hrefs)):
+                self._cache_grid(href, grid_key, grid)
+        self.save()
+
+    def get_grid(self, href: str, grid_key: str = None) -> dict:
+        """Get the grid of a raster, reading it if it is not cached
+
+        Args:
+            href (str): Raster path or URL
+            grid_key (str): Key shared by the rasters with the same grid (e.g. the tile)
+        Returns:
+            dict: Grid with keys shape and transform
+        """
+        grid = self._cached_grid(href, grid_key)
+
+        if grid is None:
+            self.probe([(href, grid_key)])
+            grid = self._cached_grid(href, grid_key)
+        return grid
+
+    def save(self) -> None:
+        """Save the cached grids in the cache file (if defined). Grids saved by other processes meanwhile are kept"""
+        if not self._cache_file:
+            return
+
+        with self._lock:
+            grids = dict(self._grids)
+
+        if os.path.isfile(self._cache_file):
+            with open(self._cache_file, 'r') as cfile:
+                grids = {**json.load(cfile), **grids}
+
+        cache_dir = os.path.dirname(self._cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        cache_tmp_file = f"{self._cache_file}.{os.getpid()}.tmp"
+        with open(cache_tmp_file, 'w') as cfile:
+            json.dump(grids, cfile)
+        os.replace(cache_tmp_file, self._cache_file)
@@ -0,0 +1,217 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# query parameters that are not part of the cache key and are not saved in the cache (e.g. secrets)
+UNCACHED_PARAMETERS = ['access_token']
+
+
+class HttpResponseCache:
+    def __init__(self, cache_dir: str, ttl: float = 3600, max_size: int = 1024 ** 3):
+        """On-disk cache of JSON responses. Responses are fresh during `ttl` seconds. After that, they are
+        revalidated with the server (ETag and Last-Modified) and only downloaded again if they changed.
+        When the cache is bigger than `max_size`, the least recently used responses are evicted.
+
+        Args:
+            cache_dir (str): Directory where the responses are saved
+            ttl (float): Time (in seconds) a response is used without revalidation
+            max_size (int): Max size (in bytes) of the cache directory
+        """
+        self._cache_dir = cache_dir
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # size and last use of each cache file, ordered by last use
+        entries = []
+        for entry_name in os.listdir(cache_dir):
+            if entry_name.endswith('.json'):
+                entry_stat = os.stat(os.path.join(cache_dir, entry_name))
+                entries.append((entry_stat.st_mtime, entry_name, entry_stat.st_size))
+        self._entries = OrderedDict((entry_name, entry_size) for _, entry_name, entry_size in sorted(entries))
+        self._size = sum(self._entries.values())
+
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_key(method: str, url: str, params: Optional[dict], body: Optional[dict]) -> str:
+        params = {key: value for key, value in (params or {}).items() if key not in UNCACHED_PARAMETERS}
+        return json.dumps([method.upper(), url, params, body], sort_keys=True)
+
+    def _read_entry(self, entry_name: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._cache_dir, entry_name), 'r') as efile:
+                entry = json.load(efile)
+        except (OSError, ValueError):
+            return None
+
+        # malformed entries (e.g. written by other versions) are misses, and are replaced by the new response
+        if not isinstance(entry, dict) or 'content' not in entry or \
+                not isinstance(entry.get('stored_at'), (int, float)):
+            return None
+        return entry
+
+    def _write_entry(self, entry_name: str, entry: dict) -> None:
+        entry_path = os.path.join(self._cache_dir, entry_name)
+
+        entry_tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with open(entry_tmp_path, 'w') as efile:
+            json.dump(entry, efile)
+        os.replace(entry_tmp_path, entry_path)
+
+        with self._lock:
+            self._size -= self._entries.pop(entry_name, 0)
+            self._entries[entry_name] = os.path.getsize(entry_path)
+            self._size += self._entries[entry_name]
+
+            self._evict()
+
+    def _touch_entry(self, entry_name: str) -> None:
+        with self._lock:
+            if entry_name in self._entries:
+                self._entries.move_to_end(entry_name)
+        try:
+            os.utime(os.path.join(self._cache_dir, entry_name))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        # the most recent entry is never evicted, even if it is bigger than the cache
+        while self._size > self._max_size and len(self._entries) > 1:
+            entry_name, entry_size = self._entries.popitem(last=False)
+            self._size -= entry_size
+
+            try:
+                os.remove(os.path.join(self._cache_dir, entry_name))
+            except OSError:
+                pass
+
+    def request(self, session: requests.Session, method: str, url: str, params: dict = None,
+                body: dict = None) -> object:
+        """Request a JSON document, using the cached response when it is fresh or not modified
+
+        Args:
+            session (requests.Session): Session used in the requests
+            method (str): HTTP method (GET or POST)
+            url (str): URL
+            params (dict): Query parameters
+            body (dict): JSON body (POST requests)
+        Returns:
+            object: JSON document
+        """
+        entry_name = hashlib.sha256(self._cache_key(method, url, params, body).encode('utf-8')).hexdigest() + '.json'
+        entry = self._read_entry(entry_name)
+
+        if entry and time.time() - entry['stored_at'] < self._ttl:
+            with self._lock:
+                self.hits += 1
+            self._touch_entry(entry_name)
+            return entry['content']
+
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        with session.request(method, url, params=params, json=body, headers=headers) as response:
+            if response.status_code == 304:
+                # conditional headers are only sent with an entry, so a 304 without entry has no content to use
+                if not entry:
+                    raise requests.HTTPError(f"304 Not Modified for {url} without a cached response",
+                                             response=response)
+
+                with self._lock:
+                    self.revalidations += 1
+
+                self._write_entry(entry_name, {**entry, 'stored_at': time.time()})
+                return entry['content']
+
+            response.raise_for_status()
+            content = response.json()
+
+            with self._lock:
+                self.misses += 1
+            self._write_entry(entry_name, {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'stored_at': time.time(),
+                'content': content
+            })
+        return content
+
+    def summary(self) -> str:
+        """Summary of the cache use
+
+        Returns:
+            str: Counts of the requests answered by the cache
+        """
+        return f"HTTP cache: {self.hits} hits, {self.revalidations} not modified, {self.misses} downloads " \
+               f"({self._size / 1024 ** 2:.1f} MB in {len(self._entries)} responses)"
+
+
+class StacSearchResult(NamedTuple):
+    """Features of a STAC search (same attribute used from stac.py ItemCollection)"""
+    features: List[dict]
+
+
+class CachedStacService:
+    def __init__(self, url: str, access_token: str = None, cache: HttpResponseCache = None):
+        """Client of STAC services with responses saved in a `HttpResponseCache`. It implements the methods of
+        stac.py STAC class used by stac2odc (`collection` and `search`)
+
+        Args:
+            url (str): STAC service URL
+            access_token (str): Personal Access Token of the BDC Auth (sent as query parameter)
+            cache (HttpResponseCache): Cache of the responses
+        """
+        self._url = url.rstrip('/')
+        self._params = {'access_token': access_token} if access_token else None
+        self._cache = cache
+
+        # connections are reused by all requests (pages can be requested concurrently)
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_maxsize=16))
+        self._session.mount('https://', HTTPAdapter(pool_maxsize=16))
+
+    def collection(self, collection_id: str) -> dict:
+        """Get a STAC Collection
+
+        Args:
+            collection_id (str): Collection name
+        Returns:
+            dict: STAC Collection definition
+        """
+        return self._cache.request(self._session, 'GET', f"{self._url}/collections/{collection_id}", self._params)
+
+    def search(self, filter: dict = None) -> StacSearchResult:
+        """Search STAC Items (POST /search)
+
+        Args:
+            filter (dict): STAC search parameters
+        Returns:
+            StacSearchResult: Features found
+        """
+        item_collection = self._cache.request(self._session, 'POST', f"{self._url}/search", self._params,
+                                              filter or {})
+        return StacSearchResult(item_collection.get('features', []))
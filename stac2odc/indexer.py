@@ -0,0 +1,139 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import time
+from typing import Callable, List
+
+import datacube.index.index
+from datacube.index import MissingRecordError
+from datacube.model import Dataset
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+
+from stac2odc.logger import logger_message
+from stac2odc.metrics import record_stage
+
+# datacube has no public API to add many datasets in a single transaction, so the batches use the internals of
+# `datasets.add` of the datacube version required by stac2odc. With other versions datasets are added one by one
+DATACUBE_TRANSACTION_SUPPORT = str(getattr(datacube, '__version__', '')).startswith('1.8.')
+
+
+class DatasetBatchIndexer:
+    def __init__(self, dc_index: datacube.index.index.Index, batch_size: int = 1,
+                 on_indexed: Callable[[List[Dataset]], None] = None, is_verbose: bool = False):
+        """Add datasets to the ODC index in batches. Each batch is inserted in a single transaction. If the
+        transaction fails, the datasets of the batch are added one by one, so a single invalid dataset does not
+        discard the whole batch. Datasets already in the index are skipped (and counted in `datasets_present`).
+
+        Args:
+            dc_index (datacube.index.index.Index): Instance of datacube_index
+            batch_size (int): Number of datasets inserted in each transaction
+            on_indexed (function): Function called after each batch with the datasets of the batch added to the index
+                (or already in the index)
+            is_verbose (bool): Flag indicates if stac2odc library is in a verbose mode
+        """
+        self._dc_index = dc_index
+        self._batch_size = max(batch_size, 1)
+        self._on_indexed = on_indexed
+        self._is_verbose = is_verbose
+
+        self._batch = []
+
+        self.datasets_indexed = 0
+        self.datasets_present = 0
+        self.datasets_failed = 0
+        self.batches = 0
+        self.batches_fallback = 0
+        self.seconds = 0.0
+
+    def add(self, dataset: Dataset) -> None:
+        """Add a dataset to the current batch. The batch is inserted when it is full
+
+        Args:
+            dataset (datacube.model.Dataset): Resolved dataset
+        """
+        self._batch.append(dataset)
+
+        if len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Insert the datasets of the current batch"""
+        if not self._batch:
+            return
+
+        batch, self._batch = self._batch, []
+
+        start = time.perf_counter()
+        datasets_present = self._dc_index.datasets.bulk_has([dataset.id for dataset in batch])
+        present_datasets = [dataset for dataset, is_present in zip(batch, datasets_present) if is_present]
+        new_datasets = [dataset for dataset, is_present in zip(batch, datasets_present) if not is_present]
+
+        if len(new_datasets) > 1 and self._can_add_in_transaction(new_datasets):
+            try:
+                added_datasets = self._add_in_transaction(new_datasets)
+            except (SQLAlchemyError, MissingRecordError) as e:
+                logger_message(f"Error to add batch of {len(new_datasets)} datasets ({str(e)}). Adding one by one",
+                               logger.warning, True)
+                self.batches_fallback += 1
+                added_datasets = self._add_one_by_one(new_datasets)
+        else:
+            added_datasets = self._add_one_by_one(new_datasets)
+        elapsed = time.perf_counter() - start
+
+        record_stage('index', elapsed, items=len(batch))
+        self.batches += 1
+        self.seconds += elapsed
+        self.datasets_indexed += len(added_datasets)
+        self.datasets_present += len(present_datasets)
+        self.datasets_failed += len(new_datasets) - len(added_datasets)
+        logger_message(f"Batch of {len(batch)} datasets added in {elapsed:.3f}s ({len(present_datasets)} already "
+                       f"indexed)", logger.info, self._is_verbose)
+
+        if self._on_indexed and (present_datasets or added_datasets):
+            self._on_indexed(present_datasets + added_datasets)
+
+    def summary(self) -> str:
+        """Summary of the datasets added to the index
+
+        Returns:
+            str: Counts and timings of the insertions
+        """
+        throughput = self.datasets_indexed / self.seconds if self.seconds else 0.0
+        return f"Datasets indexed: {self.datasets_indexed} ({self.datasets_present} already indexed, " \
+               f"{self.datasets_failed} errors) in {self.batches} batches ({self.batches_fallback} added one by " \
+               f"one), {self.seconds:.3f}s ({throughput:.1f} datasets/s)"
+
+    def _can_add_in_transaction(self, batch: List[Dataset]) -> bool:
+        # datasets with lineage (sources) are added by `datasets.add`, which also inserts the source datasets
+        datasets_resource = self._dc_index.datasets
+        return DATACUBE_TRANSACTION_SUPPORT and hasattr(datasets_resource, '_db') and \
+            hasattr(datasets_resource, '_ensure_new_locations') and not any(dataset.sources for dataset in batch)
+
+    def _add_in_transaction(self, new_datasets: List[Dataset]) -> List[Dataset]:
+        # same insertions made by `datasets.add` (datacube 1.8), but with all datasets in a single transaction
+        # code adapted from: https://github.com/opendatacube/datacube-core/blob/develop/datacube/index/_datasets.py
+        datasets_resource = self._dc_index.datasets
+
+        with datasets_resource._db.begin() as transaction:
+            for dataset in new_datasets:
+                transaction.insert_dataset(dataset.metadata_doc_without_lineage(), dataset.id, dataset.type.id)
+
+                if dataset.uris is not None:
+                    datasets_resource._ensure_new_locations(dataset, transaction=transaction)
+        return new_datasets
+
+    def _add_one_by_one(self, batch: List[Dataset]) -> List[Dataset]:
+        added_datasets = []
+        for dataset in batch:
+            try:
+                self._dc_index.datasets.add(dataset, with_lineage=True)
+                added_datasets.append(dataset)
+            except (ValueError, MissingRecordError):
+                logger_message(f"Error to add dataset ({dataset.local_uri})", logger.warning, True)
+        return added_datasets
@@ -5,46 +5,214 @@
 # stac2odc is free software; you can redistribute it and/or modify it
 # under the terms of the MIT License; see LICENSE file for more details.
 #
-import uuid
-from collections import OrderedDict
-from typing import List, Union, Dict
+from collections import OrderedDict, deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Union, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
 
-import datacube.index.index
 from loguru import logger
 
 import stac2odc.tree as tree
+from stac2odc.exception import EngineInvalidDefinitionKey
 from stac2odc.geometry import StacItemGeometry
 from stac2odc.logger import logger_message
 from stac2odc.mapper import StacMapperEngine
+from stac2odc.metrics import timed_stage, take_stage_metrics, merge_stage_metrics
+from stac2odc.operation import merge_user_defined_modules_cache_info, take_user_defined_modules_cache_info
+from stac2odc.pipeline import Page
 
 
-def _create_geometry_object(geometry_path_in_stac_values: str, stac_values: Dict,
-                            native_crs: str) -> Union[None, OrderedDict]:
-    """
+def _create_geometry_objects(geometry_path_in_stac_values: List[str], stac_items: List[Dict],
+                             native_crs: str) -> List[Union[None, OrderedDict]]:
+    """Create the ODC geometry of many STAC Items. All geometries are reprojected to the native CRS at once.
+
     Args:
-        geometry_path_in_stac_values (str): Path where geometry definition is in stac_values
-        stac_values (dict): Stac Item definition
+        geometry_path_in_stac_values (list): Path where geometry definition is in each STAC Item
+        stac_items (list): Stac Items definitions
         native_crs (str): Dataset native CRS
     Returns:
-        OrderedDict or None
+        List[OrderedDict or None]: Geometry of each STAC Item (None if the item has no geometry), in the same order
     """
 
-    if geometry_path_in_stac_values:
+    def listit(t):
+        # from: https://stackoverflow.com/questions/1014352/how-do-i-convert-a-nested-tuple-of-tuples-and-lists-to-lists-of-lists-in-python
+        return list(map(listit, t)) if isinstance(t, (list, tuple)) else t
+
+    odc_geometries = [None] * len(stac_items)
+    if not geometry_path_in_stac_values:
+        return odc_geometries
+
+    items_with_geometry = []
+    stac_item_geometries = []
+    for index, stac_values in enumerate(stac_items):
         geometry_definition = tree.get_value_by_tree_path(stac_values, geometry_path_in_stac_values)
 
         if geometry_definition:
             # ESPG:4326 is a STAC Item Spec definition
-            stac_item_geometry = StacItemGeometry(geometry_definition, 'EPSG:4326').to_crs(native_crs).to_geojson()
+            items_with_geometry.append(index)
+            stac_item_geometries.append(StacItemGeometry(geometry_definition, 'EPSG:4326'))
+
+    with timed_stage('reproject', items=len(stac_item_geometries)):
+        stac_item_geometries = StacItemGeometry.batch_to_crs(stac_item_geometries, native_crs)
+    for index, stac_item_geometry in zip(items_with_geometry, stac_item_geometries):
+        stac_item_geometry = stac_item_geometry.to_geojson()
+
+        odc_geometry = OrderedDict()
+        odc_geometry['type'] = stac_item_geometry['geometries'][0]['type']
+        # transform tuples into list to avoid errors in yaml read/write
+        odc_geometry['coordinates'] = listit(stac_item_geometry['geometries'][0]['coordinates'])
+        odc_geometries[index] = odc_geometry
+    return odc_geometries
+
+
+class ProductContext(NamedTuple):
+    """Product information shared by all items of an item2dataset run
+
+    Attributes:
+        definition (dict): ODC Product definition
+        native_crs (str): Product native CRS (storage.crs). None if product has no CRS defined
+        geometry_path (list): Tree path (nodes) where the geometry is in the STAC Item. None if it is not mapped
+    """
+    definition: Dict
+    native_crs: Optional[str]
+    geometry_path: Optional[List[str]]
+
+
+def load_product_context(engine: StacMapperEngine, collection_name: str,
+                         dc_index: 'datacube.index.index.Index' = None) -> Optional[ProductContext]:
+    """Resolve the product information used to map the items. This must be done once per run, since it
+    requires a query in the ODC index.
 
-            odc_geometry = OrderedDict()
-            odc_geometry['type'] = stac_item_geometry['geometries'][0]['type']
-            odc_geometry['coordinates'] = stac_item_geometry['geometries'][0]['coordinates']
-            return odc_geometry
-    return
+    Args:
+        engine (StacMapperEngine): Engine with the mapping rules
+        collection_name (str): Name of collection (product in ODC)
+        dc_index (datacube.index.index.Index): Instance of datacube_index
+    Returns:
+        ProductContext: Product information or None if `dc_index` is not defined
+    """
+
+    if not dc_index:
+        return None
+
+    # get product definition
+    crs_definition = 'storage.crs'
+    product_definition = dc_index.products.get_by_name(collection_name).definition
+
+    native_crs = None
+    geometry_path = None
+    if tree.is_path_valid_in_tree(product_definition, crs_definition):
+        native_crs = tree.get_value_by_tree_path(product_definition, crs_definition)
+
+        # "geometry" name is defined in ODC-Dataset fields spec
+        try:
+            geometry_path = engine.get_definition_by_name("dataset", "fromSTAC", "geometry")
+        except (KeyError, EngineInvalidDefinitionKey):
+            geometry_path = None
+        geometry_path = tree.split_tree_path(geometry_path) if geometry_path else None
+    return ProductContext(product_definition, native_crs, geometry_path)
+
+
+def _map_item_to_odc_dataset(engine: StacMapperEngine, collection_name: str, item_definition: Dict,
+                             product_context: ProductContext = None, dataset_id: str = None) -> OrderedDict:
+    """Map a single STAC Item to an ODC Dataset, without geometry
+
+    Args:
+        engine (StacMapperEngine): Engine with the mapping rules
+        collection_name (str): Name of collection
+        item_definition (dict): STAC Item definition
+        product_context (ProductContext): Product information created with `load_product_context`
+        dataset_id (str): ODC Dataset id. If not defined, it is created by the engine
+    Returns:
+        OrderedDict: ODC Dataset definition
+    """
+
+    _odc_element = engine.map_item_to_dataset(item_definition)
+    _odc_element["product"] = OrderedDict({
+        "name": collection_name
+    })
+    _odc_element["id"] = dataset_id or engine.create_dataset_id(item_definition, collection_name)
+
+    # geometry is only mapped if 'crs' is defined in product
+    if 'geometry' in _odc_element:
+        del _odc_element['geometry']
+
+    if product_context and product_context.native_crs:
+        _odc_element["crs"] = product_context.native_crs
+    return _odc_element
+
+
+def _map_items_to_odc_datasets(engine: StacMapperEngine, collection_name: str, item_definitions: List[Dict],
+                               product_context: ProductContext = None,
+                               dataset_ids: List[str] = None) -> List[OrderedDict]:
+    """Map a page of STAC Items to ODC Datasets. The geometries of the page are reprojected together
+
+    Args:
+        engine (StacMapperEngine): Engine with the mapping rules
+        collection_name (str): Name of collection
+        item_definitions (list): STAC Items definitions
+        product_context (ProductContext): Product information created with `load_product_context`
+        dataset_ids (list): ODC Dataset id of each item. If not defined, ids are created by the engine
+    Returns:
+        List[OrderedDict]: ODC Datasets definitions, in the same order of the items
+    """
+
+    if dataset_ids is None:
+        dataset_ids = [None] * len(item_definitions)
+
+    with timed_stage('map', items=len(item_definitions)):
+        engine.prepare_items(item_definitions)
+        odc_elements = [
+            _map_item_to_odc_dataset(engine, collection_name, item_definition, product_context, dataset_id)
+            for item_definition, dataset_id in zip(item_definitions, dataset_ids)
+        ]
+
+    if product_context and product_context.native_crs:
+        # try add geometry
+        odc_geometries = _create_geometry_objects(product_context.geometry_path, item_definitions,
+                                                  product_context.native_crs)
+
+        for odc_element, odc_geometry in zip(odc_elements, odc_geometries):
+            if odc_geometry:
+                odc_element["geometry"] = odc_geometry
+    return odc_elements
+
+
+def _skip_indexed_items(engine: StacMapperEngine, collection_name: str, item_definitions: List[Dict],
+                        dc_index: 'datacube.index.index.Index') -> Tuple[List[Dict], List[str]]:
+    """Remove the STAC Items whose dataset is already in the ODC index, with a single query for all items
+
+    Args:
+        engine (StacMapperEngine): Engine with the mapping rules
+        collection_name (str): Name of collection
+        item_definitions (list): STAC Items definitions
+        dc_index (datacube.index.index.Index): Instance of datacube_index
+    Returns:
+        Tuple[list, list]: STAC Items not indexed and their ODC Dataset ids
+    """
+
+    dataset_ids = [engine.create_dataset_id(item_definition, collection_name) for item_definition in item_definitions]
+    if not dataset_ids:
+        return [], []
+
+    datasets_indexed = dc_index.datasets.bulk_has(dataset_ids)
+    items_not_indexed = [
+        (item_definition, dataset_id)
+        for item_definition, dataset_id, is_indexed in zip(item_definitions, dataset_ids, datasets_indexed)
+        if not is_indexed
+    ]
+    return [item for item, _ in items_not_indexed], [dataset_id for _, dataset_id in items_not_indexed]
+
+
+def _load_run_product_context(engine: StacMapperEngine, collection_name: str,
+                              dc_index: 'datacube.index.index.Index', is_verbose: bool) -> Optional[ProductContext]:
+    """Load the product context of a run, warning when there is no index to get it from"""
+    if not dc_index:
+        logger_message("There is no datacube_index definition. CRS will not be defined", logger.warning, is_verbose)
+    return load_product_context(engine, collection_name, dc_index)
 
 
 def item2dataset(engine_definition_file: str, collection_name: str,
-                 item_collection_definition: List, dc_index: datacube.index.index.Index = None, **kwargs) -> \
+                 item_collection_definition: List, dc_index: 'datacube.index.index.Index' = None, **kwargs) -> \
         Union[List[OrderedDict], OrderedDict]:
     """Function to convert a STAC Collection JSON to ODC Dataset YAML
 
@@ -62,43 +230,131 @@ def item2dataset(engine_definition_file: str, collection_name: str,
     is_verbose = kwargs.get('verbose')
     logger_message("start item2dataset operation", logger.info, is_verbose)
     engine = StacMapperEngine(engine_definition_file)
+    product_context = _load_run_product_context(engine, collection_name, dc_index, is_verbose)
 
-    odc_elements = []
     logger_message("mapping each STAC item in STAC Item Collection", logger.info, is_verbose)
-    for item_definition in item_collection_definition:
-        _odc_element = engine.map_item_to_dataset(item_definition)
-        _odc_element["product"] = OrderedDict({
-            "name": collection_name
-        })
-        _odc_element["id"] = str(uuid.uuid4())
-
-        # geometry is only mapped if 'crs' is defined in product
-        if 'geometry' in _odc_element:
-            del _odc_element['geometry']
-
-        if dc_index:
-            # get product definition
-            crs_definition = 'storage.crs'
-            product_definition = dc_index.products.get_by_name(collection_name).definition
-
-            if tree.is_path_valid_in_tree(product_definition, crs_definition):
-                _native_crs = tree.get_value_by_tree_path(product_definition, crs_definition)
-                _odc_element["crs"] = _native_crs
-
-                # try add geometry
-                # "geometry" name is defined in ODC-Dataset fields spec
-                geometry_path = engine.get_definition_by_name("dataset", "fromSTAC", "geometry")
-                stac_item_geometry = _create_geometry_object(geometry_path, item_definition, _native_crs)
-
-                if stac_item_geometry:
-                    def listit(t):
-                        # from: https://stackoverflow.com/questions/1014352/how-do-i-convert-a-nested-tuple-of-tuples-and-lists-to-lists-of-lists-in-python
-                        return list(map(listit, t)) if isinstance(t, (list, tuple)) else t
-
-                    # transform tuples into list to avoid errors in yaml read/write
-                    stac_item_geometry["coordinates"] = listit(stac_item_geometry["coordinates"])
-                    _odc_element["geometry"] = stac_item_geometry
-        else:
-            logger_message("There is no datacube_index definition. CRS will not be defined", logger.warning, is_verbose)
-        odc_elements.append(_odc_element)
-    return odc_elements
+    return _map_items_to_odc_datasets(engine, collection_name, item_collection_definition, product_context)
+
+
+# state of each process of the mapping process pool, created once by `_init_mapping_worker`
+_mapping_worker = {}
+
+
+def _init_mapping_worker(engine_definition_file: str, collection_name: str,
+                         product_context: Optional[ProductContext]) -> None:
+    """Initialize a process of the mapping process pool. The engine (and its user defined modules) is created
+    once per process and reused for all pages mapped by it"""
+    _mapping_worker['engine'] = StacMapperEngine(engine_definition_file)
+    _mapping_worker['collection_name'] = collection_name
+    _mapping_worker['product_context'] = product_context
+
+
+def _map_page_in_worker(item_definitions: List[Dict],
+                        dataset_ids: Optional[List[str]]) -> Tuple[List[OrderedDict], Dict, Dict]:
+    """Map a page of STAC Items in a process of the mapping process pool. The metrics and the user defined modules
+    statistics recorded while mapping the page (and creating the engine) are returned with the datasets, to be merged
+    in the main process"""
+    odc_datasets = _map_items_to_odc_datasets(_mapping_worker['engine'], _mapping_worker['collection_name'],
+                                              item_definitions, _mapping_worker['product_context'], dataset_ids)
+    return odc_datasets, take_stage_metrics(), take_user_defined_modules_cache_info()
+
+
+def _mapped_page_result(odc_datasets_future) -> List[OrderedDict]:
+    """Get the datasets mapped by a process of the mapping process pool, merging its metrics"""
+    odc_datasets, worker_metrics, worker_udf_stats = odc_datasets_future.result()
+
+    merge_stage_metrics(worker_metrics)
+    merge_user_defined_modules_cache_info(worker_udf_stats)
+    return odc_datasets
+
+
+def _map_pages_in_process_pool(engine_definition_file: str, collection_name: str,
+                               product_context: Optional[ProductContext], pages: Iterable[Tuple[int, List, List]],
+                               workers: int) -> Iterator[Tuple[int, List[OrderedDict], List[Dict]]]:
+    """Map pages of STAC Items in a process pool. Up to two pages per process are mapped concurrently, but pages
+    are always delivered in order
+
+    Args:
+        engine_definition_file (str): File with definitions of mapping rules
+        collection_name (str): Name of collection
+        product_context (ProductContext): Product information created with `load_product_context`
+        pages (Iterable[tuple]): Page number, STAC Items and ODC Dataset ids (or None) of each page
+        workers (int): Number of processes
+    Returns:
+        Iterator[tuple]: Page number, ODC Datasets and STAC Items of each page
+    """
+    # processes are spawned, not forked: a fork made while another thread (e.g. the pages prefetch) holds a lock
+    # (metrics, logging) would leave the lock held forever in the child process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_mapping_worker,
+                             initargs=(engine_definition_file, collection_name, product_context)) as executor:
+        pages_in_flight = deque()
+
+        try:
+            for page_number, item_definitions, dataset_ids in pages:
+                pages_in_flight.append((page_number, item_definitions,
+                                        executor.submit(_map_page_in_worker, item_definitions, dataset_ids)))
+
+                if len(pages_in_flight) >= workers * 2:
+                    page_number, item_definitions, odc_datasets = pages_in_flight.popleft()
+                    yield page_number, _mapped_page_result(odc_datasets), item_definitions
+
+            while pages_in_flight:
+                page_number, item_definitions, odc_datasets = pages_in_flight.popleft()
+                yield page_number, _mapped_page_result(odc_datasets), item_definitions
+        finally:
+            for _, _, odc_datasets in pages_in_flight:
+                odc_datasets.cancel()
+
+
+def item2dataset_stream(engine_definition_file: str, collection_name: str, pages: Iterable[Page],
+                        dc_index: 'datacube.index.index.Index' = None, **kwargs) -> Iterator[Page]:
+    """Function to convert pages of STAC Items to pages of ODC Datasets as they arrive. Unlike `item2dataset`,
+    only the pages being mapped are held in memory.
+
+    Args:
+        engine_definition_file (str): File with definitions of mapping rules
+        collection_name (str): Name of collection
+        pages (Iterable[Page]): Pages of features collected from STAC services
+        dc_index (str): Instance of datacube_index. If not defined, some properties will not be defined in
+        ODC dataset definition (e. g. CRS)
+    Keyword Args:
+        skip_indexed (bool): Skip the items whose dataset is already in `dc_index`, before mapping them
+        workers (int): Number of processes used to map pages. With 1 (default), pages are mapped in this process
+    Returns:
+        Iterator[Page]: Pages of ODC Datasets, with the same numbers of the STAC pages
+    """
+
+    is_verbose = kwargs.get('verbose')
+    skip_indexed = kwargs.get('skip_indexed') and dc_index
+    workers = kwargs.get('workers') or 1
+
+    logger_message("start item2dataset operation", logger.info, is_verbose)
+    engine = StacMapperEngine(engine_definition_file)
+    product_context = _load_run_product_context(engine, collection_name, dc_index, is_verbose)
+
+    def _pages_to_map():
+        for page in pages:
+            item_definitions, dataset_ids = page.items, None
+
+            if skip_indexed:
+                item_definitions, dataset_ids = _skip_indexed_items(engine, collection_name, page.items, dc_index)
+                logger_message(f"{len(page.items) - len(item_definitions)} items of page {page.number} "
+                               f"already indexed", logger.info, is_verbose)
+
+            logger_message(f"mapping STAC items of page {page.number}", logger.info, is_verbose)
+            yield page.number, item_definitions, dataset_ids
+
+    if workers > 1:
+        odc_pages = _map_pages_in_process_pool(engine_definition_file, collection_name, product_context,
+                                               _pages_to_map(), workers)
+    else:
+        odc_pages = (
+            (page_number,
+             _map_items_to_odc_datasets(engine, collection_name, item_definitions, product_context, dataset_ids),
+             item_definitions)
+            for page_number, item_definitions, dataset_ids in _pages_to_map()
+        )
+
+    for page_number, odc_datasets, item_definitions in odc_pages:
+        yield Page(page_number, odc_datasets, [item_definition['id'] for item_definition in item_definitions])
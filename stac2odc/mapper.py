@@ -6,32 +6,56 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 
+import os
+import threading
+import time
+import uuid
 from collections import OrderedDict
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Callable, NamedTuple
 
 import stac2odc.tree as tree
-from stac2odc.exception import ODCInvalidType, EngineInvalidDefinitionKey
-from stac2odc.operation import apply_custom_map_function
+from stac2odc.exception import ODCInvalidType, EngineInvalidDefinitionKey, GridProbeError
+from stac2odc.grid import GridProbe
+from stac2odc.metrics import timed_stage
+from stac2odc.operation import load_user_defined_function, apply_user_defined_function
 from stac2odc.toolbox import load_custom_configuration_file
 
+MappingRule = Callable[[dict, tree.TreeBuilder], None]
+MappingPreparer = Callable[[List[dict]], None]
 
-def _apply_custom_mapping(stac_values: Union[List, Dict], custom_mapping: dict) -> object:
-    """Function to map custom definitions in mapping function. With this functions is possible use STAC
-        definition in arbitrary fields
+# namespace of the UUIDv5 used as ODC Dataset ids, when it is not defined in the engine
+DEFAULT_DATASET_ID_NAMESPACE = uuid.NAMESPACE_URL
+
+# max time (in seconds) a user defined function is used without checking if its file changed, in elements mapped
+# without `StacMapperEngine.prepare_items`
+USER_DEFINED_FUNCTION_CHECK_INTERVAL = 1.0
+
+
+def _compile_custom_mapping(custom_mapping: dict) -> Callable[[Union[List, Dict]], object]:
+    """Compile a custom mapping definition. The definition is interpreted only once and the returned function
+    can be applied to any number of STAC values.
     Args:
-        stac_values (list): List of STAC Items
         custom_mapping (dict): Dict with custom mapping, where key is used in ODC's definition and values is
         recovered from STAC elements
     Returns:
+        function: Function that receives the STAC values (list or dict) and returns them mapped
     """
+    custom_mapping = custom_mapping.copy()
+
+    # check if will be need exclude values
+    values_to_exclude = set(custom_mapping.pop('exclude', None) or [])
+
+    mapping_in_a_list = list(custom_mapping.items())
+    # in dicts, the first node of the custom key is the ODC property itself (e.g. measurements.$key.path)
+    mapping_in_a_dict = [
+        (custom_key_mapping.split(".")[1:], "$key" in custom_key_mapping, stac_key)
+        for custom_key_mapping, stac_key in custom_mapping.items()
+    ]
 
-    def apply_custom_mapping_in_a_list(stac_values: list, custom_mapping: dict):
+    def apply_custom_mapping_in_a_list(stac_values: list):
         """Apply custom mapping function in a list of elements
         Args:
             stac_values (list): List of STAC Items
-            custom_mapping (dict): Dict with custom mapping, where key is used in ODC's definition and values is
-            recovered from STAC elements
-
         Returns:
             list: List with STAC Items mapped
         """
@@ -39,51 +63,297 @@ def _apply_custom_mapping(stac_values: Union[List, Dict], custom_mapping: dict)
         for _stac_value in stac_values:
             _stac_value_to_map = OrderedDict()
 
-            for custom_key_mapping in custom_mapping:
-                _stac_value_to_map[custom_key_mapping] = _stac_value.get(
-                    custom_mapping.get(custom_key_mapping)
-                )
+            for custom_key_mapping, stac_key in mapping_in_a_list:
+                _stac_value_to_map[custom_key_mapping] = _stac_value.get(stac_key)
             stac_values_with_custom_fields.append(_stac_value_to_map)
         return stac_values_with_custom_fields
 
-    def apply_custom_mapping_in_a_dict(stac_values: dict, custom_mapping: dict):
-        def replace_by_key(text, to, src="$key") -> str:
-            return text.replace(src, to)
+    def apply_custom_mapping_in_a_dict(stac_values: dict):
+        stac_values_with_custom_fields = tree.TreeBuilder()
+        for stac_value_key, _stac_value in stac_values.items():
+            if stac_value_key in values_to_exclude:
+                continue
 
-        custom_mapping = custom_mapping.copy()
+            for tree_path, has_key_reference, stac_key in mapping_in_a_dict:
+                if has_key_reference:
+                    tree_path = [tree_node.replace("$key", stac_value_key) for tree_node in tree_path]
+                stac_values_with_custom_fields.add(tree_path, _stac_value.get(stac_key))
+        return stac_values_with_custom_fields.element
 
-        # check if will be need exclude values
-        values_to_exclude = []
-        if custom_mapping.get('exclude'):
-            values_to_exclude = custom_mapping.get('exclude')
-            del custom_mapping['exclude']
+    def apply_custom_mapping(stac_values: Union[List, Dict]):
+        if isinstance(stac_values, list):
+            return apply_custom_mapping_in_a_list(stac_values)
+        return apply_custom_mapping_in_a_dict(stac_values)
+    return apply_custom_mapping
 
-        stac_values_with_custom_fields = OrderedDict()
-        for stac_value_key in stac_values:
-            if values_to_exclude and stac_value_key in values_to_exclude:
-                continue
 
-            _stac_value = stac_values.get(stac_value_key)
-            for custom_key_mapping in custom_mapping:
-                tree_path = ".".join(replace_by_key(custom_key_mapping, stac_value_key).split(".")[1:])
-                tree.add_value_by_tree_path(stac_values_with_custom_fields, tree_path, _stac_value.get(
-                    custom_mapping.get(custom_key_mapping)
-                ))
-        return stac_values_with_custom_fields
+def _apply_custom_mapping(stac_values: Union[List, Dict], custom_mapping: dict) -> object:
+    """Function to map custom definitions in mapping function. With this functions is possible use STAC
+        definition in arbitrary fields
+    Args:
+        stac_values (list): List of STAC Items
+        custom_mapping (dict): Dict with custom mapping, where key is used in ODC's definition and values is
+        recovered from STAC elements
+    Returns:
+    """
+    return _compile_custom_mapping(custom_mapping)(stac_values)
+
+
+def _compile_from_stac_rule(odc_property: str, property_definition: Union[str, Dict]) -> MappingRule:
+    """Compile a `fromSTAC` rule. Tree paths are splitted only once.
+    Args:
+        odc_property (str): ODC property (tree path) where the value is inserted
+        property_definition (str or dict): STAC tree path or dict with `from` and `customMapping` or
+        `customMapFunction`
+    Returns:
+        function: Rule that receives the STAC element and the ODC element builder (changed in-place)
+    """
+    odc_tree_path = odc_property.split('.')
+
+    if isinstance(property_definition, str):
+        stac_tree_path = property_definition.split('.')
+
+        def rule(stac_element: dict, odc_tree: tree.TreeBuilder):
+            odc_tree.add(odc_tree_path, tree.get_value_by_tree_path(stac_element, stac_tree_path))
+        return rule
+
+    property_is_from = property_definition.get('from')
+    stac_tree_path = property_is_from.split('.')
+
+    if 'customMapping' in property_definition:
+        custom_mapping = _compile_custom_mapping(property_definition.get('customMapping'))
+
+        def rule(stac_element: dict, odc_tree: tree.TreeBuilder):
+            stac_value = tree.get_value_by_tree_path(stac_element, stac_tree_path)
+            odc_tree.add(odc_tree_path, custom_mapping(stac_value))
+        return rule
+
+    if 'gridProbe' in property_definition:
+        return _compile_grid_probe_rule(odc_tree_path, stac_tree_path, property_definition.get('gridProbe'))
+
+    if 'customMapFunction' in property_definition:
+        return _compile_custom_map_function_rule(odc_tree_path, stac_tree_path, property_is_from,
+                                                 property_definition.get('customMapFunction'))
+
+    raise EngineInvalidDefinitionKey(
+        f"Invalid definition for {odc_property}! Use customMapping, customMapFunction or gridProbe"
+    )
+
+
+def _compile_custom_map_function_rule(odc_tree_path: List[str], stac_tree_path: List[str], property_is_from: str,
+                                     function_definition: dict) -> MappingRule:
+    """Compile a `customMapFunction` rule. The user defined function is resolved once per page of STAC Items (see
+    `StacMapperEngine.prepare_items`) and not in each item. Elements mapped without preparing them check the
+    function file at most once every `USER_DEFINED_FUNCTION_CHECK_INTERVAL` seconds
+    Args:
+        odc_tree_path (list): ODC property (tree path) where the value is inserted
+        stac_tree_path (list): STAC tree path of the value passed to the function
+        property_is_from (str): STAC property (used in errors)
+        function_definition (dict): Dict with the function name (key functionName) and module file (key functionFile)
+    Returns:
+        function: Rule that receives the STAC element and the ODC element builder (changed in-place). The rule has the
+        attribute `prepare`, that resolves the function for many STAC elements at once
+    """
+    # time when the function was resolved and the function itself
+    resolved_function = [(None, None)]
+
+    def resolve_function():
+        # user defined modules are cached, so the file is executed again only if it changes
+        user_defined_function = load_user_defined_function(function_definition['functionName'],
+                                                           function_definition['functionFile'])
+        resolved_function[0] = (time.monotonic(), user_defined_function)
+        return user_defined_function
+
+    def prepare(stac_elements: List[dict]):
+        resolve_function()
+
+    def rule(stac_element: dict, odc_tree: tree.TreeBuilder):
+        resolved_at, user_defined_function = resolved_function[0]
+        if user_defined_function is None or time.monotonic() - resolved_at > USER_DEFINED_FUNCTION_CHECK_INTERVAL:
+            user_defined_function = resolve_function()
+
+        stac_value = tree.get_value_by_tree_path(stac_element, stac_tree_path)
+        stac_value = apply_user_defined_function(property_is_from, stac_value, user_defined_function)
+        odc_tree.add(odc_tree_path, stac_value)
+    rule.prepare = prepare
+    return rule
+
+
+def _compile_grid_probe_rule(odc_tree_path: List[str], stac_tree_path: List[str],
+                             grid_probe_definition: dict) -> MappingRule:
+    """Compile a `gridProbe` rule, which creates the ODC grids from the header of a raster asset. Headers are read
+    concurrently for a whole page of STAC Items (see `StacMapperEngine.prepare_items`) and cached by tile, if `tileKey`
+    is defined, or by asset href
+    Args:
+        odc_tree_path (list): ODC property (tree path) where the grids are inserted
+        stac_tree_path (list): STAC tree path of the assets
+        grid_probe_definition (dict): Dict with `band` (asset used to read the grid) and, optionally, `tileKey` (STAC
+        tree path of the item tile), `cacheFile` (JSON file where the grids are cached) and `workers`
+    Returns:
+        function: Rule that receives the STAC element and the ODC element builder (changed in-place). The rule has the
+        attribute `prepare`, that probes the grids of many STAC elements at once
+    """
+    band = grid_probe_definition.get('band')
+    if not band:
+        raise EngineInvalidDefinitionKey("Invalid gridProbe definition! The band is required")
+
+    tile_tree_path = tree.split_tree_path(grid_probe_definition['tileKey']) \
+        if grid_probe_definition.get('tileKey') else None
+    grid_probe = GridProbe(grid_probe_definition.get('cacheFile'), grid_probe_definition.get('workers', 8))
+
+    def raster_to_probe(stac_element: dict):
+        assets = tree.get_value_by_tree_path(stac_element, stac_tree_path)
+        if band not in assets:
+            raise GridProbeError(f"Asset {band} not found in STAC Item {stac_element.get('id')}")
+
+        grid_key = None
+        if tile_tree_path and tree.is_path_valid_in_tree(stac_element, tile_tree_path):
+            tile = tree.get_value_by_tree_path(stac_element, tile_tree_path)
+            tile = "-".join(map(str, tile)) if isinstance(tile, list) else tile
+            grid_key = f"tile:{stac_element.get('collection')}:{band}:{tile}"
+        return assets[band]['href'], grid_key
+
+    def prepare(stac_elements: List[dict]):
+        grid_probe.probe([raster_to_probe(stac_element) for stac_element in stac_elements])
+
+    def rule(stac_element: dict, odc_tree: tree.TreeBuilder):
+        grid = grid_probe.get_grid(*raster_to_probe(stac_element))
+        odc_tree.add(odc_tree_path, OrderedDict({
+            "default": OrderedDict({
+                "shape": grid["shape"],
+                "transform": grid["transform"]
+            })
+        }))
+    rule.prepare = prepare
+    return rule
+
+
+def _compile_constant_template(from_constant_definitions: dict) -> OrderedDict:
+    """Compile the `fromConstant` definitions in a template, the tree with all constants, merged into each mapped
+    element (see `TreeBuilder.merge`). Constants in paths of lists (e.g. measurements.units) are added to each member
+    of the list
+    Args:
+        from_constant_definitions (dict): ODC properties (tree paths) and constant values
+    Returns:
+        OrderedDict: Template
+    """
+    constant_template = tree.TreeBuilder()
+
+    for odc_property, value in from_constant_definitions.items():
+        constant_template.add(odc_property.split("."), value)
+    return constant_template.element
+
+
+def _compile_from_file_rule(odc_property: str, file_definition: dict) -> Callable[[tree.TreeBuilder], None]:
+    """Compile a `fromFile` rule. The file is parsed once and parsed again only if it is changed (mtime). Each
+    element receives a copy of the content, so changes in one element do not affect the others
+    Args:
+        odc_property (str): ODC property (tree path) where the file content is inserted
+        file_definition (dict): Dict with the file path (key file)
+    Returns:
+        function: Rule that receives the ODC element builder (changed in-place)
+    """
+    tree_path = odc_property.split(".")
+    file_path = file_definition.get('file')
+
+    # mtime and content of the file: [mtime, content]
+    file_content = [None, None]
+    file_content_lock = threading.Lock()
+
+    def load_file_content():
+        file_mtime = os.stat(file_path).st_mtime_ns
+
+        with file_content_lock:
+            if file_content[0] != file_mtime:
+                with timed_stage('from_file_load'):
+                    file_content[:] = [file_mtime, load_custom_configuration_file(file_path)]
+            return file_content[1]
+
+    def rule(odc_tree: tree.TreeBuilder):
+        with timed_stage('from_file'):
+            odc_tree.add(tree_path, tree.copy_tree(load_file_content()))
+    return rule
+
+
+def _compile_dataset_id(dataset_id_definition: dict) -> Callable[[dict, str], str]:
+    """Compile the `datasetId` definition of the engine, which defines how ODC Dataset ids are created.
+
+    By default, ids are UUIDv5 created from the product name and the STAC Item id, so the same item always
+    has the same id in a product. The definition accepts the keys `type` (uuid5 or uuid4), `namespace` (UUID
+    used as namespace in uuid5) and `from` (tree path of the STAC Item value used in uuid5)
+    Args:
+        dataset_id_definition (dict): `datasetId` definition
+    Returns:
+        function: Function that receives the STAC Item and the product name and returns the dataset id
+    """
+    id_type = dataset_id_definition.get('type', 'uuid5')
+
+    if id_type == 'uuid4':
+        return lambda stac_item, collection_name: str(uuid.uuid4())
+
+    if id_type != 'uuid5':
+        raise EngineInvalidDefinitionKey(f"Invalid datasetId type {id_type}! Use uuid5 or uuid4")
+
+    id_namespace = uuid.UUID(dataset_id_definition.get('namespace', str(DEFAULT_DATASET_ID_NAMESPACE)))
+    id_tree_path = dataset_id_definition.get('from', 'id').split('.')
 
-    _fnc = apply_custom_mapping_in_a_dict
-    if isinstance(stac_values, list):
-        _fnc = apply_custom_mapping_in_a_list
-    return _fnc(stac_values, custom_mapping)
+    def create_dataset_id(stac_item: dict, collection_name: str) -> str:
+        stac_item_id = tree.get_value_by_tree_path(stac_item, id_tree_path)
+        return str(uuid.uuid5(id_namespace, f"{collection_name}/{stac_item_id}"))
+    return create_dataset_id
+
+
+class _MappingPlan(NamedTuple):
+    """Rules of an ODC element type compiled from the engine definition"""
+    from_stac: List[MappingRule]
+    from_constant: OrderedDict
+    from_file: List[Callable[[tree.TreeBuilder], None]]
+    preparers: List[MappingPreparer]
+
+
+def _compile_mapping_plan(element_mapper: dict) -> _MappingPlan:
+    """Compile the engine definition of an ODC element type (e.g. product or dataset) in a mapping plan
+    Args:
+        element_mapper (dict): Engine definition of ODC element type
+    Returns:
+        _MappingPlan: Compiled rules
+    """
+    from_stac_definitions = element_mapper.get('fromSTAC') or {}
+    from_constant_definitions = element_mapper.get('fromConstant') or {}
+    from_file_definitions = element_mapper.get('fromFile') or {}
+
+    from_stac_rules = [
+        _compile_from_stac_rule(odc_property, from_stac_definitions.get(odc_property))
+        for odc_property in from_stac_definitions
+    ]
+
+    return _MappingPlan(
+        from_stac=from_stac_rules,
+        from_constant=_compile_constant_template(from_constant_definitions),
+        from_file=[
+            _compile_from_file_rule(odc_property, from_file_definitions.get(odc_property))
+            for odc_property in from_file_definitions
+        ],
+        preparers=[rule.prepare for rule in from_stac_rules if hasattr(rule, 'prepare')]
+    )
 
 
 class StacMapperEngine:
     def __init__(self, engine_definition_file=None):
-        """StacMapperEngine is a core of stac2odc tool. An engine is able to map the STAC definition to ODC definition
+        """StacMapperEngine is a core of stac2odc tool. An engine is able to map the STAC definition to ODC definition.
+        The mapping rules are compiled once, when the engine is created, and reused for each mapped element.
         Args:
             engine_definition_file (str): File with StacMapperEngine definition
         """
         self._engine_definition = load_custom_configuration_file(engine_definition_file)
+        self._mapping_plans = {
+            odc_element_type: _compile_mapping_plan(element_mapper)
+            for odc_element_type, element_mapper in self._engine_definition.items()
+            if isinstance(element_mapper, dict) and element_mapper
+        }
+        self._create_dataset_id = _compile_dataset_id(
+            (self._engine_definition.get('dataset') or {}).get('datasetId') or {}
+        )
 
     def _map_stac_element_to_odc_element(self, stac_element: dict, odc_element_type: str):
         """General function to map STAC Element to ODC Element based on StacMapper's rules
@@ -94,74 +364,34 @@ class StacMapperEngine:
             OrderedDict: ODC Product created using STAC Collection definitions
         """
 
-        if not self._engine_definition.get(odc_element_type, None):
+        mapping_plan = self._mapping_plans.get(odc_element_type)
+        if not mapping_plan:
             raise ODCInvalidType(f"ODC Type {odc_element_type} is not avaliable")
 
-        odc_product_definition = OrderedDict()
-        element_mapper = self._engine_definition.get(odc_element_type)
-        product_definition = element_mapper.get('fromSTAC')
-
-        for product_property in product_definition:
-            property_definition = product_definition.get(product_property)
-
-            if 'customMapping' in property_definition:
-                stac_value = tree.get_value_by_tree_path(stac_element, property_definition.get('from'))
-                stac_value = _apply_custom_mapping(stac_value, property_definition.get('customMapping'))
-            elif 'customMapFunction' in property_definition:
-                property_is_from = property_definition.get('from')
-
-                stac_value = tree.get_value_by_tree_path(stac_element, property_is_from)
-                stac_value = apply_custom_map_function(property_is_from, stac_value,
-                                                       property_definition.get('customMapFunction'))
-            else:  # normal code
-                stac_value = tree.get_value_by_tree_path(stac_element, product_definition.get(product_property))
-            tree.add_value_by_tree_path(odc_product_definition, product_property, stac_value)
+        # the same builder is used by all rules, so list nodes (e.g. measurements) are indexed only once
+        odc_product_definition = tree.TreeBuilder()
+        for rule in mapping_plan.from_stac:
+            rule(stac_element, odc_product_definition)
         return self._add_custom_fields_to_odc_element(odc_product_definition, odc_element_type)
 
-    def _add_custom_fields_to_odc_element(self, odc_element: OrderedDict, odc_element_type: str) -> OrderedDict:
+    def _add_custom_fields_to_odc_element(self, odc_element: tree.TreeBuilder, odc_element_type: str) -> OrderedDict:
         """Add custom fields into ODC Elements (Products or Datasets) in arbitrary tree paths
         Args:
-            odc_element (OrderedDict): Element where value is inserted (in-place)
+            odc_element (TreeBuilder): Builder of the element where value is inserted (in-place)
             odc_element_type (str): Name of odc element where values is inserted. It has to be the same value defined
             in custom_fields_obj
         Returns:
             OrderedDict: ODC Element with custom fields inserted
         """
-        mapper = self._engine_definition.get(odc_element_type)
-
-        from_file_definitions = mapper.get('fromFile', None)
-        from_constant_definitions = mapper.get('fromConstant', None)
-
-        # adding constants definitions
-        if from_constant_definitions:
-            for constant_product_definition in from_constant_definitions:
-                tree_path = constant_product_definition.split(".")
-                _value = from_constant_definitions.get(constant_product_definition)
-                if len(tree_path) > 1:  # check if tree_path go to a list of elements
-                    _odc_prod_def = odc_element.copy()
-
-                    # check if first key exists. if don't exists, add full path
-                    if tree_path[0] not in _odc_prod_def.keys():
-                        tree.add_value_by_tree_path(odc_element, ".".join(tree_path), _value)
-                    else:
-                        for tp in tree_path[:-1]:
-                            _odc_prod_def = _odc_prod_def.get(tp)
-
-                            if isinstance(_odc_prod_def, list):
-                                for el in _odc_prod_def:
-                                    key = list(el.keys())[0]
-                                    tree.add_value_by_tree_path(odc_element, ".".join([tp, el.get(key), tree_path[-1]]),
-                                                                _value)
-                else:
-                    tree.add_value_by_tree_path(odc_element, constant_product_definition, _value)
-        if from_file_definitions:
-            for odc_element_property in from_file_definitions:
-                value = load_custom_configuration_file(
-                    from_file_definitions.get(odc_element_property).get('file')
-                )
-                tree.add_value_by_tree_path(odc_element, odc_element_property, value)
-
-        return odc_element
+        mapping_plan = self._mapping_plans.get(odc_element_type)
+
+        # adding constants definitions. The constants tree is compiled once and merged into each element
+        odc_element.merge(mapping_plan.from_constant)
+
+        for rule in mapping_plan.from_file:
+            rule(odc_element)
+
+        return odc_element.element
 
     def get_definition_by_name(self, odc_type: str, source: str, definition_name: str) -> Union[Dict, str, List]:
         """Get an arbitrary definition in Stac Engine Mapper.
@@ -180,6 +410,17 @@ class StacMapperEngine:
                 return tree.get_value_by_tree_path(_element, definition_name)
         raise EngineInvalidDefinitionKey("Get inserted is not valid for this engine definition!")
 
+    def create_dataset_id(self, stac_item: dict, collection_name: str) -> str:
+        """Create the ODC Dataset id of a STAC Item, as defined in the engine (`datasetId`)
+        Args:
+            stac_item (dict): STAC Item properties
+            collection_name (str): Name of the product in ODC
+        Returns:
+            str: Dataset id
+        """
+
+        return self._create_dataset_id(stac_item, collection_name)
+
     def map_collection_to_product(self, stac_collection: dict):
         """
         Args:
@@ -191,6 +432,21 @@ class StacMapperEngine:
 
         return self._map_stac_element_to_odc_element(stac_collection, "product")
 
+    def prepare_items(self, stac_items: List[dict]) -> None:
+        """Prepare the mapping of many STAC Items to ODC Datasets at once (e.g. reading the grids of a page of items
+        concurrently and resolving the user defined functions). Mapping items without preparing them gives the same
+        result, but slower
+        Args:
+            stac_items (list): STAC Items properties
+        """
+
+        mapping_plan = self._mapping_plans.get("dataset")
+        if not mapping_plan:
+            return
+
+        for preparer in mapping_plan.preparers:
+            preparer(stac_items)
+
     def map_item_to_dataset(self, stac_item: dict):
         """
         Args:
@@ -0,0 +1,234 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# max number of latencies kept per stage to compute the percentiles (reservoir sampling)
+STAGE_SAMPLES_SIZE = 10000
+
+METRICS_FORMATS = ['json', 'prometheus']
+
+PERCENTILES = [50, 90, 99]
+
+
+class StageMetrics:
+    def __init__(self):
+        """Metrics of a pipeline stage: number of calls, elements and bytes processed and latencies"""
+        self.calls = 0
+        self.items = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples = []
+
+    def add(self, seconds: float, items: int, nbytes: int, rng: random.Random) -> None:
+        self.calls += 1
+        self.items += items
+        self.bytes += nbytes
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+        if len(self.samples) < STAGE_SAMPLES_SIZE:
+            self.samples.append(seconds)
+        else:
+            sample_index = rng.randrange(self.calls)
+            if sample_index < STAGE_SAMPLES_SIZE:
+                self.samples[sample_index] = seconds
+
+    def merge(self, other: 'StageMetrics', rng: random.Random) -> None:
+        self.calls += other.calls
+        self.items += other.items
+        self.bytes += other.bytes
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+
+        self.samples.extend(other.samples)
+        if len(self.samples) > STAGE_SAMPLES_SIZE:
+            self.samples = rng.sample(self.samples, STAGE_SAMPLES_SIZE)
+
+    def percentile(self, percentile: float) -> float:
+        if not self.samples:
+            return 0.0
+
+        samples = sorted(self.samples)
+        return samples[min(int(len(samples) * percentile / 100), len(samples) - 1)]
+
+    def to_dict(self) -> OrderedDict:
+        return OrderedDict([
+            ("calls", self.calls),
+            ("items", self.items),
+            ("bytes", self.bytes),
+            ("seconds", self.seconds),
+            ("items_per_second", self.items / self.seconds if self.seconds else 0.0),
+            ("mean_seconds", self.seconds / self.calls if self.calls else 0.0),
+            *[(f"p{percentile}_seconds", self.percentile(percentile)) for percentile in PERCENTILES],
+            ("max_seconds", self.max_seconds)
+        ])
+
+
+_stages: Dict[str, StageMetrics] = OrderedDict()
+_stages_lock = threading.Lock()
+_stages_random = random.Random(0)
+
+
+class _StageTimer:
+    def __init__(self, items: int, nbytes: int):
+        self.items = items
+        self.bytes = nbytes
+
+
+def record_stage(stage: str, seconds: float, items: int = 1, nbytes: int = 0) -> None:
+    """Record a call of a pipeline stage
+
+    Args:
+        stage (str): Stage name (e.g. stac_search, map, index)
+        seconds (float): Elapsed time of the call
+        items (int): Number of elements processed in the call
+        nbytes (int): Number of bytes read or written in the call
+    """
+    with _stages_lock:
+        if stage not in _stages:
+            _stages[stage] = StageMetrics()
+        _stages[stage].add(seconds, items, nbytes, _stages_random)
+
+
+@contextmanager
+def timed_stage(stage: str, items: int = 1, nbytes: int = 0) -> Iterator[_StageTimer]:
+    """Record the elapsed time of a block as a call of a pipeline stage. Items and bytes can be changed in the block,
+    when they are known only after the processing (e.g. `with timed_stage('write') as timer: timer.bytes = ...`)
+
+    Args:
+        stage (str): Stage name
+        items (int): Number of elements processed in the block
+        nbytes (int): Number of bytes read or written in the block
+    """
+    timer = _StageTimer(items, nbytes)
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        record_stage(stage, time.perf_counter() - start, timer.items, timer.bytes)
+
+
+def take_stage_metrics() -> Dict[str, StageMetrics]:
+    """Get the metrics recorded so far and reset them. Used to send the metrics of worker processes to the main
+    process (see `merge_stage_metrics`)
+
+    Returns:
+        Dict[str, StageMetrics]: Metrics of each stage
+    """
+    global _stages
+
+    with _stages_lock:
+        stages, _stages = _stages, OrderedDict()
+    return stages
+
+
+def merge_stage_metrics(stages: Dict[str, StageMetrics]) -> None:
+    """Add metrics recorded in another process
+
+    Args:
+        stages (Dict[str, StageMetrics]): Metrics of each stage, created with `take_stage_metrics`
+    """
+    with _stages_lock:
+        for stage, stage_metrics in stages.items():
+            if stage not in _stages:
+                _stages[stage] = StageMetrics()
+            _stages[stage].merge(stage_metrics, _stages_random)
+
+
+def stage_metrics() -> OrderedDict:
+    """Metrics of each stage recorded so far
+
+    Returns:
+        OrderedDict: Stage name and metrics (calls, items, bytes, total, mean, percentiles and max latencies)
+    """
+    with _stages_lock:
+        return OrderedDict((stage, stage_metrics.to_dict()) for stage, stage_metrics in _stages.items())
+
+
+def metrics_summary() -> str:
+    """Summary of the metrics of each stage, formatted as a table
+
+    Returns:
+        str: Summary
+    """
+    lines = [
+        f"{'stage':<20}{'calls':>10}{'items':>10}{'bytes':>14}{'total (s)':>12}{'items/s':>12}"
+        f"{'p50 (ms)':>10}{'p90 (ms)':>10}{'p99 (ms)':>10}"
+    ]
+    for stage, metrics in stage_metrics().items():
+        lines.append(
+            f"{stage:<20}{metrics['calls']:>10}{metrics['items']:>10}{metrics['bytes']:>14}{metrics['seconds']:>12.3f}"
+            f"{metrics['items_per_second']:>12.1f}{metrics['p50_seconds'] * 1e3:>10.2f}"
+            f"{metrics['p90_seconds'] * 1e3:>10.2f}{metrics['p99_seconds'] * 1e3:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def _metrics_to_prometheus(stages: OrderedDict, counters: dict) -> str:
+    lines = []
+
+    stage_series = [
+        ("calls", "stac2odc_stage_calls_total", "counter", "Number of calls of the stage"),
+        ("items", "stac2odc_stage_items_total", "counter", "Number of elements processed by the stage"),
+        ("bytes", "stac2odc_stage_bytes_total", "counter", "Number of bytes read or written by the stage"),
+        ("seconds", "stac2odc_stage_seconds_total", "counter", "Time spent in the stage")
+    ]
+    for key, name, metric_type, description in stage_series:
+        lines.extend([f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"])
+        lines.extend(f'{name}{{stage="{stage}"}} {metrics[key]}' for stage, metrics in stages.items())
+
+    lines.extend(["# HELP stac2odc_stage_latency_seconds Latency of the calls of the stage",
+                  "# TYPE stac2odc_stage_latency_seconds summary"])
+    for stage, metrics in stages.items():
+        for percentile in PERCENTILES:
+            lines.append(f'stac2odc_stage_latency_seconds{{stage="{stage}",quantile="{percentile / 100}"}} '
+                         f'{metrics[f"p{percentile}_seconds"]}')
+        lines.append(f'stac2odc_stage_latency_seconds_sum{{stage="{stage}"}} {metrics["seconds"]}')
+        lines.append(f'stac2odc_stage_latency_seconds_count{{stage="{stage}"}} {metrics["calls"]}')
+
+    for counter, value in counters.items():
+        lines.extend([f"# TYPE stac2odc_{counter}_total counter", f"stac2odc_{counter}_total {value}"])
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(metrics_file: str, metrics_format: str = 'json', counters: dict = None) -> None:
+    """Write the metrics of each stage in a file. The file is replaced atomically, so it can be read by other
+    processes (e.g. the textfile collector of Prometheus node exporter) at any time
+
+    Args:
+        metrics_file (str): Output file
+        metrics_format (str): One of `METRICS_FORMATS`
+        counters (dict): Additional counters written with the stages metrics (e.g. user defined modules loads)
+    """
+    stages = stage_metrics()
+    counters = counters or {}
+
+    if metrics_format == 'json':
+        content = json.dumps({"stages": stages, "counters": counters}, indent=2)
+    elif metrics_format == 'prometheus':
+        content = _metrics_to_prometheus(stages, counters)
+    else:
+        raise ValueError(f"Invalid metrics format {metrics_format}! Use one of {', '.join(METRICS_FORMATS)}")
+
+    metrics_dir = os.path.dirname(metrics_file)
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+
+    metrics_tmp_file = metrics_file + '.tmp'
+    with open(metrics_tmp_file, 'w') as mfile:
+        mfile.write(content)
+    os.replace(metrics_tmp_file, metrics_file)
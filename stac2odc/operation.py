@@ -6,10 +6,50 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 
+import os
+import threading
 from collections import OrderedDict
 from typing import List, Union
 
 from stac2odc.exception import InvalidReturnedTypeFromUserDefinedFunction
+from stac2odc.metrics import timed_stage
+
+# user defined modules loaded in this process, by absolute path: {path: (mtime, module)}
+_user_defined_modules = {}
+_user_defined_modules_stats = {'loads': 0, 'hits': 0}
+_user_defined_modules_lock = threading.Lock()
+
+
+def load_user_defined_module(module_file: str):
+    """Function to load arbitrary modules. Each module file is executed only once per process and is
+    executed again only if the file is changed (mtime)
+
+    Args:
+        module_file (str): file module
+    Returns:
+        module loaded from file
+    """
+
+    import types
+    import importlib.machinery
+
+    module_path = os.path.abspath(module_file)
+    module_mtime = os.stat(module_path).st_mtime_ns
+
+    with _user_defined_modules_lock:
+        cached_module = _user_defined_modules.get(module_path)
+
+        if cached_module and cached_module[0] == module_mtime:
+            _user_defined_modules_stats['hits'] += 1
+            return cached_module[1]
+
+        loader = importlib.machinery.SourceFileLoader('user_defined_module', module_path)
+        module = types.ModuleType(loader.name)
+        loader.exec_module(module)
+
+        _user_defined_modules_stats['loads'] += 1
+        _user_defined_modules[module_path] = (module_mtime, module)
+    return module
 
 
 def load_user_defined_function(function_name: str, module_file: str):
@@ -22,32 +62,60 @@ def load_user_defined_function(function_name: str, module_file: str):
         function loaded from file
     """
 
-    import types
-    import importlib.machinery
+    return getattr(load_user_defined_module(module_file), function_name)
 
-    loader = importlib.machinery.SourceFileLoader('user_defined_module', module_file)
-    module = types.ModuleType(loader.name)
-    loader.exec_module(module)
 
-    return getattr(module, function_name)
+def user_defined_modules_cache_info() -> dict:
+    """Statistics of the user defined modules cache
 
+    Returns:
+        dict: Number of module executions (key loads) and of reuses of an already loaded module (key hits)
+    """
+
+    with _user_defined_modules_lock:
+        return dict(_user_defined_modules_stats)
+
+
+def take_user_defined_modules_cache_info() -> dict:
+    """Get the statistics of the user defined modules cache and reset them. Used to send the statistics of worker
+    processes to the main process (see `merge_user_defined_modules_cache_info`)
+
+    Returns:
+        dict: Number of module executions (key loads) and of reuses of an already loaded module (key hits)
+    """
+
+    with _user_defined_modules_lock:
+        stats = dict(_user_defined_modules_stats)
+        _user_defined_modules_stats.update(loads=0, hits=0)
+    return stats
 
-def apply_custom_map_function(stac_element_name: str,
-                              stac_values: object, function_definition: dict) -> Union[List[OrderedDict], OrderedDict]:
-    """Function to apply custom map function to STAC Values
+
+def merge_user_defined_modules_cache_info(stats: dict) -> None:
+    """Add statistics of the user defined modules cache of another process
+
+    Args:
+        stats (dict): Statistics created with `take_user_defined_modules_cache_info`
+    """
+
+    with _user_defined_modules_lock:
+        for key in ('loads', 'hits'):
+            _user_defined_modules_stats[key] += stats.get(key, 0)
+
+
+def apply_user_defined_function(stac_element_name: str, stac_values: object,
+                                user_defined_function) -> Union[List[OrderedDict], OrderedDict]:
+    """Function to apply an already loaded user defined function to STAC Values
 
     Args:
         stac_element_name (str): Key name where values from
-        function_definition (dict): Dict with informations about function definition file (key functionName) and
-        function name (key functionFile)
         stac_values: (object): objects will be used as parameters in user defined function
+        user_defined_function (function): function loaded with `load_user_defined_function`
     Returns:
         OrderedDict: Mapped elements from STAC to ODC pattern
     """
 
-    user_defined_function = load_user_defined_function(function_definition['functionName'],
-                                                       function_definition['functionFile'])
-    odc_element_created_with_user_function = user_defined_function(stac_values)
+    with timed_stage('udf'):
+        odc_element_created_with_user_function = user_defined_function(stac_values)
 
     if not isinstance(stac_values, (str, int, float)):
         if not isinstance(odc_element_created_with_user_function, (OrderedDict, list)):
@@ -58,3 +126,21 @@ def apply_custom_map_function(stac_element_name: str,
     Actual return is {tname} 
             """.strip())
     return odc_element_created_with_user_function
+
+
+def apply_custom_map_function(stac_element_name: str,
+                              stac_values: object, function_definition: dict) -> Union[List[OrderedDict], OrderedDict]:
+    """Function to apply custom map function to STAC Values
+
+    Args:
+        stac_element_name (str): Key name where values from
+        function_definition (dict): Dict with informations about function definition file (key functionName) and
+        function name (key functionFile)
+        stac_values: (object): objects will be used as parameters in user defined function
+    Returns:
+        OrderedDict: Mapped elements from STAC to ODC pattern
+    """
+
+    user_defined_function = load_user_defined_function(function_definition['functionName'],
+                                                       function_definition['functionFile'])
+    return apply_user_defined_function(stac_element_name, stac_values, user_defined_function)
@@ -0,0 +1,268 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import datetime
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+from loguru import logger
+
+from stac2odc.logger import logger_message
+from stac2odc.pipeline import Page
+from stac2odc.sync import merge_search_filters, parse_datetime
+from stac2odc.toolbox import iterate_stac_pages
+
+PARTITION_TYPES = ['time', 'tile', 'bbox']
+
+
+def _always_shared(feature: dict) -> bool:
+    return True
+
+
+class SearchPartition(NamedTuple):
+    """A part of the search space of a STAC search
+
+    Attributes:
+        name (str): Description of the partition (used in logs)
+        search_filter (dict): STAC search parameters added to the search to restrict it to the partition
+        is_shared (function): Function that checks if a STAC Item found in the partition may also be found in other
+            partitions. Only these items are deduplicated
+    """
+    name: str
+    search_filter: dict
+    is_shared: Callable[[dict], bool] = _always_shared
+
+
+def _format_datetime(value: datetime.datetime) -> str:
+    value = value.astimezone(datetime.timezone.utc)
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%fZ' if value.microsecond else '%Y-%m-%dT%H:%M:%SZ')
+
+
+def _time_window_is_shared(window_start: datetime.datetime, window_end: datetime.datetime) -> Callable[[dict], bool]:
+    def is_shared(feature: dict) -> bool:
+        properties = feature.get('properties') or {}
+
+        # items with a datetime range are found in all windows that intersect the range
+        item_start = properties.get('datetime') or properties.get('start_datetime')
+        item_end = properties.get('datetime') or properties.get('end_datetime')
+        try:
+            return not (item_start and item_end and window_start <= parse_datetime(item_start) and
+                        parse_datetime(item_end) <= window_end)
+        except ValueError:
+            return True
+    return is_shared
+
+
+def time_partitions(start: str, end: str, partitions: int) -> List[SearchPartition]:
+    """Split a datetime interval in windows of the same size. Windows do not overlap: all windows, except the
+    last, end one microsecond before the start of the next window. Intervals shorter than `partitions`
+    microseconds (e.g. an instant) are split in fewer windows
+
+    Args:
+        start (str): Interval start (RFC 3339 datetime)
+        end (str): Interval end (RFC 3339 datetime)
+        partitions (int): Max number of windows
+    Returns:
+        List[SearchPartition]: Partitions with the STAC `datetime` parameter of each window
+    """
+    start, end = parse_datetime(start), parse_datetime(end)
+
+    # each window has at least one microsecond, so no window ends before its start
+    partitions = max(min(partitions, (end - start) // datetime.timedelta(microseconds=1)), 1)
+    window = (end - start) / partitions
+
+    windows = [
+        (start + window * index, start + window * (index + 1) - datetime.timedelta(microseconds=1))
+        for index in range(partitions - 1)
+    ] + [(start + window * (partitions - 1), end)]
+    return [
+        SearchPartition(f"{_format_datetime(window_start)}/{_format_datetime(window_end)}",
+                        {"datetime": f"{_format_datetime(window_start)}/{_format_datetime(window_end)}"},
+                        _time_window_is_shared(window_start, window_end))
+        for window_start, window_end in windows
+    ]
+
+
+def collection_time_partitions(collection_definition: dict, search_filter: dict,
+                               partitions: int) -> List[SearchPartition]:
+    """Split the datetime interval of a search in windows. The interval is the `datetime` parameter of the search
+    or, if it is not defined, the temporal extent of the collection. Open intervals end now
+
+    Args:
+        collection_definition (dict): STAC Collection definition
+        search_filter (dict): STAC search parameters
+        partitions (int): Number of windows
+    Returns:
+        List[SearchPartition]: Partitions with the STAC `datetime` parameter of each window
+    """
+    if search_filter.get('datetime'):
+        interval = search_filter['datetime'].split('/')
+        interval = interval if len(interval) == 2 else [interval[0], interval[0]]
+    else:
+        interval = collection_definition['extent']['temporal']['interval'][0]
+
+    start, end = [None if value in (None, '', '..') else value for value in interval]
+    if start is None:
+        raise ValueError("Time partitions require a datetime interval with start")
+    end = end or _format_datetime(datetime.datetime.now(datetime.timezone.utc))
+
+    return time_partitions(start, end, partitions)
+
+
+def _bbox_strip_is_shared(strip_xmin: float, strip_xmax: float) -> Callable[[dict], bool]:
+    def is_shared(feature: dict) -> bool:
+        # items that touch the limits between strips are found in both strips
+        bbox = feature.get('bbox')
+        if not bbox or len(bbox) not in (4, 6):
+            return True
+        xmin, xmax = bbox[0], bbox[len(bbox) // 2]
+        return xmin > xmax or xmin <= strip_xmin or xmax >= strip_xmax
+    return is_shared
+
+
+def bbox_partitions(bbox: List[float], partitions: int) -> List[SearchPartition]:
+    """Split a bounding box in strips (by longitude) of the same size
+
+    Args:
+        bbox (list): Bounding box (xmin, ymin, xmax, ymax)
+        partitions (int): Number of strips
+    Returns:
+        List[SearchPartition]: Partitions with the STAC `bbox` parameter of each strip
+    """
+    xmin, ymin, xmax, ymax = bbox[:4]
+    width = (xmax - xmin) / partitions
+
+    partitions_bbox = [[xmin + width * index, ymin, xmin + width * (index + 1), ymax] for index in range(partitions)]
+    return [
+        SearchPartition(",".join(f"{value:.6f}" for value in partition_bbox), {"bbox": partition_bbox},
+                        # the outer limits of the search are not shared with other strips
+                        _bbox_strip_is_shared(partition_bbox[0] if index > 0 else float('-inf'),
+                                              partition_bbox[2] if index < partitions - 1 else float('inf')))
+        for index, partition_bbox in enumerate(partitions_bbox)
+    ]
+
+
+def tile_partitions(tiles: List[str], tile_property: str = 'bdc:tiles') -> List[SearchPartition]:
+    """Create a partition for each tile. Requires the STAC query extension
+
+    Args:
+        tiles (list): Tiles names
+        tile_property (str): STAC Item property with the tiles of the item
+    Returns:
+        List[SearchPartition]: Partitions with the STAC query of each tile
+    """
+    def is_shared(feature: dict) -> bool:
+        # items of many tiles are found in the partition of each tile
+        item_tiles = (feature.get('properties') or {}).get(tile_property)
+        return not isinstance(item_tiles, list) or len(item_tiles) != 1
+
+    return [SearchPartition(tile, {"query": {tile_property: {"in": [tile]}}}, is_shared) for tile in tiles]
+
+
+class _PartitionError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_PARTITION_END = object()
+
+
+def iterate_partitioned_stac_pages(stac_service, max_items: Optional[int], advanced_filter: dict,
+                                   partitions: List[SearchPartition], limit: int = 120, fetch_workers: int = 1,
+                                   partition_workers: int = 4, queue_size: int = 4,
+                                   is_verbose: bool = False) -> Iterator[Page]:
+    """Iterate over the pages of many STAC searches, one per partition, made in parallel. Items found in more
+    than one partition are delivered only once. Only the ids of the items shared by partitions
+    (`SearchPartition.is_shared`) are kept to find the duplicates.
+
+    Pages are delivered as they arrive, so the pages order (and numbers) changes between runs
+
+    Args:
+        stac_service (stac.STAC): STAC Service instance
+        max_items (int): Max items recovered from all partitions
+        advanced_filter (dict): Filter with STAC parameters, merged with the filter of each partition
+        partitions (List[SearchPartition]): Partitions of the search
+        limit (int): Max items recovered in each page
+        fetch_workers (int): Max number of page requests in flight in each partition
+        partition_workers (int): Number of partitions searched in parallel
+        queue_size (int): Max pages waiting to be consumed
+        is_verbose (bool): Flag indicates if stac2odc library is in a verbose mode
+    Returns:
+        Iterator[Page]: Pages of features recovered from STAC
+    """
+    pages = queue.Queue(maxsize=max(queue_size, 1))
+    stopped = threading.Event()
+
+    def _put(element) -> bool:
+        while not stopped.is_set():
+            try:
+                pages.put(element, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _search_partition(partition_number: int, partition: SearchPartition) -> None:
+        partition_items = 0
+        partition_filter = merge_search_filters(advanced_filter, partition.search_filter)
+
+        try:
+            for page in iterate_stac_pages(stac_service, max_items, partition_filter, limit, fetch_workers):
+                partition_items += len(page.items)
+                logger_message(f"Partition {partition_number}/{len(partitions)} ({partition.name}): page "
+                               f"{page.number}, {partition_items} items", logger.info, is_verbose)
+                if not _put((partition, page)):
+                    return
+        except BaseException as e:
+            _put(_PartitionError(e))
+            return
+        logger_message(f"Partition {partition_number}/{len(partitions)} ({partition.name}) finished with "
+                       f"{partition_items} items", logger.info, True)
+
+    def _search_partitions() -> None:
+        with ThreadPoolExecutor(max_workers=max(partition_workers, 1)) as executor:
+            for partition_number, partition in enumerate(partitions, start=1):
+                executor.submit(_search_partition, partition_number, partition)
+        _put(_PARTITION_END)
+
+    threading.Thread(target=_search_partitions, daemon=True).start()
+
+    try:
+        total_items = 0
+        page_number = 0
+        shared_item_ids = set()
+
+        while max_items is None or total_items < max_items:
+            element = pages.get()
+
+            if element is _PARTITION_END:
+                break
+            if isinstance(element, _PartitionError):
+                raise element.error
+
+            partition, page = element
+            features = []
+            for feature in page.items:
+                if partition.is_shared(feature):
+                    if feature['id'] in shared_item_ids:
+                        continue
+                    shared_item_ids.add(feature['id'])
+                features.append(feature)
+
+            if max_items is not None:
+                features = features[:max_items - total_items]
+            if not features:
+                continue
+
+            total_items += len(features)
+            page_number += 1
+            yield Page(page_number, features)
+    finally:
+        stopped.set()
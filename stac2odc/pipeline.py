@@ -0,0 +1,84 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import queue
+import threading
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+
+class Page(NamedTuple):
+    """A page of elements flowing through the stac2odc pipeline.
+
+    Attributes:
+        number (int): Page number, as used in the STAC search (first page is 1)
+        items (list): Elements of the page (STAC Items or ODC Datasets, depending on the stage)
+        ids (list): Ids of the STAC Items each element comes from. Only defined after the mapping stage
+    """
+    number: int
+    items: List
+    ids: Optional[List[str]] = None
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STAGE_END = object()
+
+
+def bounded_stage(iterable: Iterable, maxsize: int = 4) -> Iterator:
+    """Consume an iterable in a background thread, handing its elements through a bounded queue.
+
+    The producer is blocked while the queue is full, so the amount of elements held in memory
+    between two stages is limited by `maxsize`, regardless of how many elements the iterable produces.
+
+    Args:
+        iterable (Iterable): Elements to be produced in the background (e.g. a generator of pages)
+        maxsize (int): Max number of elements waiting to be consumed
+    Returns:
+        Iterator: Elements of `iterable`, in the same order
+    Raises:
+        Any exception raised by `iterable` is re-raised in the consumer
+    """
+    elements = queue.Queue(maxsize=max(maxsize, 1))
+    stopped = threading.Event()
+
+    def _put(element) -> bool:
+        while not stopped.is_set():
+            try:
+                elements.put(element, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for element in iterable:
+                if not _put(element):
+                    return
+        except BaseException as e:
+            _put(_StageError(e))
+            return
+        _put(_STAGE_END)
+
+    producer = threading.Thread(target=_produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            element = elements.get()
+
+            if element is _STAGE_END:
+                break
+            if isinstance(element, _StageError):
+                raise element.error
+            yield element
+    finally:
+        stopped.set()
@@ -0,0 +1,290 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import datetime
+import itertools
+import json
+import mmap
+import os
+from collections import deque
+from typing import Iterable, Iterator, Optional, Tuple
+
+from stac2odc.metrics import timed_stage
+from stac2odc.pipeline import Page
+
+INPUT_SOURCES = ['stac', 'catalog', 'ndjson', 'geoparquet']
+
+# top level fields of STAC Items. In stac-geoparquet, all other columns are item properties
+STAC_ITEM_FIELDS = ['type', 'stac_version', 'stac_extensions', 'id', 'geometry', 'bbox', 'links', 'assets',
+                    'collection']
+
+
+def _paginate(stac_items: Iterable[dict], max_items: Optional[int], page_size: int = 120,
+              start_page: int = 1) -> Iterator[Page]:
+    """Group STAC Items in pages, as they are recovered from a STAC API search
+
+    Args:
+        stac_items (Iterable[dict]): STAC Items
+        max_items (int): Max items recovered. If None, all items are recovered
+        page_size (int): Number of items in each page
+        start_page (int): First page delivered. Pages before it are considered already recovered (and count in
+        `max_items`)
+    Returns:
+        Iterator[Page]: Pages of STAC Items
+    """
+    if max_items is not None:
+        stac_items = itertools.islice(stac_items, max_items)
+    stac_items = iter(stac_items)
+
+    # items of the pages already recovered are read, but not delivered
+    deque(itertools.islice(stac_items, (start_page - 1) * page_size), maxlen=0)
+
+    for page_number in itertools.count(start_page):
+        with timed_stage('read_items') as timer:
+            page_items = list(itertools.islice(stac_items, page_size))
+            timer.items = len(page_items)
+
+        if not page_items:
+            break
+        yield Page(page_number, page_items)
+
+
+def _is_from_collection(stac_item: dict, collection: Optional[str]) -> bool:
+    # items without collection are accepted, since dumps commonly have a single collection
+    return collection is None or stac_item.get('collection') in (None, collection)
+
+
+def _iterate_static_catalog_items(stac_file: str, collection: Optional[str], visited: set) -> Iterator[dict]:
+    stac_file = os.path.abspath(stac_file)
+    if stac_file in visited:
+        return
+    visited.add(stac_file)
+
+    with open(stac_file, 'r') as sfile:
+        stac_element = json.load(sfile)
+
+    if stac_element.get('type') == 'Feature':
+        if _is_from_collection(stac_element, collection):
+            yield stac_element
+        return
+
+    # catalogs and collections: items of other collections are not visited
+    if collection and 'extent' in stac_element and stac_element.get('id') != collection:
+        return
+
+    for link in stac_element.get('links', []):
+        if link.get('rel') not in ('child', 'item'):
+            continue
+
+        # the collection of the items is the collection where they are linked, if they do not define it
+        for stac_item in _iterate_static_catalog_items(os.path.join(os.path.dirname(stac_file), link['href']),
+                                                       collection, visited):
+            if 'extent' in stac_element:
+                stac_item.setdefault('collection', stac_element.get('id'))
+            yield stac_item
+
+
+def iterate_static_catalog_pages(catalog_file: str, collection: str = None, max_items: int = None,
+                                 page_size: int = 120, start_page: int = 1) -> Iterator[Page]:
+    """Iterate over the pages of STAC Items of a local static STAC catalog. The catalog is walked through its
+    `child` and `item` links (relative to each file)
+
+    Args:
+        catalog_file (str): Root catalog (or collection) JSON file
+        collection (str): Collection of the items. If None, items of all collections are recovered
+        max_items (int): Max items recovered
+        page_size (int): Number of items in each page
+        start_page (int): First page delivered
+    Returns:
+        Iterator[Page]: Pages of STAC Items
+    """
+    return _paginate(_iterate_static_catalog_items(catalog_file, collection, set()), max_items, page_size, start_page)
+
+
+def _ndjson_byte_range(file_size: int, split: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    if not split:
+        return 0, file_size
+
+    split_index, split_count = split
+    return file_size * split_index // split_count, file_size * (split_index + 1) // split_count
+
+
+def _iterate_ndjson_lines(ndjson_file: str, use_mmap: bool, split: Optional[Tuple[int, int]]) -> Iterator[bytes]:
+    with open(ndjson_file, 'rb') as nfile:
+        file_size = os.fstat(nfile.fileno()).st_size
+        if file_size == 0:
+            return
+
+        start, end = _ndjson_byte_range(file_size, split)
+        lines = mmap.mmap(nfile.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else nfile
+
+        try:
+            # a split starts in the first line that starts inside its byte range. The line in progress belongs to
+            # the previous split
+            if start > 0:
+                lines.seek(start - 1)
+                lines.readline()
+
+            while lines.tell() < end:
+                line = lines.readline()
+                if not line:
+                    break
+                yield line
+        finally:
+            if use_mmap:
+                lines.close()
+
+
+def iterate_ndjson_pages(ndjson_file: str, collection: str = None, max_items: int = None, page_size: int = 120,
+                         start_page: int = 1, use_mmap: bool = False,
+                         split: Tuple[int, int] = None) -> Iterator[Page]:
+    """Iterate over the pages of STAC Items of a newline-delimited JSON file (one item per line). The file is
+    streamed, so only the pages being processed are held in memory
+
+    Args:
+        ndjson_file (str): NDJSON file
+        collection (str): Collection of the items. If None, items of all collections are recovered
+        max_items (int): Max items recovered (in the split)
+        page_size (int): Number of items in each page
+        start_page (int): First page delivered
+        use_mmap (bool): Read the file with a memory map instead of buffered reads
+        split (tuple): Index and count of splits (e.g. (0, 4)). The file is split in `count` byte ranges, aligned
+        to lines, so many processes can read the same file, each one reading a part of it
+    Returns:
+        Iterator[Page]: Pages of STAC Items
+    """
+    stac_items = (json.loads(line) for line in _iterate_ndjson_lines(ndjson_file, use_mmap, split) if line.strip())
+    stac_items = (stac_item for stac_item in stac_items if _is_from_collection(stac_item, collection))
+
+    return _paginate(stac_items, max_items, page_size, start_page)
+
+
+def _remove_nulls(value: object) -> object:
+    # parquet structs have all the fields of all rows, with nulls where a row does not have the field
+    if isinstance(value, dict):
+        return {key: _remove_nulls(field) for key, field in value.items() if field is not None}
+    if isinstance(value, list):
+        return [_remove_nulls(field) for field in value]
+    return value
+
+
+def _geoparquet_value_to_json(value: object) -> object:
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value.isoformat() + 'Z'
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: _geoparquet_value_to_json(field) for key, field in value.items()}
+    if isinstance(value, list):
+        return [_geoparquet_value_to_json(field) for field in value]
+    return value
+
+
+def _geoparquet_row_to_stac_item(row: dict) -> dict:
+    import shapely.geometry
+    import shapely.wkb
+
+    stac_item = {'type': 'Feature'}
+    properties = {}
+    for column, value in row.items():
+        if column in STAC_ITEM_FIELDS:
+            stac_item[column] = value
+        elif value is not None:
+            properties[column] = _geoparquet_value_to_json(value)
+    stac_item['properties'] = properties
+
+    if stac_item.get('geometry') is not None:
+        stac_item['geometry'] = shapely.geometry.mapping(shapely.wkb.loads(bytes(stac_item['geometry'])))
+
+    bbox = stac_item.get('bbox')
+    if isinstance(bbox, dict):
+        stac_item['bbox'] = [bbox['xmin'], bbox['ymin'], bbox['xmax'], bbox['ymax']]
+
+    for field in ('assets', 'links'):
+        if stac_item.get(field) is not None:
+            stac_item[field] = _remove_nulls(stac_item[field])
+    return stac_item
+
+
+def iterate_geoparquet_pages(geoparquet_file: str, collection: str = None, max_items: int = None,
+                             page_size: int = 120, start_page: int = 1) -> Iterator[Page]:
+    """Iterate over the pages of STAC Items of a stac-geoparquet file. The file is read in batches of rows.
+    Requires pyarrow (`geoparquet` extra)
+
+    Args:
+        geoparquet_file (str): stac-geoparquet file
+        collection (str): Collection of the items. If None, items of all collections are recovered
+        max_items (int): Max items recovered
+        page_size (int): Number of items in each page
+        start_page (int): First page delivered
+    Returns:
+        Iterator[Page]: Pages of STAC Items
+    """
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required to read stac-geoparquet files. Install it with "
+                          "`pip install stac2odc[geoparquet]`")
+
+    def _stac_items():
+        parquet_file = pyarrow.parquet.ParquetFile(geoparquet_file)
+
+        for record_batch in parquet_file.iter_batches(batch_size=page_size):
+            for row in record_batch.to_pylist():
+                stac_item = _geoparquet_row_to_stac_item(row)
+
+                if _is_from_collection(stac_item, collection):
+                    yield stac_item
+
+    return _paginate(_stac_items(), max_items, page_size, start_page)
+
+
+def parse_input_split(input_split: str) -> Tuple[int, int]:
+    """Parse a split definition in the format `index/count` (e.g. 0/4), with index starting in 0
+
+    Args:
+        input_split (str): Split definition
+    Returns:
+        tuple: Index and count of splits
+    """
+    try:
+        split_index, split_count = (int(value) for value in input_split.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid split {input_split}! Use index/count (e.g. 0/4)")
+
+    if split_count < 1 or not 0 <= split_index < split_count:
+        raise ValueError(f"Invalid split {input_split}! Index must be between 0 and {split_count - 1}")
+    return split_index, split_count
+
+
+def iterate_source_pages(source: str, input_path: str, collection: str = None, max_items: int = None,
+                         page_size: int = 120, start_page: int = 1, use_mmap: bool = False,
+                         split: Tuple[int, int] = None) -> Iterator[Page]:
+    """Iterate over the pages of STAC Items of a local source (offline ingestion)
+
+    Args:
+        source (str): Source type (catalog, ndjson or geoparquet)
+        input_path (str): Source file (root catalog file for static catalogs)
+        collection (str): Collection of the items. If None, items of all collections are recovered
+        max_items (int): Max items recovered
+        page_size (int): Number of items in each page
+        start_page (int): First page delivered
+        use_mmap (bool): Read the file with a memory map (ndjson)
+        split (tuple): Index and count of splits of the file (ndjson)
+    Returns:
+        Iterator[Page]: Pages of STAC Items
+    """
+    if source == 'catalog':
+        return iterate_static_catalog_pages(input_path, collection, max_items, page_size, start_page)
+    if source == 'ndjson':
+        return iterate_ndjson_pages(input_path, collection, max_items, page_size, start_page, use_mmap, split)
+    if source == 'geoparquet':
+        return iterate_geoparquet_pages(input_path, collection, max_items, page_size, start_page)
+    raise ValueError(f"Invalid source {source}! Use one of {', '.join(INPUT_SOURCES[1:])}")
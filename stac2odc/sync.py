@@ -0,0 +1,198 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import datetime
+import json
+import os
+from typing import Iterable, Iterator, Optional
+
+import stac2odc.tree as tree
+from stac2odc.pipeline import Page
+
+
+def parse_datetime(value: str) -> datetime.datetime:
+    """Parse a RFC 3339 datetime, as used in STAC. Datetimes without timezone are considered UTC
+
+    Args:
+        value (str): RFC 3339 datetime
+    Returns:
+        datetime.datetime: Datetime with timezone
+    """
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def watermark_filter(watermark_field: str, watermark: str) -> dict:
+    """Create the STAC search parameters to recover only items after a watermark
+
+    Args:
+        watermark_field (str): Tree path of the watermark in the STAC Items (e.g. properties.updated)
+        watermark (str): Watermark value (RFC 3339 datetime)
+    Returns:
+        dict: STAC search parameters. `properties.datetime` uses the core datetime parameter, other properties use
+        the query extension
+    """
+    property_name = watermark_field.split('.')[-1]
+
+    if property_name == 'datetime':
+        return {"datetime": f"{watermark}/.."}
+    return {"query": {property_name: {"gte": watermark}}}
+
+
+def _intersect_datetime_intervals(interval: str, other_interval: str) -> str:
+    bounds = []
+    for value in (interval, other_interval):
+        value = value.split('/')
+        start, end = (value[0], value[0]) if len(value) == 1 else value
+        bounds.append([None if bound in ('', '..') else bound for bound in (start, end)])
+
+    starts = [start for start, _ in bounds if start]
+    ends = [end for _, end in bounds if end]
+    start = max(starts, key=parse_datetime) if starts else '..'
+    end = min(ends, key=parse_datetime) if ends else '..'
+    return f"{start}/{end}"
+
+
+def merge_search_filters(search_filter: dict, extra_filter: dict) -> dict:
+    """Merge STAC search parameters. The `datetime` parameter is the intersection of the intervals of both filters
+    and the query extension operators of both filters are kept
+
+    Args:
+        search_filter (dict): STAC search parameters
+        extra_filter (dict): STAC search parameters added to `search_filter`
+    Returns:
+        dict: Merged STAC search parameters
+    """
+    merged_filter = {**search_filter, **extra_filter}
+
+    if search_filter.get('datetime') and extra_filter.get('datetime'):
+        merged_filter['datetime'] = _intersect_datetime_intervals(search_filter['datetime'], extra_filter['datetime'])
+
+    if 'query' in search_filter and 'query' in extra_filter:
+        merged_filter['query'] = {**search_filter['query'], **extra_filter['query']}
+
+        # operators of the same property are combined (e.g. lte of the search with the gte of a watermark)
+        for property_name in search_filter['query'].keys() & extra_filter['query'].keys():
+            merged_filter['query'][property_name] = {**search_filter['query'][property_name],
+                                                     **extra_filter['query'][property_name]}
+    return merged_filter
+
+
+class WatermarkTracker:
+    def __init__(self, watermark_field: str):
+        """Track the high-water mark (max datetime) of the STAC Items that go through a pipeline
+
+        Args:
+            watermark_field (str): Tree path of the watermark in the STAC Items (e.g. properties.updated)
+        """
+        self._watermark_path = watermark_field.split('.')
+        self._watermark_parsed = None
+        self.watermark = None
+        self.items = 0
+
+    def observe(self, pages: Iterable[Page]) -> Iterator[Page]:
+        """Track the watermark of the items of the pages, without changing them
+
+        Args:
+            pages (Iterable[Page]): Pages of STAC Items
+        Returns:
+            Iterator[Page]: The same pages
+        """
+        for page in pages:
+            self.items += len(page.items)
+
+            for item in page.items:
+                if not tree.is_path_valid_in_tree(item, self._watermark_path):
+                    continue
+
+                value = tree.get_value_by_tree_path(item, self._watermark_path)
+                if not value:
+                    continue
+
+                value_parsed = parse_datetime(value)
+                if self._watermark_parsed is None or value_parsed > self._watermark_parsed:
+                    self._watermark_parsed = value_parsed
+                    self.watermark = value
+            yield page
+
+    def safe_watermark(self, max_items: Optional[int], datasets_failed: int, items_before: int = 0) -> Optional[str]:
+        """Get the watermark that can be saved after a run. Searches are not ordered by the watermark, so the
+        watermark is only safe when the search ran to the end (it returned less than `max_items` items) and all
+        datasets were indexed. Otherwise, items not recovered (or not indexed) could be older than the watermark
+        and would never be searched again
+
+        Args:
+            max_items (int): Max items of the search. If None, the search always runs to the end
+            datasets_failed (int): Number of datasets of the run that were not indexed
+            items_before (int): Items recovered before the observed pages (e.g. pages of a resumed run)
+        Returns:
+            str: Watermark or None if it can't be saved
+        """
+        search_completed = max_items is None or items_before + self.items < max_items
+
+        if not search_completed or datasets_failed:
+            return None
+        return self.watermark
+
+
+class SyncState:
+    def __init__(self, sync_state_file: str):
+        """Watermarks of the collections already synchronized, saved in a JSON file
+
+        Args:
+            sync_state_file (str): JSON file with the watermarks
+        """
+        self._sync_state_file = sync_state_file
+        self._collections = {}
+
+        if os.path.isfile(sync_state_file):
+            with open(sync_state_file, 'r') as sfile:
+                self._collections = json.load(sfile)
+
+    def get_watermark(self, collection: str, watermark_field: str) -> Optional[str]:
+        """Get the watermark of a collection
+
+        Args:
+            collection (str): STAC Collection name
+            watermark_field (str): Tree path of the watermark in the STAC Items. Watermarks saved for another
+            field are not used
+        Returns:
+            str: Watermark or None if the collection was never synchronized with `watermark_field`
+        """
+        collection_state = self._collections.get(collection)
+
+        if collection_state and collection_state.get('field') == watermark_field:
+            return collection_state.get('watermark')
+        return None
+
+    def set_watermark(self, collection: str, watermark_field: str, watermark: str) -> None:
+        """Set the watermark of a collection and save the state file
+
+        Args:
+            collection (str): STAC Collection name
+            watermark_field (str): Tree path of the watermark in the STAC Items
+            watermark (str): Watermark value
+        """
+        previous_watermark = self.get_watermark(collection, watermark_field)
+
+        if previous_watermark and parse_datetime(previous_watermark) >= parse_datetime(watermark):
+            return
+
+        self._collections[collection] = {"field": watermark_field, "watermark": watermark}
+
+        sync_state_dir = os.path.dirname(self._sync_state_file)
+        if sync_state_dir:
+            os.makedirs(sync_state_dir, exist_ok=True)
+
+        sync_state_tmp_file = self._sync_state_file + '.tmp'
+        with open(sync_state_tmp_file, 'w') as sfile:
+            json.dump(self._collections, sfile, indent=2)
+        os.replace(sync_state_tmp_file, self._sync_state_file)
@@ -6,13 +6,22 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 
+import itertools
 import json
+import math
 import os
-from collections import OrderedDict
-from typing import Union, Any, List
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Any, List, Iterator
 
 import yaml
 
+from stac2odc.metrics import timed_stage
+from stac2odc.pipeline import Page
+from stac2odc.writer import YAML_DUMPER, DocumentWriter, odc_dataset_file_path
+
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 def load_custom_configuration_file(custom_configuration_file_path: str):
     """Load custom config file in JSON or YAML format
@@ -24,10 +33,9 @@ def load_custom_configuration_file(custom_configuration_file_path: str):
     """
 
     with open(custom_configuration_file_path, 'r') as cfile:
-        loader = json
         if '.yaml' in custom_configuration_file_path:
-            loader = yaml
-        return loader.load(cfile)
+            return yaml.load(cfile, Loader=YAML_LOADER)
+        return json.load(cfile)
 
 
 def write_odc_element_in_yaml_file(content: Union[dict, OrderedDict, List[OrderedDict]],
@@ -42,18 +50,13 @@ def write_odc_element_in_yaml_file(content: Union[dict, OrderedDict, List[Ordere
 
     def _write(path_to_file, content):
         with open(path_to_file, 'w') as ofile:
-            yaml.dump(content, ofile)
-
-    os.makedirs(os.path.split(path_to_file)[0], exist_ok=True)
+            yaml.dump(content, ofile, Dumper=YAML_DUMPER)
 
     if isinstance(content, list):
-        element_paths = []
-        for c in content:
-            _path = os.path.join(path_to_file, c['id'] + ".yaml")
-            _write(_path, c)
-            element_paths.append(_path)
-        return element_paths
+        DocumentWriter(path_to_file).write(content)
+        return [odc_dataset_file_path(element, path_to_file) for element in content]
     else:
+        os.makedirs(os.path.split(path_to_file)[0], exist_ok=True)
         _write(path_to_file, content)
     return path_to_file
 
@@ -73,6 +76,73 @@ def datacube_index(datacube_config_path=None) -> Union['datacube.index.index.Ind
     return datacube.index.index_connect(datacube_config, 'stac2odc')
 
 
+def iterate_stac_pages(stac_service, max_items: int, advanced_filter: dict, limit: int = 120,
+                       fetch_workers: int = 1, start_page: int = 1) -> Iterator[Page]:
+    """Iterate over the pages of STAC features avaliable in STAC. Up to `fetch_workers` pages are requested
+    concurrently, but pages are always delivered in order.
+
+    Args
+        stac_service (stac.STAC): STAC Service instance
+        max_items (int): Max items recovered from STAC
+        advanced_filter (dict): Filter with STAC parameters to recovery feature collection
+        limit (int): Max items recovered in each page
+        fetch_workers (int): Max number of page requests in flight
+        start_page (int): First page requested. Pages before it are considered already recovered (and count
+        in `max_items`)
+    Returns:
+        Iterator[Page]: Pages of features recovered from STAC
+    """
+
+    stac_max_page = 99999999
+
+    # the page size must be the same in all requests, otherwise the page offsets change
+    if max_items is not None:
+        limit = min(limit, max_items)
+        stac_max_page = min(stac_max_page, math.ceil(max_items / limit)) if limit else 0
+
+    def _search_page(page: int) -> List:
+        with timed_stage('stac_search') as timer:
+            features = stac_service.search({
+                **advanced_filter, **{
+                    "page": page,
+                    "limit": limit
+                }
+            }).features
+            timer.items = len(features)
+        return features
+
+    pages_to_fetch = iter(range(start_page, stac_max_page + 1))
+    with ThreadPoolExecutor(max_workers=max(fetch_workers, 1)) as executor:
+        pages_in_flight = deque(
+            (page, executor.submit(_search_page, page)) for page in itertools.islice(pages_to_fetch, fetch_workers)
+        )
+
+        try:
+            total_items = (start_page - 1) * limit
+            while pages_in_flight:
+                page, features = pages_in_flight.popleft()
+                features = features.result()
+
+                if len(features) == 0:
+                    break
+
+                if max_items is not None:
+                    features = features[:max_items - total_items]
+                total_items += len(features)
+                yield Page(page, features)
+
+                if max_items is not None and max_items <= total_items:
+                    break
+
+                next_page = next(pages_to_fetch, None)
+                if next_page is not None:
+                    pages_in_flight.append((next_page, executor.submit(_search_page, next_page)))
+        finally:
+            # requests of pages after the last one are not needed
+            for _, features in pages_in_flight:
+                features.cancel()
+
+
 def create_feature_collection_from_stac_elements(stac_service, max_items: int, advanced_filter: dict) -> List:
     """Create list with all stac features avaliable in STAC.
 
@@ -84,28 +154,9 @@ def create_feature_collection_from_stac_elements(stac_service, max_items: int, a
         List: List of features recovered from STAC
     """
 
-    stac_max_page = 99999999
-
-    limit = 120
-    total_items = 0
     features_recovered_from_search = []
-    for page in range(1, stac_max_page + 1):
-        if max_items is not None and max_items == total_items:
-            break
-
-        if limit > (max_items - total_items):
-            limit = (max_items - total_items)
-
-        features = stac_service.search({
-            **advanced_filter, **{
-                "page": page,
-                "limit": limit
-            }
-        }).features
-        features_recovered_from_search.extend(features)
-
-        if len(features) == 0 or len(features_recovered_from_search) >= max_items:
-            break
+    for page in iterate_stac_pages(stac_service, max_items, advanced_filter):
+        features_recovered_from_search.extend(page.items)
     return features_recovered_from_search
 
 
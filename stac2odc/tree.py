@@ -7,9 +7,26 @@
 #
 
 from collections import OrderedDict
+from typing import Dict, Sequence, Union
 
+TreePath = Union[str, Sequence[str]]
 
-def is_path_valid_in_tree(element: dict, tree_path: str):
+
+def split_tree_path(tree_path: TreePath) -> Sequence[str]:
+    """Split a tree path separated with points. Paths already splitted are returned as is, so callers can
+    split a path once and reuse it many times.
+
+    Args:
+        tree_path (str or Sequence[str]): Tree path
+    Returns:
+        Sequence[str]: Nodes of tree path
+    """
+    if isinstance(tree_path, str):
+        return tree_path.split('.')
+    return tree_path
+
+
+def is_path_valid_in_tree(element: dict, tree_path: TreePath):
     """
     Args:
         element:
@@ -17,8 +34,7 @@ def is_path_valid_in_tree(element: dict, tree_path: str):
 
     Returns:
     """
-    element = element.copy()
-    tree_path = tree_path.split('.')
+    tree_path = split_tree_path(tree_path)
 
     for tree_node in tree_path:
         if tree_node in element:
@@ -28,7 +44,7 @@ def is_path_valid_in_tree(element: dict, tree_path: str):
     return True
 
 
-def get_value_by_tree_path(element: dict, tree_path: str):
+def get_value_by_tree_path(element: dict, tree_path: TreePath):
     """This function gets value from a dict using a string path separated with points.
     e. g.
         using the following dict:
@@ -38,53 +54,167 @@ def get_value_by_tree_path(element: dict, tree_path: str):
 
     Args:
         element (dict): Element to get values using tree path
-        tree_path (str): String separated with points representing the tree path
+        tree_path (str or Sequence[str]): String separated with points representing the tree path (or its nodes)
     Returns:
         recovered value using tree_path
     """
-    element = element.copy()
-    tree_path = tree_path.split('.')
+    tree_path = split_tree_path(tree_path)
 
     for tree_node in tree_path:
         element = element[tree_node]
     return element
 
 
-def add_value_by_tree_path(element: OrderedDict, tree_path: str, value: object) -> None:
-    """Add values in dictionary using path separated with points. Apply modifications in-place
+def copy_tree(element: object) -> object:
+    """Copy the dicts and lists of a tree (e.g. a parsed JSON or YAML file). Other values are not copied, so it is
+    faster than `copy.deepcopy` for trees of primitive values
+
     Args:
-        element (OrderedDict): Element where value is inserted (in-place)
-        tree_path (str): String separated with points representing the tree path
-        value (object): Value to be inserted
+        element (object): Tree
     Returns:
-        None
+        object: Copy of the tree
     """
-    tree_path = tree_path.split('.')
+    if isinstance(element, dict):
+        return element.__class__((key, copy_tree(value)) for key, value in element.items())
+    if isinstance(element, list):
+        return [copy_tree(value) for value in element]
+    return element
 
-    _pelement = element
-    _element_index = -1
-    for tree_node in tree_path:
-        # walking through tree nodes
-        if tree_node not in _pelement:
+
+class _ListIndex:
+    def __init__(self, tree_list: list):
+        """Index of the members of a list node: value of each key of the members -> member position. When many
+        members have the same value, the last one is used
+
+        Args:
+            tree_list (list): List node
+        """
+        self.tree_list = tree_list
+        self.positions = {}
+
+        for position, member in enumerate(tree_list):
+            if isinstance(member, dict):
+                for member_value in member.values():
+                    self.add(member_value, position)
+
+    def add(self, member_value: object, position: int) -> None:
+        try:
+            if self.positions.get(member_value, -1) < position:
+                self.positions[member_value] = position
+        except TypeError:
+            # unhashable values (e.g. dicts) are never equal to a tree node
+            pass
+
+    def find(self, tree_node: object) -> int:
+        try:
+            return self.positions.get(tree_node, -1)
+        except TypeError:
+            for position in reversed(range(len(self.tree_list))):
+                member = self.tree_list[position]
+                if isinstance(member, dict) and any(value == tree_node for value in member.values()):
+                    return position
+            return -1
+
+
+class TreeBuilder:
+    def __init__(self, element: OrderedDict = None):
+        """Build a tree (e.g. an ODC element) adding values by tree paths. In list nodes, the tree node is the value
+        of a key of the member (e.g. `measurements.B1.units` is the member of `measurements` with the value B1). The
+        builder keeps an index of each list node, so finding a member does not scan the list. The indexes are updated
+        by the writes made through the builder, so the element must not be changed outside the builder while it is used
+
+        Args:
+            element (OrderedDict): Element where values are inserted (in-place). If None, a new element is created
+        """
+        self.element = OrderedDict() if element is None else element
+        self._list_indexes: Dict[int, _ListIndex] = {}
+
+    def _list_index(self, tree_list: list) -> _ListIndex:
+        list_index = self._list_indexes.get(id(tree_list))
+
+        # the index keeps a reference to its list, so the identity check also protects against reused ids
+        if list_index is None or list_index.tree_list is not tree_list:
+            list_index = _ListIndex(tree_list)
+            self._list_indexes[id(tree_list)] = list_index
+        return list_index
+
+    def _invalidate(self, tree_list: list) -> None:
+        self._list_indexes.pop(id(tree_list), None)
+
+    def add(self, tree_path: TreePath, value: object) -> None:
+        """Add a value using a path separated with points. Existing values are not replaced, except members of lists
+
+        Args:
+            tree_path (str or Sequence[str]): String separated with points representing the tree path (or its nodes)
+            value (object): Value to be inserted
+        """
+        tree_path = split_tree_path(tree_path)
+        last_depth = len(tree_path) - 1
+
+        _pelement = self.element
+        # index and position of the list member being walked through
+        _member_of = None
+        for depth, tree_node in enumerate(tree_path):
             if isinstance(_pelement, list):
-                for index in range(0, len(_pelement)):
-                    for key in _pelement[index]:
-                        if _pelement[index][key] == tree_node:
-                            _element_index = index
-                            break
-                # if no key in returned from search, add a new element in last position
-                if _element_index == -1:
+                list_index = self._list_index(_pelement)
+                position = list_index.find(tree_node)
+
+                # if no member has the node, add a new member in last position
+                if position == -1:
                     _pelement.append(OrderedDict())
-            else:
-                _pelement[tree_node] = OrderedDict()
-
-            # check if is the last element
-            if tree_node == tree_path[-1]:
-                if isinstance(_pelement, list):
-                    _pelement[_element_index] = value
-                else:
-                    _pelement[tree_node] = value
-        if isinstance(_pelement, list):
-            _pelement = _pelement[_element_index]
-        else:
-            _pelement = _pelement[tree_node]
+                    position = len(_pelement) - 1
+
+                if depth == last_depth:
+                    _pelement[position] = value
+                    self._invalidate(_pelement)
+                _pelement, _member_of = _pelement[position], (list_index, position)
+                continue
+
+            if tree_node not in _pelement:
+                _pelement[tree_node] = value if depth == last_depth else OrderedDict()
+
+                # a new value of a list member is a new key to find the member
+                if _member_of and depth == last_depth:
+                    _member_of[0].add(value, _member_of[1])
+            _pelement, _member_of = _pelement[tree_node], None
+
+    def merge(self, template: dict) -> None:
+        """Merge a tree (e.g. the constants of an engine) into the element. Values of the template are copied to the
+        keys missing in the element, dicts are merged recursively and dicts merged into lists are merged into each
+        member of the list (e.g. `{"measurements": {"units": "m"}}` adds units to all measurements). Existing values
+        are not replaced
+
+        Args:
+            template (dict): Tree merged into the element (not changed)
+        """
+        self._merge(self.element, template)
+
+    def _merge(self, element: dict, template: dict) -> None:
+        for key, template_value in template.items():
+            if key not in element:
+                element[key] = copy_tree(template_value)
+                continue
+
+            value = element[key]
+            if isinstance(value, dict) and isinstance(template_value, dict):
+                self._merge(value, template_value)
+            elif isinstance(value, list) and isinstance(template_value, dict):
+                for member in value:
+                    if isinstance(member, dict):
+                        self._merge(member, template_value)
+
+                # the members have new values, so the list is indexed again when needed
+                self._invalidate(value)
+
+
+def add_value_by_tree_path(element: OrderedDict, tree_path: TreePath, value: object) -> None:
+    """Add values in dictionary using path separated with points. Apply modifications in-place. To add many values
+    in the same element, use a `TreeBuilder`, which does not scan the list nodes in each insertion
+    Args:
+        element (OrderedDict): Element where value is inserted (in-place)
+        tree_path (str or Sequence[str]): String separated with points representing the tree path (or its nodes)
+        value (object): Value to be inserted
+    Returns:
+        None
+    """
+    TreeBuilder(element).add(tree_path, value)
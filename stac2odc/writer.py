@@ -0,0 +1,215 @@
+#
+# This file is part of stac2odc
+# Copyright (C) 2021 INPE.
+#
+# stac2odc is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+import abc
+import hashlib
+import json
+import os
+import pathlib
+import uuid
+from collections import OrderedDict
+from typing import List
+
+import yaml
+
+# libyaml dumper is much faster than the pure Python one. Both represent OrderedDict (see stac2odc/__init__.py)
+YAML_DUMPER = getattr(yaml, 'CDumper', yaml.Dumper)
+
+OUTPUT_FORMATS = ['yaml', 'yaml-multi', 'ndjson']
+
+
+def fanout_directory(outdir: str, name: str, fanout_depth: int = 0) -> str:
+    """Directory of a file when files are spread in hashed subdirectories (e.g. outdir/3f/a2 for depth 2).
+    This keeps the number of files per directory low when millions of files are written
+
+    Args:
+        outdir (str): Base directory
+        name (str): Name used to compute the hash (e.g. dataset id)
+        fanout_depth (int): Number of subdirectory levels. Each level has up to 256 directories
+    Returns:
+        str: Directory of the file
+    """
+    if fanout_depth <= 0:
+        return outdir
+
+    name_hash = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    return os.path.join(outdir, *[name_hash[level * 2:level * 2 + 2] for level in range(fanout_depth)])
+
+
+def file_uri(path: str) -> str:
+    """URI of a local file, as used in the locations of ODC Datasets
+
+    Args:
+        path (str): File path
+    Returns:
+        str: File URI (file://)
+    """
+    return pathlib.Path(path).absolute().as_uri()
+
+
+def odc_dataset_file_path(odc_element: OrderedDict, outdir: str, fanout_depth: int = 0) -> str:
+    """Path of the YAML file of an ODC Dataset written one per file
+
+    Args:
+        odc_element (OrderedDict): ODC Dataset
+        outdir (str): Output directory
+        fanout_depth (int): Number of hashed subdirectory levels
+    Returns:
+        str: Path to file
+    """
+    return os.path.join(fanout_directory(outdir, odc_element['id'], fanout_depth), odc_element['id'] + ".yaml")
+
+
+class DocumentWriter:
+    def __init__(self, outdir: str, fanout_depth: int = 0):
+        """Writer of ODC Datasets documents, one YAML file per dataset
+
+        Args:
+            outdir (str): Output directory
+            fanout_depth (int): Number of hashed subdirectory levels used to spread the files
+        """
+        self._outdir = outdir
+        self._fanout_depth = fanout_depth
+        self.bytes_written = 0
+
+    def write(self, documents: List[OrderedDict]) -> List[str]:
+        """Write documents
+
+        Args:
+            documents (List[OrderedDict]): ODC Datasets documents
+        Returns:
+            List[str]: URI of each document (used as the location of the dataset), in the same order
+        """
+        documents_uris = []
+        for document in documents:
+            document_path = odc_dataset_file_path(document, self._outdir, self._fanout_depth)
+            os.makedirs(os.path.dirname(document_path), exist_ok=True)
+
+            with open(document_path, 'w') as ofile:
+                yaml.dump(document, ofile, Dumper=YAML_DUMPER)
+                self.bytes_written += ofile.tell()
+            documents_uris.append(file_uri(document_path))
+        return documents_uris
+
+    def close(self) -> None:
+        """Finish the writing of documents"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _ShardDocumentWriter(DocumentWriter, abc.ABC):
+    extension = None
+
+    def __init__(self, outdir: str, fanout_depth: int = 0, shard_size: int = 1000):
+        """Writer of ODC Datasets documents in shards: files with up to `shard_size` documents each. Shards of a
+        writer have a unique prefix, so different runs never overwrite each other shards. The URI of each document
+        is `<shard URI>#part=<position in the shard>`, the same URI given by datacube to the documents of a
+        multi-document file
+
+        Args:
+            outdir (str): Output directory
+            fanout_depth (int): Number of hashed subdirectory levels used to spread the files
+            shard_size (int): Max number of documents in each file
+        """
+        super().__init__(outdir, fanout_depth)
+        self._shard_size = max(shard_size, 1)
+        self._shard_prefix = f"datasets-{uuid.uuid4().hex[:8]}"
+
+        self._shard_number = 0
+        self._shard_documents = 0
+        self._shard_path = None
+        self._shard_uri = None
+        self._shard_file = None
+
+    def _open_next_shard(self) -> None:
+        self.close()
+
+        self._shard_number += 1
+        shard_name = f"{self._shard_prefix}-{self._shard_number:06d}{self.extension}"
+
+        self._shard_path = os.path.join(fanout_directory(self._outdir, shard_name, self._fanout_depth), shard_name)
+        os.makedirs(os.path.dirname(self._shard_path), exist_ok=True)
+        self._shard_uri = file_uri(self._shard_path)
+        self._shard_file = open(self._shard_path, 'w')
+
+    @abc.abstractmethod
+    def _write_document(self, document: OrderedDict) -> None:
+        """Write a document in the current shard
+
+        Args:
+            document (OrderedDict): ODC Dataset document
+        """
+
+    def write(self, documents: List[OrderedDict]) -> List[str]:
+        documents_uris = []
+        for document in documents:
+            if self._shard_file is None or self._shard_documents >= self._shard_size:
+                self._open_next_shard()
+
+            shard_position = self._shard_file.tell()
+            self._write_document(document)
+            self.bytes_written += self._shard_file.tell() - shard_position
+            documents_uris.append(f"{self._shard_uri}#part={self._shard_documents}")
+            self._shard_documents += 1
+
+        if self._shard_file is not None:
+            self._shard_file.flush()
+        return documents_uris
+
+    def close(self) -> None:
+        if self._shard_file is not None:
+            self._shard_file.close()
+
+        self._shard_file = None
+        self._shard_documents = 0
+
+
+class MultiDocumentYamlWriter(_ShardDocumentWriter):
+    """Writer of ODC Datasets documents in multi-document YAML files. The files can be added with
+    `datacube dataset add`"""
+    extension = ".yaml"
+
+    def _write_document(self, document: OrderedDict) -> None:
+        yaml.dump(document, self._shard_file, Dumper=YAML_DUMPER, explicit_start=True)
+
+
+class NDJsonWriter(_ShardDocumentWriter):
+    """Writer of ODC Datasets documents in newline-delimited JSON files. datacube does not read these files, so they
+    can not be added with `datacube dataset add` (the datasets are added by stac2odc when the files are written)"""
+    extension = ".ndjson"
+
+    def _write_document(self, document: OrderedDict) -> None:
+        self._shard_file.write(json.dumps(document, separators=(',', ':')))
+        self._shard_file.write('\n')
+
+
+def create_document_writer(output_format: str, outdir: str, fanout_depth: int = 0,
+                           shard_size: int = 1000) -> DocumentWriter:
+    """Create a writer of ODC Datasets documents
+
+    Args:
+        output_format (str): One of `OUTPUT_FORMATS`. yaml writes one file per dataset, yaml-multi and ndjson write
+        files with `shard_size` datasets each. ndjson files can not be added with `datacube dataset add`
+        outdir (str): Output directory
+        fanout_depth (int): Number of hashed subdirectory levels used to spread the files
+        shard_size (int): Max number of datasets in each file (yaml-multi and ndjson)
+    Returns:
+        DocumentWriter: Writer
+    """
+    if output_format == 'yaml':
+        return DocumentWriter(outdir, fanout_depth)
+    if output_format == 'yaml-multi':
+        return MultiDocumentYamlWriter(outdir, fanout_depth, shard_size)
+    if output_format == 'ndjson':
+        return NDJsonWriter(outdir, fanout_depth, shard_size)
+    raise ValueError(f"Invalid output format {output_format}! Use one of {', '.join(OUTPUT_FORMATS)}")
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from stac2odc.checkpoint import RunCheckpoint
+from stac2odc.exception import CheckpointMismatchError
+from stac2odc.pipeline import Page
+
+SEARCH_DEFINITION = {"url": "https://stac", "filter": {"collections": ["C1"]}, "limit": 2}
+
+
+def _pages() -> list:
+    return [Page(number, [{"id": f"item-{number}-{i}"} for i in range(2)]) for number in range(1, 4)]
+
+
+def test_checkpoint_is_saved_once_per_batch_and_loaded(tmp_path):
+    checkpoint_file = tmp_path / "checkpoint.json"
+
+    checkpoint = RunCheckpoint(str(checkpoint_file), SEARCH_DEFINITION)
+    assert not checkpoint.load()
+
+    checkpoint.page_completed(1)
+    checkpoint.items_indexed(["item-2-0"])
+
+    loaded_checkpoint = RunCheckpoint(str(checkpoint_file), SEARCH_DEFINITION)
+    assert loaded_checkpoint.load()
+    assert (loaded_checkpoint.next_page, loaded_checkpoint.indexed_items) == (2, {"item-2-0"})
+
+
+@pytest.mark.parametrize("search_definition", [
+    {**SEARCH_DEFINITION, "filter": {"collections": ["C2"]}},
+    {**SEARCH_DEFINITION, "filter": {"collections": ["C1"], "datetime": "2021-01-01/.."}},
+    {**SEARCH_DEFINITION, "limit": 10}
+])
+def test_checkpoint_of_another_search_is_rejected(tmp_path, search_definition):
+    checkpoint_file = tmp_path / "checkpoint.json"
+    RunCheckpoint(str(checkpoint_file), SEARCH_DEFINITION).page_completed(1)
+
+    with pytest.raises(CheckpointMismatchError):
+        RunCheckpoint(str(checkpoint_file), search_definition).load()
+
+
+def test_resume_skips_completed_pages_and_indexed_items_of_partial_page(tmp_path):
+    checkpoint_file = tmp_path / "checkpoint.json"
+    checkpoint = RunCheckpoint(str(checkpoint_file), SEARCH_DEFINITION)
+    checkpoint.page_completed(1)
+    checkpoint.items_indexed(["item-2-1"])
+
+    with open(checkpoint_file) as f:
+        assert json.load(f)["indexed_items"] == ["item-2-1"]
+
+    checkpoint = RunCheckpoint(str(checkpoint_file), SEARCH_DEFINITION)
+    checkpoint.load()
+    pages = list(checkpoint.skip_indexed_items(_pages()))
+    assert [(page.number, [item["id"] for item in page.items]) for page in pages] == [
+        (2, ["item-2-0"]), (3, ["item-3-0", "item-3-1"])
+    ]
+
+
+def test_checkpoint_saves_the_page_size_of_the_run(tmp_path):
+    from stac2odc.cli import stac_page_size
+
+    assert (stac_page_size(100), stac_page_size(1000), stac_page_size(0)) == (100, 120, 120)
+
+    # pages of a run with `-m 100` have 100 items, so a resume with `-m 1000` would skip items 100-119
+    checkpoint_file = tmp_path / "checkpoint.json"
+    RunCheckpoint(str(checkpoint_file), {**SEARCH_DEFINITION, "limit": stac_page_size(100)}).page_completed(1)
+
+    with pytest.raises(CheckpointMismatchError):
+        RunCheckpoint(str(checkpoint_file), {**SEARCH_DEFINITION, "limit": stac_page_size(1000)}).load()
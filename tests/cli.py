@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+# dependencies only imported by the commands that use them
+LAZY_MODULES = ['datacube', 'stac', 'pyproj', 'shapely', 'rasterio', 'numpy', 'requests']
+
+
+def test_cli_imports_heavy_dependencies_lazily():
+    code = (
+        "import sys; modules = set(sys.modules); import stac2odc.cli; "
+        "print(' '.join(sorted({name.split('.')[0] for name in set(sys.modules) - modules})))"
+    )
+    imported_modules = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                      check=True).stdout.split()
+
+    assert [module for module in LAZY_MODULES if module in imported_modules] == []
+
@@ -0,0 +1,107 @@
+import hashlib
+import http.server
+import threading
+
+import pytest
+
+from stac2odc.download import AssetDownloader
+
+
+def _etag(content: bytes) -> str:
+    return '"' + hashlib.md5(content).hexdigest() + '"'
+
+
+@pytest.fixture
+def http_files():
+    """Local HTTP server with Range and If-Range support. Yields the served files (path -> content) and the requests
+    received"""
+    files = {f"/B{i}.tif": bytes(range(256)) * (i + 1) * 100 for i in range(4)}
+    received_requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def _send(self, with_body):
+            content = files[self.path]
+            received_requests.append((self.command, self.path, self.headers.get('Range')))
+
+            start = 0
+            is_same_file = self.headers.get('If-Range', _etag(content)) == _etag(content)
+            if self.headers.get('Range') and is_same_file:
+                start = int(self.headers['Range'][len('bytes='):-1])
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{len(content) - 1}/{len(content)}")
+            else:
+                self.send_response(200)
+            self.send_header('ETag', _etag(content))
+            self.send_header('Content-Length', str(len(content) - start))
+            self.end_headers()
+
+            if with_body:
+                self.wfile.write(content[start:])
+
+        def do_HEAD(self):
+            self._send(False)
+
+        def do_GET(self):
+            self._send(True)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}", files, received_requests
+    server.shutdown()
+
+
+def test_asset_downloader_skips_and_resumes_files(tmp_path, http_files):
+    url, files, received_requests = http_files
+    downloads = [(url + path, str(tmp_path / path[1:])) for path in files]
+
+    # B0 is already downloaded and B1 was partially downloaded
+    (tmp_path / "B0.tif").write_bytes(files["/B0.tif"])
+    (tmp_path / "B1.tif.part").write_bytes(files["/B1.tif"][:1000])
+    (tmp_path / "B1.tif.part.validator").write_text(_etag(files["/B1.tif"]))
+
+    downloader = AssetDownloader(workers=3, chunk_size=1024)
+    assert downloader.download_many(downloads) == [out for _, out in downloads]
+
+    for path, content in files.items():
+        assert (tmp_path / path[1:]).read_bytes() == content
+    assert not list(tmp_path.glob("*.part*"))
+
+    assert ("GET", "/B0.tif", None) not in received_requests
+    assert ("GET", "/B1.tif", "bytes=1000-") in received_requests
+    assert (downloader.files_downloaded, downloader.files_resumed, downloader.files_skipped) == (3, 1, 1)
+    assert downloader.bytes_downloaded == sum(map(len, files.values())) - len(files["/B0.tif"]) - 1000
+
+
+def test_asset_downloader_restarts_when_remote_file_changes(tmp_path, http_files):
+    url, files, received_requests = http_files
+
+    # interrupted download of the old version of the file
+    old_content = files["/B1.tif"]
+    (tmp_path / "B1.tif.part").write_bytes(old_content[:1000])
+    (tmp_path / "B1.tif.part.validator").write_text(_etag(old_content))
+
+    files["/B1.tif"] = bytes(reversed(old_content))
+
+    downloader = AssetDownloader(workers=1, chunk_size=1024)
+    downloader.download(url + "/B1.tif", str(tmp_path / "B1.tif"))
+
+    assert ("GET", "/B1.tif", "bytes=1000-") in received_requests
+    assert (tmp_path / "B1.tif").read_bytes() == files["/B1.tif"]
+    assert (downloader.files_downloaded, downloader.files_resumed) == (1, 0)
+    assert downloader.bytes_downloaded == len(files["/B1.tif"])
+
+
+def test_asset_downloader_does_not_resume_partial_file_without_validator(tmp_path, http_files):
+    url, files, received_requests = http_files
+    (tmp_path / "B2.tif.part").write_bytes(b"\0" * 1000)
+
+    downloader = AssetDownloader(workers=1, chunk_size=1024)
+    downloader.download(url + "/B2.tif", str(tmp_path / "B2.tif"))
+
+    assert ("GET", "/B2.tif", None) in received_requests
+    assert (tmp_path / "B2.tif").read_bytes() == files["/B2.tif"]
+    assert downloader.files_resumed == 0
@@ -1,2 +1,70 @@
-import pytest
+import pyproj
+import shapely.geometry
+from shapely.ops import transform
 
+from stac2odc.geometry import TRANSFORMER_CACHE_SIZE, StacItemGeometry, _get_transformer
+
+STAC_ITEM = {
+    "type": "Feature",
+    "id": "CB4_64_16D_STK_v001_022024_2020-01-01_2020-01-16",
+    "geometry": {
+        "type": "Polygon",
+        "coordinates": [[[-46.0, -13.0], [-45.0, -13.0], [-45.0, -12.0], [-46.0, -12.0], [-46.0, -13.0]]]
+    }
+}
+
+NATIVE_CRS = "+proj=aea +lat_0=-12 +lon_0=-54 +lat_1=-2 +lat_2=-22 +x_0=5000000 +y_0=10000000 +ellps=GRS80 " \
+             "+units=m +no_defs"
+
+
+def test_to_crs_same_crs_returns_same_geometry():
+    geometry = StacItemGeometry.from_stacitem(STAC_ITEM)
+
+    assert geometry.to_crs("EPSG:4326")._basegeom is geometry._basegeom
+
+
+def test_to_crs_reuses_transformer():
+    _get_transformer.cache_clear()
+    geometry = StacItemGeometry.from_stacitem(STAC_ITEM)
+
+    for _ in range(10):
+        geometry.to_crs(NATIVE_CRS)
+
+    cache_info = _get_transformer.cache_info()
+    assert cache_info.misses == 1
+    assert cache_info.hits == 9
+
+
+def test_to_crs_matches_new_transformer():
+    geometry = StacItemGeometry.from_stacitem(STAC_ITEM)
+    expected = transform(pyproj.Transformer.from_crs("EPSG:4326", NATIVE_CRS).transform, geometry._basegeom)
+
+    assert geometry.to_crs(NATIVE_CRS)._basegeom.equals_exact(expected, 1e-6)
+
+
+def test_transformer_cache_reuses_and_evicts_transformers():
+    _get_transformer.cache_clear()
+    transformer = _get_transformer("EPSG:4326", NATIVE_CRS)
+
+    assert _get_transformer("EPSG:4326", NATIVE_CRS) is transformer
+    assert _get_transformer("EPSG:4326", "EPSG:4326") is None  # equivalent CRS need no transformer
+
+    # the least recently used pairs of CRS are evicted when the cache is full
+    for zone in range(1, TRANSFORMER_CACHE_SIZE + 1):
+        _get_transformer("EPSG:4326", f"EPSG:{32700 + zone}")
+    assert _get_transformer.cache_info().currsize == TRANSFORMER_CACHE_SIZE
+    assert _get_transformer("EPSG:4326", NATIVE_CRS) is not transformer
+
+
+def test_batch_to_crs_matches_to_crs():
+    geometries = [
+        StacItemGeometry(shapely.geometry.box(-46.0 + i, -13.0, -45.0 + i, -12.0), "EPSG:4326") for i in range(10)
+    ]
+    geometries.append(StacItemGeometry.from_stacitem(STAC_ITEM).to_crs(NATIVE_CRS))
+
+    reprojected = StacItemGeometry.batch_to_crs(geometries, NATIVE_CRS)
+
+    assert len(reprojected) == len(geometries)
+    for geometry, geometry_reprojected in zip(geometries, reprojected):
+        assert geometry_reprojected._crsgeom == NATIVE_CRS
+        assert geometry_reprojected._basegeom.equals_exact(geometry.to_crs(NATIVE_CRS)._basegeom, 1e-6)
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+
+def test_grid_probe_reads_once_per_tile(tmp_path):
+    rasterio = pytest.importorskip("rasterio")
+    from rasterio.transform import from_origin
+
+    from stac2odc.grid import GridProbe
+
+    hrefs = []
+    for i in range(2):
+        href = str(tmp_path / f"raster_{i}.tif")
+        with rasterio.open(href, 'w', driver='GTiff', width=4, height=3, count=1, dtype='uint8',
+                           transform=from_origin(100, 200, 10, 10)):
+            pass
+        hrefs.append(href)
+
+    cache_file = str(tmp_path / "grids.json")
+    GridProbe(cache_file).probe([(href, "tile:product:band:001") for href in hrefs])
+
+    with open(cache_file) as f:
+        cached_grids = json.load(f)
+    assert cached_grids["tile:product:band:001"] == {"shape": [3, 4], "transform": [10, 0, 100, 0, -10, 200, 0, 0, 1]}
+    assert hrefs[1] not in cached_grids  # the second raster has the same tile, so it is not read
+
+    # grids are recovered from the cache file, even if the raster no longer exists
+    (tmp_path / "raster_0.tif").unlink()
+    assert GridProbe(cache_file).get_grid(hrefs[0]) == cached_grids["tile:product:band:001"]
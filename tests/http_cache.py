@@ -0,0 +1,94 @@
+import http.server
+import json
+import threading
+
+import pytest
+import requests
+
+from stac2odc.http_cache import CachedStacService, HttpResponseCache
+
+
+@pytest.fixture
+def stac_server():
+    """Local server of STAC Collections with ETags. Yields the server URL, the requests received and the server
+    options (`always_not_modified` answers 304 to all requests)"""
+    received_requests = []
+    options = {"always_not_modified": False}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            received_requests.append((self.path, self.headers.get('If-None-Match')))
+            if self.headers.get('If-None-Match') == '"v1"' or options["always_not_modified"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            content = json.dumps({"id": self.path.split('/')[-1].split('?')[0], "data": "x" * 1000}).encode()
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}", received_requests, options
+    server.shutdown()
+
+
+def test_http_response_cache_revalidates_and_evicts(tmp_path, stac_server):
+    url, received_requests, _ = stac_server
+
+    cache = HttpResponseCache(str(tmp_path), ttl=3600)
+    stac_service = CachedStacService(url, "secret-token", cache)
+    assert stac_service.collection("C1")["id"] == "C1"
+    assert stac_service.collection("C1")["id"] == "C1"
+    assert (cache.misses, cache.hits, len(received_requests)) == (1, 1, 1)
+    assert "secret-token" not in "".join(path.read_text() for path in tmp_path.glob("*.json"))
+
+    # expired responses are revalidated with the ETag
+    cache = HttpResponseCache(str(tmp_path), ttl=0)
+    assert CachedStacService(url, "secret-token", cache).collection("C1")["id"] == "C1"
+    assert cache.revalidations == 1
+    assert received_requests[-1][1] == '"v1"'
+
+    # the least recently used responses are evicted when the cache is full
+    cache = HttpResponseCache(str(tmp_path), ttl=3600, max_size=2500)
+    stac_service = CachedStacService(url, None, cache)
+    for collection in ("C2", "C3", "C1"):
+        stac_service.collection(collection)
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    assert stac_service.collection("C1")["id"] == "C1" and cache.hits == 1
+
+
+@pytest.mark.parametrize("entry_content", ['{"etag": "\\"v1\\"", "content": {"id": "C1"}}', '[]', '{"stored_at'])
+def test_http_response_cache_malformed_entries_are_misses(tmp_path, stac_server, entry_content):
+    url, received_requests, _ = stac_server
+
+    cache = HttpResponseCache(str(tmp_path), ttl=3600)
+    stac_service = CachedStacService(url, None, cache)
+    stac_service.collection("C1")
+    entry_file, = tmp_path.glob("*.json")
+    entry_file.write_text(entry_content)
+
+    cache = HttpResponseCache(str(tmp_path), ttl=3600)
+    assert CachedStacService(url, None, cache).collection("C1")["id"] == "C1"
+
+    # the malformed entry is requested without conditional headers and replaced
+    assert received_requests[-1][1] is None
+    assert (cache.misses, cache.hits, cache.revalidations) == (1, 0, 0)
+    assert json.loads(entry_file.read_text())["content"]["id"] == "C1"
+
+
+def test_http_response_cache_not_modified_without_entry(tmp_path, stac_server):
+    url, received_requests, options = stac_server
+    options["always_not_modified"] = True
+
+    with pytest.raises(requests.HTTPError):
+        CachedStacService(url, None, HttpResponseCache(str(tmp_path))).collection("C1")
+    assert received_requests == [("/collections/C1", None)]
+    assert not list(tmp_path.glob("*.json"))
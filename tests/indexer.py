@@ -0,0 +1,126 @@
+import types
+import uuid
+
+import pytest
+
+pytest.importorskip("datacube")
+sqlalchemy_exc = pytest.importorskip("sqlalchemy.exc")
+
+import stac2odc.indexer  # noqa: E402
+from stac2odc.indexer import DatasetBatchIndexer  # noqa: E402
+
+
+class FakeTransaction:
+    def __init__(self, datasets_resource):
+        self._datasets_resource = datasets_resource
+        self.inserted = {}
+
+    def insert_dataset(self, metadata_doc, dataset_id, product_id):
+        if metadata_doc.get("invalid"):
+            raise sqlalchemy_exc.IntegrityError("INSERT", {}, Exception("invalid dataset"))
+        self.inserted[dataset_id] = metadata_doc
+
+
+class FakeDatasetResource:
+    """Datasets of a fake ODC index, with the internals used by the transactions of datacube 1.8"""
+    def __init__(self):
+        self.datasets = {}
+        self.locations = {}
+        self.transactions = 0
+        self.added_one_by_one = []
+
+    def bulk_has(self, ids):
+        return [dataset_id in self.datasets for dataset_id in ids]
+
+    def add(self, dataset, with_lineage=True):
+        if dataset.metadata_doc_without_lineage().get("invalid"):
+            raise ValueError("invalid dataset")
+        self.added_one_by_one.append(dataset.id)
+        self.datasets[dataset.id] = dataset.metadata_doc_without_lineage()
+        return dataset
+
+    @property
+    def _db(self):
+        resource = self
+
+        class _Connection:
+            def begin(self):
+                return _TransactionContext()
+
+        class _TransactionContext:
+            def __enter__(self):
+                self.transaction = FakeTransaction(resource)
+                return self.transaction
+
+            def __exit__(self, exc_type, *args):
+                if exc_type is None:
+                    resource.transactions += 1
+                    resource.datasets.update(self.transaction.inserted)
+
+        return _Connection()
+
+    def _ensure_new_locations(self, dataset, transaction=None):
+        self.locations[dataset.id] = dataset.uris
+
+
+def _dataset(invalid: bool = False):
+    dataset_id = uuid.uuid4()
+    return types.SimpleNamespace(id=dataset_id, sources=None, uris=[f"file:///{dataset_id}.yaml"],
+                                 local_uri=f"/{dataset_id}.yaml", type=types.SimpleNamespace(id=1),
+                                 metadata_doc_without_lineage=lambda: {"id": str(dataset_id), "invalid": invalid})
+
+
+@pytest.fixture
+def fake_index(monkeypatch):
+    monkeypatch.setattr(stac2odc.indexer, "DATACUBE_TRANSACTION_SUPPORT", True)
+    return types.SimpleNamespace(datasets=FakeDatasetResource())
+
+
+def _indexer(fake_index, batch_size):
+    batches = []
+    return DatasetBatchIndexer(fake_index, batch_size=batch_size, on_indexed=batches.append), batches
+
+
+def test_batch_is_added_in_a_transaction(fake_index):
+    datasets = [_dataset() for _ in range(4)]
+    indexer, batches = _indexer(fake_index, batch_size=3)
+
+    for dataset in datasets:
+        indexer.add(dataset)
+    indexer.flush()
+
+    assert fake_index.datasets.transactions == 1  # the last batch has a single dataset
+    assert fake_index.datasets.added_one_by_one == [datasets[-1].id]
+    assert set(fake_index.datasets.locations) == {dataset.id for dataset in datasets[:3]}
+    assert [[dataset.id for dataset in batch] for batch in batches] == \
+        [[dataset.id for dataset in datasets[:3]], [dataset.id for dataset in datasets[3:]]]
+    assert (indexer.datasets_indexed, indexer.datasets_present, indexer.datasets_failed) == (4, 0, 0)
+
+
+def test_failed_transaction_adds_datasets_one_by_one(fake_index):
+    datasets = [_dataset(), _dataset(invalid=True), _dataset()]
+    indexer, batches = _indexer(fake_index, batch_size=3)
+
+    for dataset in datasets:
+        indexer.add(dataset)
+
+    assert fake_index.datasets.transactions == 0
+    assert fake_index.datasets.added_one_by_one == [datasets[0].id, datasets[2].id]
+    assert [[dataset.id for dataset in batch] for batch in batches] == [[datasets[0].id, datasets[2].id]]
+    assert (indexer.datasets_indexed, indexer.datasets_failed, indexer.batches_fallback) == (2, 1, 1)
+
+
+def test_datasets_already_indexed_are_not_counted_as_new(fake_index):
+    datasets = [_dataset() for _ in range(4)]
+    for dataset in datasets[:2]:
+        fake_index.datasets.datasets[dataset.id] = dataset.metadata_doc_without_lineage()
+    indexer, batches = _indexer(fake_index, batch_size=4)
+
+    for dataset in datasets:
+        indexer.add(dataset)
+
+    assert fake_index.datasets.transactions == 1
+    assert set(fake_index.datasets.locations) == {dataset.id for dataset in datasets[2:]}
+    # datasets already indexed are reported, so they are not processed again after a resume
+    assert sorted(dataset.id for dataset in batches[0]) == sorted(dataset.id for dataset in datasets)
+    assert (indexer.datasets_indexed, indexer.datasets_present, indexer.datasets_failed) == (2, 2, 0)
@@ -0,0 +1,106 @@
+import json
+from types import SimpleNamespace
+
+from stac2odc.item import item2dataset_stream
+from stac2odc.mapper import StacMapperEngine
+from stac2odc.operation import user_defined_modules_cache_info
+from stac2odc.pipeline import Page
+
+
+def _engine_file(tmp_path) -> str:
+    udf_file = tmp_path / "udf.py"
+    udf_file.write_text("def platform(value):\n    return value.upper()\n")
+
+    engine_file = tmp_path / "engine.json"
+    engine_file.write_text(json.dumps({"dataset": {
+        "fromSTAC": {
+            "properties.datetime": "properties.datetime",
+            "properties.eo:platform": {
+                "from": "properties.platform",
+                "customMapFunction": {"functionName": "platform", "functionFile": str(udf_file)}
+            }
+        },
+        "fromConstant": {"$schema": "https://schemas.opendatacube.org/dataset"}
+    }}))
+    return str(engine_file)
+
+
+def _pages() -> list:
+    stac_items = [
+        {"id": f"item-{i}", "properties": {"datetime": f"2021-01-{i + 1:02d}T00:00:00Z", "platform": f"sat-{i % 3}"}}
+        for i in range(10)
+    ]
+    return [Page(number, stac_items[index:index + 3]) for number, index in enumerate(range(0, 10, 3), start=1)]
+
+
+def test_item2dataset_stream_workers_map_the_same_datasets_in_order(tmp_path):
+    engine_file = _engine_file(tmp_path)
+
+    serial_pages = list(item2dataset_stream(engine_file, "C1", _pages()))
+    udf_loads = user_defined_modules_cache_info()['loads'] + user_defined_modules_cache_info()['hits']
+
+    parallel_pages = list(item2dataset_stream(engine_file, "C1", _pages(), workers=2))
+    assert [(page.number, page.items, page.ids) for page in parallel_pages] == \
+        [(page.number, page.items, page.ids) for page in serial_pages]
+    assert parallel_pages[-1].items[-1]["properties"]["eo:platform"] == "SAT-0"
+
+    # user defined modules statistics of the worker processes are merged in this process
+    udf_stats = user_defined_modules_cache_info()
+    assert udf_stats['loads'] + udf_stats['hits'] > udf_loads
+
+
+class _ProductIndex:
+    def __init__(self, product_definition):
+        self.product_definition = product_definition
+        self.get_by_name_calls = 0
+
+    def get_by_name(self, name):
+        self.get_by_name_calls += 1
+        return SimpleNamespace(definition=self.product_definition)
+
+
+def test_item2dataset_stream_resolves_the_product_once_per_run(tmp_path):
+    # the engine has no dataset geometry rule, but the product has a CRS
+    products = _ProductIndex({"name": "C1", "storage": {"crs": "EPSG:32723"}})
+    dc_index = SimpleNamespace(products=products)
+
+    odc_pages = list(item2dataset_stream(_engine_file(tmp_path), "C1", _pages(), dc_index))
+    assert len(odc_pages) == 4
+    assert products.get_by_name_calls == 1
+    assert all(dataset["crs"] == "EPSG:32723" and "geometry" not in dataset
+               for page in odc_pages for dataset in page.items)
+
+
+class _DatasetIndex:
+    def __init__(self, dataset_ids):
+        self.dataset_ids = set(dataset_ids)
+        self.bulk_has_calls = 0
+
+    def bulk_has(self, dataset_ids):
+        self.bulk_has_calls += 1
+        return [dataset_id in self.dataset_ids for dataset_id in dataset_ids]
+
+
+def test_item2dataset_stream_skips_indexed_items_before_mapping(tmp_path, monkeypatch):
+    engine_file = _engine_file(tmp_path)
+    engine = StacMapperEngine(engine_file)
+
+    indexed_items = {"item-0", "item-4", "item-5"}
+    datasets = _DatasetIndex(engine.create_dataset_id({"id": item_id}, "C1") for item_id in indexed_items)
+    dc_index = SimpleNamespace(products=_ProductIndex({"name": "C1"}), datasets=datasets)
+
+    mapped_items = []
+    map_item_to_dataset = StacMapperEngine.map_item_to_dataset
+
+    def _map_item_to_dataset(self, stac_item):
+        mapped_items.append(stac_item["id"])
+        return map_item_to_dataset(self, stac_item)
+    monkeypatch.setattr(StacMapperEngine, "map_item_to_dataset", _map_item_to_dataset)
+
+    odc_pages = list(item2dataset_stream(engine_file, "C1", _pages(), dc_index, skip_indexed=True))
+    assert datasets.bulk_has_calls == len(odc_pages) == 4
+    assert not indexed_items & set(mapped_items)
+    assert [page.ids for page in odc_pages] == [["item-1", "item-2"], ["item-3"], ["item-6", "item-7", "item-8"],
+                                                ["item-9"]]
+    assert all(dataset["id"] == engine.create_dataset_id({"id": item_id}, "C1")
+               for page in odc_pages for dataset, item_id in zip(page.items, page.ids))
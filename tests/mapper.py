@@ -0,0 +1,141 @@
+import json
+import os
+import uuid
+
+import pytest
+
+import stac2odc.mapper
+from stac2odc.exception import EngineInvalidDefinitionKey
+from stac2odc.mapper import DEFAULT_DATASET_ID_NAMESPACE, StacMapperEngine, _compile_dataset_id
+from stac2odc.metrics import stage_metrics, take_stage_metrics
+from stac2odc.operation import user_defined_modules_cache_info
+
+
+def _engine(tmp_path, engine_definition: dict) -> StacMapperEngine:
+    engine_file = tmp_path / "engine.json"
+    engine_file.write_text(json.dumps(engine_definition))
+    return StacMapperEngine(str(engine_file))
+
+
+def test_constants_in_list_paths_are_added_to_each_member(tmp_path):
+    engine = _engine(tmp_path, {"product": {
+        "fromSTAC": {"name": "id", "measurements": {"from": "bands", "customMapping": {"name": "name"}}},
+        "fromConstant": {"metadata_type": "eo3", "measurements.units": "meters"}
+    }})
+
+    product = engine.map_collection_to_product({"id": "C1", "bands": [{"name": "B1"}, {"name": "B2"}]})
+    assert product["metadata_type"] == "eo3"
+    assert product["measurements"] == [{"name": "B1", "units": "meters"}, {"name": "B2", "units": "meters"}]
+
+    # without the list, the constant creates the path
+    engine = _engine(tmp_path, {"product": {"fromSTAC": {"name": "id"}, "fromConstant": {"measurements.units": "m"}}})
+    assert engine.map_collection_to_product({"id": "C1"})["measurements"] == {"units": "m"}
+
+
+def test_constants_are_merged_into_existing_dicts(tmp_path):
+    engine = _engine(tmp_path, {"dataset": {
+        "fromSTAC": {"id": "id", "properties.datetime": "properties.datetime"},
+        "fromConstant": {
+            "properties.odc:file_format": "GeoTIFF",
+            "properties.datetime": "constants do not replace values",
+            "lineage": {}
+        }
+    }})
+
+    datasets = [engine.map_item_to_dataset({"id": f"item-{i}", "properties": {"datetime": "2021-01-01T00:00:00Z"}})
+                for i in range(2)]
+    assert datasets[0]["properties"] == {"datetime": "2021-01-01T00:00:00Z", "odc:file_format": "GeoTIFF"}
+
+    # each element receives its own copy of the constants
+    datasets[0]["lineage"]["source_datasets"] = {}
+    assert datasets[1]["lineage"] == {}
+
+
+def test_user_defined_function_is_resolved_once_per_page(tmp_path, monkeypatch):
+    udf_file = tmp_path / "udf.py"
+    udf_file.write_text("def platform(value):\n    return value.upper()\n")
+    engine = _engine(tmp_path, {"dataset": {"fromSTAC": {
+        "properties.eo:platform": {
+            "from": "properties.platform",
+            "customMapFunction": {"functionName": "platform", "functionFile": str(udf_file)}
+        }
+    }}})
+
+    def _map_page(stac_items):
+        udf_stats = user_defined_modules_cache_info()
+        engine.prepare_items(stac_items)
+        datasets = [engine.map_item_to_dataset(stac_item) for stac_item in stac_items]
+
+        udf_lookups = sum(user_defined_modules_cache_info().values()) - sum(udf_stats.values())
+        return [dataset["properties"]["eo:platform"] for dataset in datasets], udf_lookups
+
+    stac_items = [{"id": f"item-{i}", "properties": {"platform": f"sat-{i}"}} for i in range(10)]
+    assert _map_page(stac_items) == ([f"SAT-{i}" for i in range(10)], 1)
+
+    # changed functions are used from the next page
+    udf_file.write_text("def platform(value):\n    return value.title()\n")
+    os.utime(udf_file, ns=(0, 10 ** 18))
+    assert _map_page(stac_items[:2]) == (["Sat-0", "Sat-1"], 1)
+
+    # items mapped without preparing them check the function file at most once per interval
+    monkeypatch.setattr(stac2odc.mapper, "USER_DEFINED_FUNCTION_CHECK_INTERVAL", 3600)
+    udf_stats = user_defined_modules_cache_info()
+    for stac_item in stac_items:
+        engine.map_item_to_dataset(stac_item)
+    assert user_defined_modules_cache_info() == udf_stats
+
+
+def test_from_file_content_is_parsed_once_per_engine(tmp_path):
+    flags_file = tmp_path / "flags.yaml"
+    flags_file.write_text("qa:\n  bits: [0, 1]\n  values: {0: clear, 1: cloud}\n")
+    engine_file = tmp_path / "engine.json"
+    engine_file.write_text(json.dumps({"dataset": {
+        "fromSTAC": {"id": "id"},
+        "fromFile": {"flags_definition": {"file": str(flags_file)}}
+    }}))
+
+    take_stage_metrics()
+    engine = StacMapperEngine(str(engine_file))
+    datasets = [engine.map_item_to_dataset({"id": f"item-{i}"}) for i in range(5)]
+    assert all(dataset["flags_definition"]["qa"]["values"][1] == "cloud" for dataset in datasets)
+
+    # each dataset has its own copy of the content
+    datasets[0]["flags_definition"]["qa"]["bits"].append(2)
+    assert datasets[1]["flags_definition"]["qa"]["bits"] == [0, 1]
+    assert stage_metrics()["from_file_load"]["calls"] == 1
+    assert stage_metrics()["from_file"]["calls"] == 5
+
+    # changed files are parsed again
+    flags_file.write_text("qa:\n  bits: [0]\n")
+    os.utime(flags_file, ns=(0, 10 ** 18))
+    assert engine.map_item_to_dataset({"id": "item-5"})["flags_definition"]["qa"] == {"bits": [0]}
+    assert stage_metrics()["from_file_load"]["calls"] == 2
+
+
+def test_dataset_ids_are_stable_per_item_and_product():
+    create_dataset_id = _compile_dataset_id({})
+    stac_item = {"id": "item-0", "properties": {"bdc:tile": "044048"}}
+
+    dataset_id = create_dataset_id(stac_item, "C1")
+    assert dataset_id == create_dataset_id(dict(stac_item), "C1")
+    assert dataset_id == str(uuid.uuid5(DEFAULT_DATASET_ID_NAMESPACE, "C1/item-0"))
+    assert dataset_id != create_dataset_id(stac_item, "C2")
+    assert dataset_id != create_dataset_id({"id": "item-1"}, "C1")
+
+    namespace = "6ba7b811-9dad-11d1-80b4-00c04fd430c8"
+    assert _compile_dataset_id({"namespace": namespace})(stac_item, "C1") == \
+        str(uuid.uuid5(uuid.UUID(namespace), "C1/item-0"))
+    assert _compile_dataset_id({"from": "properties.bdc:tile"})(stac_item, "C1") == \
+        str(uuid.uuid5(DEFAULT_DATASET_ID_NAMESPACE, "C1/044048"))
+
+    random_ids = _compile_dataset_id({"type": "uuid4"})
+    assert uuid.UUID(random_ids(stac_item, "C1")).version == 4
+    assert random_ids(stac_item, "C1") != random_ids(stac_item, "C1")
+
+
+def test_invalid_dataset_id_type_is_rejected(tmp_path):
+    with pytest.raises(EngineInvalidDefinitionKey):
+        _compile_dataset_id({"type": "uuid1"})
+
+    with pytest.raises(EngineInvalidDefinitionKey):
+        _engine(tmp_path, {"dataset": {"fromSTAC": {"id": "id"}, "datasetId": {"type": "uuid1"}}})
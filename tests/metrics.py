@@ -0,0 +1,23 @@
+import json
+
+from stac2odc.metrics import record_stage, take_stage_metrics, write_metrics
+
+
+def test_write_metrics_files(tmp_path):
+    take_stage_metrics()
+    for seconds in (0.1, 0.2, 0.3):
+        record_stage("write", seconds, items=10, nbytes=100)
+
+    write_metrics(str(tmp_path / "metrics.json"), "json", counters={"user_defined_modules_loads": 1})
+    with open(tmp_path / "metrics.json") as f:
+        metrics = json.load(f)
+    assert metrics["stages"]["write"]["calls"] == 3
+    assert metrics["stages"]["write"]["items"] == 30
+    assert metrics["stages"]["write"]["bytes"] == 300
+    assert metrics["stages"]["write"]["p50_seconds"] == 0.2
+    assert metrics["counters"] == {"user_defined_modules_loads": 1}
+
+    write_metrics(str(tmp_path / "metrics.prom"), "prometheus")
+    prometheus_lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert 'stac2odc_stage_items_total{stage="write"} 30' in prometheus_lines
+    assert 'stac2odc_stage_latency_seconds_count{stage="write"} 3' in prometheus_lines
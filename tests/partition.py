@@ -0,0 +1,88 @@
+from stac2odc.partition import bbox_partitions, collection_time_partitions, iterate_partitioned_stac_pages, \
+    tile_partitions, time_partitions
+
+
+class StacService:
+    """STAC service with the items of January 2020. Search only supports the `datetime` parameter"""
+    def __init__(self, stac_items):
+        self.stac_items = stac_items
+        self.items_found = 0
+
+    def search(self, filter):
+        start, end = filter["datetime"].split("/")
+        found = [
+            item for item in self.stac_items
+            if (item["properties"]["datetime"] or item["properties"]["start_datetime"]) <= end and
+            start <= (item["properties"]["datetime"] or item["properties"]["end_datetime"])
+        ]
+        page_items = found[(filter["page"] - 1) * filter["limit"]:filter["page"] * filter["limit"]]
+        self.items_found += len(page_items)
+        return type("ItemCollection", (), {"features": page_items})
+
+
+def _stac_items():
+    return [
+        {"id": f"item-{day}", "properties": {"datetime": f"2020-01-{day:02d}T00:00:00Z"}} for day in range(1, 32)
+    ] + [
+        # composite item, found in all windows
+        {"id": "item-composite", "properties": {"datetime": None, "start_datetime": "2020-01-01T00:00:00Z",
+                                                "end_datetime": "2020-01-31T00:00:00Z"}}
+    ]
+
+
+def test_time_partitions_do_not_overlap():
+    partitions = time_partitions("2020-01-01T00:00:00Z", "2020-01-31T00:00:00Z", 3)
+
+    assert [partition.search_filter["datetime"] for partition in partitions] == [
+        "2020-01-01T00:00:00Z/2020-01-10T23:59:59.999999Z",
+        "2020-01-11T00:00:00Z/2020-01-20T23:59:59.999999Z",
+        "2020-01-21T00:00:00Z/2020-01-31T00:00:00Z",
+    ]
+
+    # only items with a datetime range that crosses the window limits are shared with other windows
+    stac_items = {item["id"]: item for item in _stac_items()}
+    assert [partition.is_shared(stac_items["item-11"]) for partition in partitions] == [True, False, True]
+    assert all(partition.is_shared(stac_items["item-composite"]) for partition in partitions)
+
+
+def test_partitioned_search_merges_partitions_without_duplicates():
+    stac_items = _stac_items()
+    stac_service = StacService(stac_items)
+    partitions = time_partitions("2020-01-01T00:00:00Z", "2020-01-31T00:00:00Z", 3)
+
+    pages = list(iterate_partitioned_stac_pages(stac_service, None, {"collections": ["C1"]}, partitions, limit=4,
+                                                partition_workers=3))
+    assert [page.number for page in pages] == list(range(1, len(pages) + 1))
+    assert sorted(item["id"] for page in pages for item in page.items) == sorted(item["id"] for item in stac_items)
+    # items in the limits of the windows are found once, the composite item is found by each window
+    assert stac_service.items_found == len(stac_items) + 2
+
+    pages = list(iterate_partitioned_stac_pages(stac_service, 7, {}, partitions, limit=4, partition_workers=3))
+    assert sum(len(page.items) for page in pages) == 7
+
+
+def test_bbox_and_tile_partitions_shared_items():
+    partitions = bbox_partitions([0, 0, 4, 1], 2)
+    assert [partition.search_filter["bbox"] for partition in partitions] == [[0, 0, 2, 1], [2, 0, 4, 1]]
+
+    # the outer limits of the search are not shared
+    assert [partition.is_shared({"bbox": [-1, 0, 1, 1]}) for partition in partitions] == [False, True]
+    assert [partition.is_shared({"bbox": [1, 0, 3, 1]}) for partition in partitions] == [True, True]
+    assert partitions[0].is_shared({"id": "item-without-bbox"})
+
+    partitions = tile_partitions(["044048", "044049"])
+    assert not partitions[0].is_shared({"properties": {"bdc:tiles": ["044048"]}})
+    assert partitions[0].is_shared({"properties": {"bdc:tiles": ["044048", "044049"]}})
+
+
+def test_time_partitions_of_short_intervals():
+    partitions = collection_time_partitions({}, {"datetime": "2020-01-01T00:00:00Z"}, 2)
+    assert [partition.search_filter["datetime"] for partition in partitions] == \
+        ["2020-01-01T00:00:00Z/2020-01-01T00:00:00Z"]
+
+    partitions = time_partitions("2020-01-01T00:00:00Z", "2020-01-01T00:00:00.000003Z", 4)
+    assert [partition.search_filter["datetime"] for partition in partitions] == [
+        "2020-01-01T00:00:00Z/2020-01-01T00:00:00Z",
+        "2020-01-01T00:00:00.000001Z/2020-01-01T00:00:00.000001Z",
+        "2020-01-01T00:00:00.000002Z/2020-01-01T00:00:00.000003Z",
+    ]
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from stac2odc.pipeline import bounded_stage
+
+
+class _Source:
+    """Iterable that records how many elements were produced"""
+    def __init__(self, size: int, error_at: int = None):
+        self.size = size
+        self.error_at = error_at
+        self.produced = 0
+
+    def __iter__(self):
+        for element in range(self.size):
+            if element == self.error_at:
+                raise ValueError(f"element {element}")
+            self.produced += 1
+            yield element
+
+
+def _wait_until(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_producer_blocks_when_the_queue_is_full():
+    source = _Source(100)
+    elements = bounded_stage(source, maxsize=3)
+
+    assert next(elements) == 0
+    _wait_until(lambda: source.produced >= 5)
+
+    # the element consumed, 3 elements in the queue and one waiting to be put
+    assert source.produced == 5
+    assert list(elements) == list(range(1, 100))
+
+
+def test_producer_errors_are_raised_in_the_consumer():
+    elements = bounded_stage(_Source(10, error_at=4), maxsize=2)
+
+    assert [next(elements) for _ in range(4)] == [0, 1, 2, 3]
+    with pytest.raises(ValueError, match="element 4"):
+        next(elements)
+
+
+def test_producer_stops_when_the_consumer_closes():
+    threads = threading.active_count()
+    source = _Source(100)
+    elements = bounded_stage(source, maxsize=2)
+
+    assert next(elements) == 0
+    elements.close()
+
+    assert _wait_until(lambda: threading.active_count() == threads)
+    assert source.produced <= 4
@@ -0,0 +1,84 @@
+import datetime
+import json
+
+import pytest
+
+from stac2odc.source import iterate_geoparquet_pages, iterate_ndjson_pages, iterate_static_catalog_pages
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_ndjson_source_splits_cover_all_items(tmp_path, use_mmap):
+    ndjson_file = tmp_path / "items.ndjson"
+    with open(ndjson_file, "w") as f:
+        for i in range(101):
+            f.write(json.dumps({"type": "Feature", "id": f"item-{i}", "collection": "C1", "data": "x" * (i % 7)}))
+            f.write("\n")
+
+    splits_ids = []
+    for split_index in range(4):
+        pages = list(iterate_ndjson_pages(str(ndjson_file), "C1", page_size=10, use_mmap=use_mmap,
+                                          split=(split_index, 4)))
+        assert [page.number for page in pages] == list(range(1, len(pages) + 1))
+        splits_ids.extend(item["id"] for page in pages for item in page.items)
+    assert splits_ids == [f"item-{i}" for i in range(101)]
+
+    # pages before start_page are skipped and count in max_items
+    pages = list(iterate_ndjson_pages(str(ndjson_file), max_items=35, page_size=10, start_page=3))
+    assert [(page.number, len(page.items)) for page in pages] == [(3, 10), (4, 5)]
+
+
+def test_static_catalog_source(tmp_path):
+    def write(path, content):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(content))
+
+    write(tmp_path / "catalog.json", {"type": "Catalog", "id": "root", "links": [
+        {"rel": "self", "href": "./catalog.json"},
+        {"rel": "child", "href": "./C1/collection.json"},
+        {"rel": "child", "href": "./C2/collection.json"}
+    ]})
+    for collection in ("C1", "C2"):
+        item_links = [{"rel": "item", "href": f"./{collection}-{i}/{collection}-{i}.json"} for i in range(3)]
+        write(tmp_path / collection / "collection.json", {
+            "type": "Collection", "id": collection, "extent": {},
+            "links": [{"rel": "parent", "href": "../catalog.json"}, *item_links]
+        })
+        for i in range(3):
+            write(tmp_path / collection / f"{collection}-{i}" / f"{collection}-{i}.json",
+                  {"type": "Feature", "id": f"{collection}-{i}", "links": []})
+
+    pages = list(iterate_static_catalog_pages(str(tmp_path / "catalog.json"), "C2", page_size=2))
+    assert [[item["id"] for item in page.items] for page in pages] == [["C2-0", "C2-1"], ["C2-2"]]
+    assert all(item["collection"] == "C2" for page in pages for item in page.items)
+
+
+def test_geoparquet_source(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+    import shapely.geometry
+
+    polygon = shapely.geometry.box(-46.0, -13.0, -45.0, -12.0)
+    table = pyarrow.table({
+        "type": ["Feature", "Feature"],
+        "stac_version": ["1.0.0", "1.0.0"],
+        "id": ["item-0", "item-1"],
+        "collection": ["C1", "C1"],
+        "geometry": [polygon.wkb, polygon.wkb],
+        "bbox": [{"xmin": -46.0, "ymin": -13.0, "xmax": -45.0, "ymax": -12.0}] * 2,
+        "datetime": pyarrow.array([datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 17)],
+                                  pyarrow.timestamp("us", tz="UTC")),
+        "eo:cloud_cover": [10.0, None],
+        "assets": [{"B1": {"href": "B1.tif", "type": None}}, {"B1": {"href": "B1.tif", "type": "image/tiff"}}]
+    })
+    pyarrow.parquet.write_table(table, str(tmp_path / "items.parquet"))
+
+    pages = list(iterate_geoparquet_pages(str(tmp_path / "items.parquet"), "C1", page_size=1))
+    assert [page.number for page in pages] == [1, 2]
+
+    stac_item = pages[0].items[0]
+    assert stac_item["id"] == "item-0"
+    assert stac_item["properties"] == {"datetime": "2020-01-01T00:00:00Z", "eo:cloud_cover": 10.0}
+    assert stac_item["bbox"] == [-46.0, -13.0, -45.0, -12.0]
+    assert stac_item["assets"] == {"B1": {"href": "B1.tif"}}
+    assert shapely.geometry.shape(stac_item["geometry"]).equals(polygon)
+    assert pages[1].items[0]["properties"] == {"datetime": "2020-01-17T00:00:00Z"}
@@ -0,0 +1,58 @@
+from stac2odc.pipeline import Page
+from stac2odc.sync import WatermarkTracker, merge_search_filters, watermark_filter
+
+
+def _observe(tracker: WatermarkTracker, days: list, page_size: int = 2) -> None:
+    stac_items = [{"id": f"item-{day}", "properties": {"datetime": f"2021-01-{day:02d}T00:00:00Z"}} for day in days]
+    pages = [Page(number, stac_items[index:index + page_size])
+             for number, index in enumerate(range(0, len(stac_items), page_size), start=1)]
+    list(tracker.observe(pages))
+
+
+def test_watermark_is_saved_when_the_search_ran_to_the_end():
+    tracker = WatermarkTracker("properties.datetime")
+    _observe(tracker, [3, 9, 5])
+
+    assert tracker.safe_watermark(max_items=10, datasets_failed=0) == "2021-01-09T00:00:00Z"
+
+
+def test_watermark_is_not_saved_in_truncated_runs():
+    # items are not ordered by the watermark, so items not recovered could be older than it
+    tracker = WatermarkTracker("properties.datetime")
+    _observe(tracker, [3, 9, 5, 1])
+
+    assert tracker.watermark == "2021-01-09T00:00:00Z"
+    assert tracker.safe_watermark(max_items=4, datasets_failed=0) is None
+
+    # items of pages recovered before a resume count in max items
+    tracker = WatermarkTracker("properties.datetime")
+    _observe(tracker, [3, 9])
+    assert tracker.safe_watermark(max_items=4, datasets_failed=0, items_before=2) is None
+    assert tracker.safe_watermark(max_items=5, datasets_failed=0, items_before=2) == "2021-01-09T00:00:00Z"
+
+
+def test_watermark_is_not_saved_when_datasets_failed():
+    tracker = WatermarkTracker("properties.datetime")
+    _observe(tracker, [3, 9, 5])
+
+    assert tracker.safe_watermark(max_items=10, datasets_failed=1) is None
+
+
+def test_watermark_filter_keeps_the_search_interval():
+    search_filter = {"collections": ["C1"], "datetime": "2019-01-01T00:00:00Z/2019-12-31T00:00:00Z"}
+
+    merged_filter = merge_search_filters(search_filter, watermark_filter("properties.datetime", "2019-06-01T00:00:00Z"))
+    assert merged_filter == {"collections": ["C1"], "datetime": "2019-06-01T00:00:00Z/2019-12-31T00:00:00Z"}
+
+    # watermarks before the search start do not widen the search
+    merged_filter = merge_search_filters(search_filter, watermark_filter("properties.datetime", "2018-06-01T00:00:00Z"))
+    assert merged_filter["datetime"] == "2019-01-01T00:00:00Z/2019-12-31T00:00:00Z"
+
+    merged_filter = merge_search_filters({"datetime": "2019-01-01T00:00:00Z/.."},
+                                         watermark_filter("properties.datetime", "2019-06-01T00:00:00Z"))
+    assert merged_filter["datetime"] == "2019-06-01T00:00:00Z/.."
+
+    # query extension watermarks keep the operators of the search
+    merged_filter = merge_search_filters({"query": {"updated": {"lte": "2020-01-01T00:00:00Z"}}},
+                                         watermark_filter("properties.updated", "2019-06-01T00:00:00Z"))
+    assert merged_filter["query"] == {"updated": {"lte": "2020-01-01T00:00:00Z", "gte": "2019-06-01T00:00:00Z"}}
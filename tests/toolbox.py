@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from stac2odc.toolbox import iterate_stac_pages
+
+
+class StacService:
+    """STAC service with `total_items` items. The first pages are the slowest to answer, so later pages fetched
+    concurrently arrive before them"""
+    def __init__(self, total_items: int):
+        self.total_items = total_items
+        self.requested_pages = []
+        self.requested_limits = set()
+        self._lock = threading.Lock()
+
+    def search(self, filter):
+        with self._lock:
+            self.requested_pages.append(filter["page"])
+            self.requested_limits.add(filter["limit"])
+        time.sleep(0.05 / filter["page"])
+
+        start = (filter["page"] - 1) * filter["limit"]
+        features = [{"id": f"item-{i}"} for i in range(start, min(start + filter["limit"], self.total_items))]
+        return type("ItemCollection", (), {"features": features})
+
+
+def _pages(stac_service, max_items, **kwargs) -> list:
+    return [
+        (page.number, [item["id"] for item in page.items])
+        for page in iterate_stac_pages(stac_service, max_items, {"collections": ["C1"]}, **kwargs)
+    ]
+
+
+@pytest.mark.parametrize("fetch_workers", [1, 4])
+def test_pages_are_delivered_in_order(fetch_workers):
+    stac_service = StacService(25)
+    pages = _pages(stac_service, None, limit=10, fetch_workers=fetch_workers)
+
+    assert [(number, len(items)) for number, items in pages] == [(1, 10), (2, 10), (3, 5)]
+    assert [item_id for _, items in pages for item_id in items] == [f"item-{i}" for i in range(25)]
+
+
+@pytest.mark.parametrize("max_items, start_page, expected_pages", [
+    (25, 1, [(1, 10), (2, 10), (3, 5)]),
+    (15, 1, [(1, 10), (2, 5)]),
+    (100, 1, [(1, 10), (2, 10), (3, 5)]),
+    (25, 2, [(2, 10), (3, 5)]),
+    (5, 1, [(1, 5)])
+])
+def test_max_items_and_start_page(max_items, start_page, expected_pages):
+    stac_service = StacService(25)
+    pages = _pages(stac_service, max_items, limit=10, fetch_workers=4, start_page=start_page)
+
+    assert [(number, len(items)) for number, items in pages] == expected_pages
+    assert pages[0][1][0] == f"item-{(start_page - 1) * min(10, max_items)}"
+
+    # all pages have the same size, and no page after the last one allowed by `max_items` is requested
+    assert stac_service.requested_limits == {min(10, max_items)}
+    assert max(stac_service.requested_pages) <= -(-max_items // min(10, max_items))
+    assert len(stac_service.requested_pages) == len(set(stac_service.requested_pages))
+
+
+def test_pages_in_flight_are_not_requested_after_close():
+    stac_service = StacService(1000)
+    pages = iterate_stac_pages(stac_service, None, {"collections": ["C1"]}, limit=10, fetch_workers=2)
+
+    assert next(pages).number == 1
+    pages.close()
+
+    # only the pages in flight when the consumer stopped were requested
+    assert sorted(stac_service.requested_pages) == [1, 2]
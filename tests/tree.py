@@ -0,0 +1,131 @@
+from collections import OrderedDict
+
+import pytest
+
+from stac2odc.tree import TreeBuilder, add_value_by_tree_path, copy_tree
+
+
+def _legacy_add_value_by_tree_path(element, tree_path, value):
+    """`add_value_by_tree_path` before the list indexes (scans the list nodes in each insertion)"""
+    tree_path = tree_path.split('.')
+
+    _pelement = element
+    _element_index = -1
+    for tree_node in tree_path:
+        if tree_node not in _pelement:
+            if isinstance(_pelement, list):
+                for index in range(0, len(_pelement)):
+                    for key in _pelement[index]:
+                        if _pelement[index][key] == tree_node:
+                            _element_index = index
+                            break
+                if _element_index == -1:
+                    _pelement.append(OrderedDict())
+            else:
+                _pelement[tree_node] = OrderedDict()
+
+            if tree_node == tree_path[-1]:
+                if isinstance(_pelement, list):
+                    _pelement[_element_index] = value
+                else:
+                    _pelement[tree_node] = value
+        if isinstance(_pelement, list):
+            _pelement = _pelement[_element_index]
+        else:
+            _pelement = _pelement[tree_node]
+
+
+def _product():
+    return OrderedDict([
+        ("name", "S2"),
+        ("metadata", OrderedDict(properties=OrderedDict(platform="sentinel-2"))),
+        ("measurements", [OrderedDict(name=f"B{band:02d}", dtype="uint16") for band in range(1, 13)]),
+    ])
+
+
+INSERTIONS = [
+    ("measurements.B03.units", "1"),
+    ("measurements.B03.nodata", 0),
+    ("measurements.B12.aliases", ["swir2"]),
+    ("metadata.properties.eo:platform", "sentinel-2a"),
+    ("metadata.properties.platform", "not replaced"),
+    ("description", "Sentinel-2 L2A"),
+    ("measurements.B12.aliases", "not replaced"),
+]
+
+
+def test_builder_matches_legacy_insertions():
+    legacy_element, element = _product(), _product()
+
+    builder = TreeBuilder(element)
+    for tree_path, value in INSERTIONS:
+        _legacy_add_value_by_tree_path(legacy_element, tree_path, value)
+        builder.add(tree_path, value)
+
+    assert element == legacy_element
+    assert element["measurements"][2] == {"name": "B03", "dtype": "uint16", "units": "1", "nodata": 0}
+
+
+def test_builder_adds_missing_list_members():
+    element = _product()
+    builder = TreeBuilder(element)
+
+    # a member without the node is created in the last position, and found by the values added to it
+    builder.add("measurements.B13.name", "B13")
+    builder.add("measurements.B13.units", "1")
+    assert element["measurements"][-1] == {"name": "B13", "units": "1"}
+    assert len(element["measurements"]) == 13
+
+    # members replaced through the builder are indexed again
+    builder.add("measurements.B01", OrderedDict(name="coastal"))
+    builder.add("measurements.coastal.units", "1")
+    assert element["measurements"][0] == {"name": "coastal", "units": "1"}
+
+    # the wrapper creates a builder for each insertion
+    add_value_by_tree_path(element, "measurements.B02.units", "1")
+    assert element["measurements"][1]["units"] == "1"
+
+
+def test_builder_index_is_not_shared_by_lists_with_the_same_id():
+    builder = TreeBuilder(OrderedDict(measurements=[OrderedDict(name="B01")]))
+    builder.add("measurements.B01.units", "1")
+
+    # the list is replaced by a list with the same length (its id may be reused)
+    builder.element["measurements"] = [OrderedDict(name="B02")]
+    builder.add("measurements.B02.units", "1")
+    assert builder.element["measurements"] == [{"name": "B02", "units": "1"}]
+
+
+@pytest.mark.parametrize("template", [
+    OrderedDict([("metadata", OrderedDict(properties=OrderedDict([("odc:file_format", "GeoTIFF"),
+                                                                  ("platform", "not replaced")]))),
+                 ("license", "CC-BY-4.0")]),
+    OrderedDict(metadata_type="eo3"),
+])
+def test_merge_matches_legacy_constants(template):
+    def _constants(tree, path=()):
+        for key, value in tree.items():
+            if isinstance(value, dict):
+                yield from _constants(value, path + (key,))
+            else:
+                yield ".".join(path + (key,)), value
+
+    legacy_element, element = _product(), _product()
+    for tree_path, value in _constants(template):
+        _legacy_add_value_by_tree_path(legacy_element, tree_path, copy_tree(value))
+    TreeBuilder(element).merge(template)
+
+    assert element == legacy_element
+
+
+def test_merge_into_list_members():
+    element = _product()
+    builder = TreeBuilder(element)
+    builder.add("measurements.B01.units", "reflectance")
+
+    builder.merge({"measurements": {"units": "1", "nodata": 0}})
+    assert [(band["units"], band["nodata"]) for band in element["measurements"][:2]] == [("reflectance", 0), ("1", 0)]
+
+    # the merged values are new keys to find the members
+    builder.add("measurements.reflectance.aliases", ["coastal"])
+    assert element["measurements"][0]["aliases"] == ["coastal"]
@@ -0,0 +1,64 @@
+import json
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+import pytest
+import yaml
+
+from stac2odc.writer import _ShardDocumentWriter, create_document_writer, file_uri, odc_dataset_file_path
+
+
+def _odc_datasets(datasets: int) -> list:
+    return [
+        OrderedDict([("id", f"00000000-0000-0000-0000-{i:012d}"), ("product", OrderedDict(name="product"))])
+        for i in range(datasets)
+    ]
+
+
+@pytest.mark.parametrize("fanout_depth", [0, 2])
+def test_yaml_writer_one_file_per_dataset(tmp_path, fanout_depth):
+    odc_datasets = _odc_datasets(3)
+
+    with create_document_writer("yaml", str(tmp_path), fanout_depth) as document_writer:
+        uris = document_writer.write(odc_datasets)
+
+    paths = [odc_dataset_file_path(dataset, str(tmp_path), fanout_depth) for dataset in odc_datasets]
+    assert uris == [file_uri(path) for path in paths]
+    for path, dataset in zip(paths, odc_datasets):
+        with open(path) as f:
+            assert f.read().startswith("id: ")  # key order is kept
+        with open(path) as f:
+            assert yaml.safe_load(f) == dataset
+
+
+@pytest.mark.parametrize("output_format,load", [
+    ("yaml-multi", lambda f: list(yaml.safe_load_all(f))),
+    ("ndjson", lambda f: [json.loads(line) for line in f])
+])
+def test_shard_writers(tmp_path, output_format, load):
+    odc_datasets = _odc_datasets(5)
+
+    with create_document_writer(output_format, str(tmp_path), shard_size=2) as document_writer:
+        uris = document_writer.write(odc_datasets[:3]) + document_writer.write(odc_datasets[3:])
+
+    # each dataset has its own URI: the shard URI and the position of the dataset in the shard
+    assert len(set(uris)) == len(odc_datasets)
+    assert [urllib.parse.urlparse(uri).fragment for uri in uris] == ["part=0", "part=1"] * 2 + ["part=0"]
+
+    shards = list(dict.fromkeys(urllib.request.url2pathname(urllib.parse.urlparse(uri).path) for uri in uris))
+    assert len(shards) == 3
+
+    shards_datasets = {}
+    for shard in shards:
+        with open(shard) as f:
+            shards_datasets[file_uri(shard)] = load(f)
+
+    for uri, dataset in zip(uris, odc_datasets):
+        shard_uri, part = uri.split("#part=")
+        assert shards_datasets[shard_uri][int(part)] == dataset
+
+
+def test_shard_writer_requires_document_format(tmp_path):
+    with pytest.raises(TypeError):
+        _ShardDocumentWriter(str(tmp_path))